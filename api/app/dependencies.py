@@ -37,6 +37,12 @@ class Settings(BaseSettings):
     upload_dir: str = os.getenv("UPLOAD_DIR", "uploads")
     # Fix: Strip any comments (text after #) from the MAX_UPLOAD_SIZE value
     max_upload_size: int = int(os.getenv("MAX_UPLOAD_SIZE", "10485760").split('#')[0].strip())
+    # Resumable chunked uploads are meant for large evidence bundles, so they get a separate limit
+    max_chunked_upload_size: int = int(os.getenv("MAX_CHUNKED_UPLOAD_SIZE", str(5 * 1024**3)).split('#')[0].strip())
+    upload_chunk_size: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024**2)).split('#')[0].strip())
+    # Internal nginx location mapped onto upload_dir (e.g. /protected-uploads/). When set,
+    # document downloads are handed to nginx with X-Accel-Redirect
+    accel_redirect_prefix: str = os.getenv("ACCEL_REDIRECT_PREFIX", "").split('#')[0].strip()
     
     class Config:
         env_file = ".env"
@@ -1,6 +1,7 @@
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from .dependencies import get_settings
+from .utils.upload_stream import UploadSizeLimitMiddleware
 from .routers import auth, admin, clients, cases, documents, research, billing, calendar, legal_research, gemini
 from .models import init_db
 from .database import get_db
@@ -84,6 +85,13 @@ app.include_router(gemini.router, prefix="/api", tags=["Gemini AI Integration"])
 app.include_router(billing.router, prefix="/billing", tags=["Billing & Payments"])
 app.include_router(calendar.router, prefix="/calendar", tags=["Calendar & Reminders"])
 
+# Reject oversize uploads from their Content-Length before the body is spooled
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_size=get_settings().max_upload_size,
+    paths=[route.path for route in app.routes if getattr(route, "endpoint", None) is legal_research.upload_document],
+)
+
 @app.get("/")
 async def root():
     """Root endpoint to verify API is running"""
@@ -1,16 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Body, BackgroundTasks, status
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Body, BackgroundTasks, Header, Request, status
 from fastapi.responses import JSONResponse
 from typing import List, Dict, Any, Optional
+from functools import lru_cache
 import os
-import tempfile
-import shutil
+import hashlib
 import json
 from pydantic import BaseModel
 from fastapi.security import OAuth2PasswordBearer
-from ..dependencies import oauth2_scheme
+from starlette.concurrency import run_in_threadpool
+from ..dependencies import oauth2_scheme, get_settings, Settings
 from ..services.gemini_service import GeminiService
 from ..services.zimlii_service import ZimLIIService
-from ..utils.document_processor import extract_text_from_pdf, extract_text_from_image
+from ..services.chunked_upload_service import ChunkedUploadService, ChunkedUploadError
+from ..services.retrieval_service import RetrievalService
+from ..services.vector_index_service import is_document_owner
+from ..services.summarization_service import SummarizationService, SummarizationError
+from ..utils.document_processor import extract_pages_from_file
+from ..utils.upload_stream import MultipartUploadReader, UploadTooLargeError, InvalidUploadError
+from ..utils.ranged_response import ranged_file_response
 from ..utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -21,10 +28,41 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# Supported upload types, grouped by how their text is extracted
+PDF_EXTENSIONS = ['.pdf']
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif']
+TEXT_EXTENSIONS = ['.txt', '.md', '.csv', '.docx', '.doc']
+
+def get_document_storage_dir(settings: Settings) -> str:
+    """Directory where uploaded legal research documents are stored"""
+    return os.path.join(settings.upload_dir, "legal_research")
+
 # Initialize services
 gemini_service = GeminiService()
 zimlii_service = ZimLIIService()
 
+# Services keeping files under upload_dir are created on first use, so importing
+# the router does not create any directories
+@lru_cache()
+def get_chunked_upload_service() -> ChunkedUploadService:
+    settings = get_settings()
+    return ChunkedUploadService(
+        storage_dir=get_document_storage_dir(settings),
+        max_size=settings.max_chunked_upload_size,
+        default_chunk_size=settings.upload_chunk_size
+    )
+
+@lru_cache()
+def get_retrieval_service() -> RetrievalService:
+    return RetrievalService(index_root=os.path.join(get_settings().upload_dir, "indexes"))
+
+@lru_cache()
+def get_summarization_service() -> SummarizationService:
+    return SummarizationService(
+        cache_dir=os.path.join(get_settings().upload_dir, "summaries"),
+        gemini=gemini_service
+    )
+
 # Pydantic models for request/response validation
 class DocumentReference(BaseModel):
     id: str
@@ -43,7 +81,24 @@ class LegalResearchQuery(BaseModel):
     document_ids: Optional[List[str]] = None
     chat_history: Optional[List[ChatMessage]] = None
     include_zimlii_results: bool = False
+    case_id: Optional[str] = None
+    top_k: int = 8
+    dedupe: bool = False
     
+class ChunkedUploadCreate(BaseModel):
+    filename: str
+    total_size: int
+    document_name: str
+    document_type: Optional[str] = None
+    case_id: Optional[str] = None
+    chunk_size: Optional[int] = None
+
+class ChunkedUploadComplete(BaseModel):
+    sha256: Optional[str] = None
+
+class DocumentSummaryRequest(BaseModel):
+    focus: Optional[str] = None
+
 class ZimLIISearchParams(BaseModel):
     query: str
     jurisdiction: Optional[str] = None
@@ -93,25 +148,36 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any
 @router.post("/query")
 async def query_legal_research(
     query_data: LegalResearchQuery,
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    retrieval_service: RetrievalService = Depends(get_retrieval_service)
 ):
     """
     Process a legal research query with document context and chat history.
     Optionally searches ZimLII for relevant legal information.
     """
     try:
-        # Gather active document context
+        # Gather only the passages of the active documents most relevant to the query
         document_context = []
-        if query_data.document_ids:
-            # In a real implementation, this would retrieve document content from a database
-            # For simplicity, we're using a placeholder
-            for doc_id in query_data.document_ids:
-                # This should fetch the document content from your document storage
-                document_context.append({
-                    "id": doc_id,
-                    "name": f"Document {doc_id}",
-                    "content": "Sample document content. This would be the actual content in production."
-                })
+        if query_data.document_ids or query_data.case_id:
+            # Embedding the query and scoring the index is CPU-bound, so it runs off the event loop
+            passages = await run_in_threadpool(
+                retrieval_service.search,
+                query=query_data.query,
+                case_key=get_case_key(query_data.case_id, current_user) if query_data.case_id else None,
+                document_ids=query_data.document_ids,
+                top_k=query_data.top_k,
+                dedupe=query_data.dedupe,
+                owner_id=get_owner_filter(current_user)
+            )
+            document_context = [
+                {
+                    "id": passage["document_id"],
+                    "name": passage["name"],
+                    "content": passage["text"],
+                    "score": passage["score"]
+                }
+                for passage in passages
+            ]
         
         # Format chat history if provided
         chat_history = query_data.chat_history if query_data.chat_history else []
@@ -140,112 +206,376 @@ async def query_legal_research(
             "query": query_data.query,
             "gemini_response": gemini_response,
             "zimlii_results": zimlii_results,
-            "document_context_used": [doc["name"] for doc in document_context]
+            "document_context_used": sorted({doc["name"] for doc in document_context})
         }
     except Exception as e:
         logger.error(f"Error processing legal research query: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
-@router.post("/upload-document")
+# The route reads its multipart body itself, so its form is described for the API docs here
+UPLOAD_DOCUMENT_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file", "document_name"],
+                    "properties": {
+                        "file": {"type": "string", "format": "binary"},
+                        "document_name": {"type": "string"},
+                        "document_type": {"type": "string"},
+                        "case_id": {"type": "string"},
+                    },
+                }
+            }
+        },
+    }
+}
+
+@router.post("/upload-document", openapi_extra=UPLOAD_DOCUMENT_OPENAPI)
 async def upload_document(
+    request: Request,
     background_tasks: BackgroundTasks,
-    file: UploadFile = File(...),
-    document_name: str = Form(...),
-    document_type: Optional[str] = Form(None),
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    settings: Settings = Depends(get_settings)
 ):
     """
     Upload a document for legal research and extract its text content.
     Supports PDFs, images (for OCR), and text files.
+
+    The multipart body is parsed as it arrives and the file is streamed
+    straight into document storage, with its size limit, SHA-256 hash and
+    MIME type checked in the same pass. Unsupported types are rejected as
+    soon as the file's part headers are read.
     """
+    reader = MultipartUploadReader(
+        get_document_storage_dir(settings),
+        settings.max_upload_size,
+        allowed_extensions=PDF_EXTENSIONS + IMAGE_EXTENSIONS + TEXT_EXTENSIONS,
+        required_fields=["document_name"]
+    )
     try:
-        # Create a temp file
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            # Copy the uploaded file content to the temp file
-            shutil.copyfileobj(file.file, temp_file)
-            temp_path = temp_file.name
-        
-        # Extract text based on file type
-        extracted_text = ""
-        file_extension = os.path.splitext(file.filename)[1].lower()
-        
-        # Process the file based on its type
-        if file_extension in ['.pdf']:
-            # Schedule text extraction as a background task
-            background_tasks.add_task(extract_text_from_pdf, temp_path)
-            extracted_text = "PDF text extraction in progress..."
-        elif file_extension in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif']:
-            # Schedule OCR as a background task
-            background_tasks.add_task(extract_text_from_image, temp_path)
-            extracted_text = "Image OCR extraction in progress..."
-        elif file_extension in ['.txt', '.md', '.csv', '.docx', '.doc']:
-            # For text files, read directly
-            with open(temp_path, "r", encoding="utf-8") as f:
-                extracted_text = f.read()
-        else:
-            # Clean up the temp file
-            os.unlink(temp_path)
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Unsupported file type: {file_extension}"
-            )
-        
-        # In a real implementation, save the document info and extracted text to a database
-        document_id = "doc-" + str(hash(file.filename))  # This is just a placeholder
-        
-        # Clean up the temp file (if not needed for background processing)
-        if file_extension not in ['.pdf', '.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif']:
-            os.unlink(temp_path)
-        
-        return {
-            "document_id": document_id,
-            "name": document_name,
-            "original_filename": file.filename,
-            "size": file.size,
-            "type": document_type or file_extension,
-            "text_extraction_status": "complete" if extracted_text else "pending",
-            "text_preview": extracted_text[:200] + "..." if len(extracted_text) > 200 else extracted_text
-        }
+        stored = await reader.read(request)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidUploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         logger.error(f"Error uploading document: {str(e)}")
-        # Clean up temp file if it exists
-        if 'temp_path' in locals():
-            os.unlink(temp_path)
         raise HTTPException(status_code=500, detail=f"Error uploading document: {str(e)}")
 
-@router.get("/documents/{document_id}")
-async def get_document(
+    fields = stored["fields"]
+    return process_stored_document(
+        stored,
+        stored["filename"],
+        fields["document_name"],
+        fields.get("document_type"),
+        get_case_key(fields.get("case_id"), current_user),
+        current_user["id"],
+        background_tasks
+    )
+
+def get_case_key(case_id: Optional[str], current_user: Dict[str, Any]) -> str:
+    """Name of the retrieval index a document belongs to: its case, or the uploader's own documents"""
+    return f"case-{case_id}" if case_id else f"user-{current_user['id']}"
+
+def get_owner_filter(current_user: Dict[str, Any]) -> Optional[Any]:
+    """User whose documents the current user may use, or None for admins, who may use any"""
+    return None if current_user.get("role") == "admin" else current_user["id"]
+
+def get_owned_document(
+    retrieval_service: RetrievalService,
     document_id: str,
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    current_user: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Return the registry entry of a document the current user may use.
+    Other users' documents are reported as not found, like missing ones.
+    """
+    document = retrieval_service.get_document(document_id)
+    owner_id = get_owner_filter(current_user)
+    if document is None or (owner_id is not None and not is_document_owner(document, owner_id)):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return document
+
+def get_document_id(case_key: str, sha256: str) -> str:
+    """
+    ID of a document, derived from its index and content: re-uploads to the same
+    case map to the same record, while the same file uploaded to another case
+    is a separate document
+    """
+    return "doc-" + hashlib.sha256(f"{case_key}:{sha256}".encode("utf-8")).hexdigest()[:16]
+
+def extract_and_index_document(
+    file_path: str,
+    document_id: str,
+    document_name: str,
+    case_key: str,
+    metadata: Optional[Dict[str, Any]] = None
 ):
-    """Get a document's details and content by its ID"""
-    # In a real implementation, this would retrieve the document from your database
-    # This is just a placeholder
+    """Background task extracting a stored document's text and adding it to the retrieval index"""
     try:
-        # Placeholder - would normally fetch from database
-        document = {
-            "id": document_id,
-            "name": f"Document {document_id}",
-            "content": "This is a placeholder for the document's content."
-        }
-        return document
+        pages = extract_pages_from_file(file_path)
+        get_retrieval_service().index_document(case_key, document_id, document_name, pages, metadata=metadata)
     except Exception as e:
-        logger.error(f"Error getting document: {str(e)}")
+        logger.error(f"Error indexing document {document_id}: {str(e)}")
+
+def process_stored_document(
+    stored: Dict[str, Any],
+    original_filename: str,
+    document_name: str,
+    document_type: Optional[str],
+    case_key: str,
+    owner_id: Any,
+    background_tasks: BackgroundTasks
+) -> Dict[str, Any]:
+    """
+    Schedule text extraction and indexing for a document that has been
+    written to storage and build the upload response.
+    """
+    file_extension = os.path.splitext(original_filename)[1].lower()
+
+    document_id = get_document_id(case_key, stored["sha256"])
+
+    # Extract and index the full text as a background task
+    # The stored file's details are kept with the index entry so it can be downloaded later
+    metadata = {
+        "path": stored["path"],
+        "original_filename": original_filename,
+        "mime_type": stored["mime_type"],
+        "size": stored["size"],
+        "sha256": stored["sha256"],
+        "owner_id": owner_id,
+    }
+    background_tasks.add_task(
+        extract_and_index_document, stored["path"], document_id, document_name, case_key, metadata
+    )
+
+    extracted_text = ""
+    if file_extension in PDF_EXTENSIONS:
+        extracted_text = "PDF text extraction in progress..."
+    elif file_extension in IMAGE_EXTENSIONS:
+        extracted_text = "Image OCR extraction in progress..."
+    elif stored["mime_type"].startswith("text/"):
+        # The preview only needs the leading bytes captured while streaming
+        extracted_text = stored["head"].decode("utf-8", errors="ignore")
+
+    return {
+        "document_id": document_id,
+        "name": document_name,
+        "original_filename": original_filename,
+        "size": stored["size"],
+        "sha256": stored["sha256"],
+        "mime_type": stored["mime_type"],
+        "type": document_type or file_extension,
+        # Every type, text files included, is extracted by the background task
+        "text_extraction_status": "pending",
+        "text_preview": extracted_text[:200] + "..." if len(extracted_text) > 200 else extracted_text
+    }
+
+@router.post("/uploads")
+async def create_chunked_upload(
+    upload_data: ChunkedUploadCreate,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    chunked_upload_service: ChunkedUploadService = Depends(get_chunked_upload_service)
+):
+    """
+    Start a resumable chunked upload.
+
+    The client then PUTs each chunk to /uploads/{upload_id}/chunks/{offset}
+    (in any order, several at a time if it likes) and calls
+    /uploads/{upload_id}/complete once every chunk has been accepted.
+    """
+    file_extension = os.path.splitext(upload_data.filename)[1].lower()
+    if file_extension not in PDF_EXTENSIONS + IMAGE_EXTENSIONS + TEXT_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type: {file_extension}"
+        )
+
+    try:
+        return chunked_upload_service.create_session(
+            filename=upload_data.filename,
+            total_size=upload_data.total_size,
+            owner_id=current_user["id"],
+            chunk_size=upload_data.chunk_size,
+            metadata={
+                "document_name": upload_data.document_name,
+                "document_type": upload_data.document_type,
+                "case_key": get_case_key(upload_data.case_id, current_user),
+            }
+        )
+    except ChunkedUploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+@router.get("/uploads/{upload_id}")
+async def get_chunked_upload(
+    upload_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    chunked_upload_service: ChunkedUploadService = Depends(get_chunked_upload_service)
+):
+    """Get the state of a chunked upload, including which chunks are still missing"""
+    try:
+        return chunked_upload_service.get_session(upload_id, current_user["id"])
+    except ChunkedUploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+@router.put("/uploads/{upload_id}/chunks/{offset}")
+async def upload_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    x_chunk_sha256: str = Header(...),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    chunked_upload_service: ChunkedUploadService = Depends(get_chunked_upload_service)
+):
+    """
+    Upload one chunk as the raw request body, starting at the given byte offset.
+    The X-Chunk-SHA256 header must carry the hex SHA-256 of the chunk.
+    """
+    try:
+        writer = await run_in_threadpool(chunked_upload_service.open_chunk, upload_id, current_user["id"], offset)
+    except ChunkedUploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    try:
+        # File writes block, so they run off the event loop
+        async for data in request.stream():
+            if data:
+                await run_in_threadpool(writer.write, data)
+        return await run_in_threadpool(writer.commit, x_chunk_sha256)
+    except ChunkedUploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    finally:
+        writer.close()
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_chunked_upload(
+    upload_id: str,
+    background_tasks: BackgroundTasks,
+    completion: Optional[ChunkedUploadComplete] = None,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    chunked_upload_service: ChunkedUploadService = Depends(get_chunked_upload_service)
+):
+    """Assemble a chunked upload into document storage and start text extraction"""
+    try:
+        stored = await run_in_threadpool(
+            chunked_upload_service.finalize,
+            upload_id,
+            current_user["id"],
+            completion.sha256 if completion else None
+        )
+    except ChunkedUploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    return process_stored_document(
+        stored,
+        stored["filename"],
+        stored["metadata"].get("document_name") or stored["filename"],
+        stored["metadata"].get("document_type"),
+        stored["metadata"]["case_key"],
+        current_user["id"],
+        background_tasks
+    )
+
+@router.delete("/uploads/{upload_id}")
+async def abort_chunked_upload(
+    upload_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    chunked_upload_service: ChunkedUploadService = Depends(get_chunked_upload_service)
+):
+    """Abort a chunked upload and discard the chunks received so far"""
+    try:
+        chunked_upload_service.abort(upload_id, current_user["id"])
+    except ChunkedUploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return {"status": "success", "message": f"Upload {upload_id} aborted"}
+
+@router.get("/documents/{document_id}")
+async def get_document(
+    document_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    retrieval_service: RetrievalService = Depends(get_retrieval_service)
+):
+    """Get an indexed document's details by its ID"""
+    document = get_owned_document(retrieval_service, document_id, current_user)
+    # Storage paths are internal
+    return {"id": document_id, **{key: value for key, value in document.items() if key != "path"}}
+
+@router.get("/documents/{document_id}/file")
+async def download_document_file(
+    document_id: str,
+    request: Request,
+    download: bool = False,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    settings: Settings = Depends(get_settings),
+    retrieval_service: RetrievalService = Depends(get_retrieval_service)
+):
+    """
+    Download an indexed document's original file.
+
+    Supports Range requests (resumable downloads and PDF viewers fetching
+    pages on demand) and If-None-Match. When ACCEL_REDIRECT_PREFIX is set
+    the file itself is served by nginx.
+    """
+    document = get_owned_document(retrieval_service, document_id, current_user)
+    if not document.get("path") or not os.path.exists(document["path"]):
+        raise HTTPException(status_code=404, detail="Document file not found")
+
+    accel_redirect_path = None
+    if settings.accel_redirect_prefix:
+        relative_path = os.path.relpath(document["path"], settings.upload_dir).replace(os.sep, "/")
+        accel_redirect_path = settings.accel_redirect_prefix.rstrip("/") + "/" + relative_path
+
+    return ranged_file_response(
+        request,
+        document["path"],
+        etag=f'"{document["sha256"]}"',
+        media_type=document.get("mime_type") or "application/octet-stream",
+        filename=document.get("original_filename") or os.path.basename(document["path"]),
+        accel_redirect_path=accel_redirect_path,
+        as_attachment=download
+    )
+
+@router.post("/documents/{document_id}/summary")
+async def summarize_document(
+    document_id: str,
+    summary_request: Optional[DocumentSummaryRequest] = None,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    retrieval_service: RetrievalService = Depends(get_retrieval_service),
+    summarization_service: SummarizationService = Depends(get_summarization_service)
+):
+    """
+    Summarize an indexed document of any length. Parts of the document that
+    have been summarized before are served from the summary cache.
+    """
+    get_owned_document(retrieval_service, document_id, current_user)
+    if document_id not in retrieval_service.corpus:
         raise HTTPException(status_code=404, detail="Document not found")
+    if not gemini_service.initialized:
+        raise HTTPException(status_code=503, detail="Gemini API not initialized")
+
+    try:
+        result = await summarization_service.summarize(
+            retrieval_service.corpus.text(document_id),
+            focus=summary_request.focus if summary_request else None
+        )
+    except SummarizationError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    return {"document_id": document_id, **result}
 
 @router.delete("/documents/{document_id}")
 async def delete_document(
     document_id: str,
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    retrieval_service: RetrievalService = Depends(get_retrieval_service)
 ):
-    """Delete a document by its ID"""
-    try:
-        # In a real implementation, this would remove the document from your database
-        # This is just a placeholder
-        return {"status": "success", "message": f"Document {document_id} deleted successfully"}
-    except Exception as e:
-        logger.error(f"Error deleting document: {str(e)}")
+    """Delete a document by its ID, removing its passages from the retrieval index"""
+    get_owned_document(retrieval_service, document_id, current_user)
+    if not retrieval_service.remove_document(document_id):
         raise HTTPException(status_code=404, detail="Document not found")
+    return {"status": "success", "message": f"Document {document_id} deleted successfully"}
 
 @router.post("/zimlii-search")
 async def search_zimlii_direct(
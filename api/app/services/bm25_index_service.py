@@ -0,0 +1,308 @@
+# BM25IndexService for exact-term keyword retrieval over extracted document text
+import os
+import re
+import json
+import math
+import threading
+from array import array
+from collections import Counter
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from .vector_index_service import live_row_ranges
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Compact an index once this fraction of its rows belongs to deleted documents
+COMPACTION_THRESHOLD = 0.25
+
+# Words, optionally joined by '.', '/' or '-' and followed by bracketed
+# sub-references, so "s.12(3)", "2019/20" and "SI-142" survive as single terms
+TOKEN_PATTERN = re.compile(r"\w+(?:\(\w+\))*(?:[./-]\w+(?:\(\w+\))*)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lower-case search terms.
+
+    Compound references such as section numbers are kept whole and also
+    split into their parts, so both "12(3)" and "12" match them.
+    """
+    terms = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(re.findall(r"\w+", token))
+    return terms
+
+
+class BM25Index:
+    """
+    Incremental BM25 index over the chunks of one case.
+
+    Posting lists are kept as compact typed arrays (row IDs and term
+    frequencies), which are scored with vectorised NumPy operations. Rows
+    are only ever appended, so every posting list stays sorted, and a
+    document's live rows form one range, so searches restricted to some
+    documents mask rows by slicing. Deleted rows are masked out and dropped
+    when the index is compacted. The index
+    is persisted as an append-only log of per-row term counts, so adding a
+    document costs time proportional to its own length.
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self.log_path = os.path.join(index_dir, "terms.jsonl")
+        self.meta_path = os.path.join(index_dir, "meta.json")
+        self.lock = threading.RLock()
+        self._load()
+
+    @property
+    def rows(self) -> int:
+        return len(self.row_documents)
+
+    def _reset(self):
+        self.postings: Dict[str, tuple] = {}
+        self.row_documents: List[str] = []
+        self.row_chunks: List[int] = []
+        self.lengths = array("I")
+        self.deleted = set()
+        self.live_length = 0
+        self.document_rows: Dict[str, tuple] = {}
+        self._deleted_rows = None
+
+    def _load(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._reset()
+        meta = {}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+
+        rows = meta.get("rows", 0)
+        if rows and os.path.exists(self.log_path):
+            with open(self.log_path) as f:
+                for line in f:
+                    if self.rows == rows:
+                        break
+                    record = json.loads(line)
+                    self._append_row(record["document_id"], record["chunk"], record["terms"])
+
+        self.deleted = set(meta.get("deleted", []))
+        self.live_length = sum(self.lengths) - sum(self.lengths[row] for row in self.deleted)
+        self.document_rows = live_row_ranges(self.row_documents, self.deleted)
+
+        # Drop anything written after the last committed row count
+        self._rewrite_log(self._row_records())
+        self._write_meta()
+
+    def _row_records(self):
+        # Rebuild per-row term counts from the postings, for rewriting the log
+        records = [{"document_id": d, "chunk": c, "terms": {}} for d, c in zip(self.row_documents, self.row_chunks)]
+        for term, (rows, tfs) in self.postings.items():
+            for row, tf in zip(rows, tfs):
+                records[row]["terms"][term] = tf
+        return records
+
+    def _rewrite_log(self, records):
+        temp_path = self.log_path + ".tmp"
+        with open(temp_path, "w") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        os.replace(temp_path, self.log_path)
+
+    def _write_meta(self):
+        temp_path = self.meta_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"rows": self.rows, "deleted": sorted(self.deleted)}, f)
+        os.replace(temp_path, self.meta_path)
+
+    def _append_row(self, document_id: str, chunk: int, terms: Dict[str, int]) -> int:
+        row = self.rows
+        for term, tf in terms.items():
+            if term not in self.postings:
+                self.postings[term] = (array("I"), array("H"))
+            rows, tfs = self.postings[term]
+            rows.append(row)
+            tfs.append(min(tf, 0xFFFF))
+        length = sum(terms.values())
+        start, end = self.document_rows.get(document_id, (row, row))
+        self.document_rows[document_id] = (start if end == row else row, row + 1)
+        self.row_documents.append(document_id)
+        self.row_chunks.append(chunk)
+        self.lengths.append(length)
+        self.live_length += length
+        return row
+
+    def add(self, document_id: str, chunks: List[Dict[str, Any]]):
+        """Add the chunks of a document, replacing any previous version of it"""
+        with self.lock:
+            self.delete(document_id, compact=False)
+            with open(self.log_path, "a") as f:
+                for number, chunk in enumerate(chunks):
+                    terms = dict(Counter(tokenize(chunk["text"])))
+                    self._append_row(document_id, number, terms)
+                    f.write(json.dumps({"document_id": document_id, "chunk": number, "terms": terms}) + "\n")
+            self._write_meta()
+            self._compact_if_needed()
+
+    def delete(self, document_id: str, compact: bool = True) -> int:
+        """Mark every chunk of a document as deleted and return how many there were"""
+        with self.lock:
+            start, end = self.document_rows.pop(document_id, (0, 0))
+            if end > start:
+                self.deleted.update(range(start, end))
+                self._deleted_rows = None
+                self.live_length -= sum(self.lengths[start:end])
+                self._write_meta()
+                if compact:
+                    self._compact_if_needed()
+            return end - start
+
+    def _compact_if_needed(self):
+        if self.deleted and len(self.deleted) >= COMPACTION_THRESHOLD * self.rows:
+            self.compact()
+
+    def compact(self):
+        """Rebuild the postings and log without the rows of deleted documents"""
+        with self.lock:
+            records = [record for row, record in enumerate(self._row_records()) if row not in self.deleted]
+            self._reset()
+            for record in records:
+                self._append_row(record["document_id"], record["chunk"], record["terms"])
+            self._rewrite_log(records)
+            self._write_meta()
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        document_ids: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the top_k live chunks with the highest BM25 score for the query.
+
+        Returns:
+            Dicts with document_id, chunk and score
+        """
+        with self.lock:
+            live_rows = self.rows - len(self.deleted)
+            if live_rows == 0:
+                return []
+
+            lengths = np.frombuffer(self.lengths, dtype=np.uint32).astype(np.float32)
+            average_length = max(self.live_length / live_rows, 1.0)
+            norms = K1 * (1 - B + B * lengths / average_length)
+            scores = np.zeros(self.rows, dtype=np.float32)
+
+            for term, query_tf in Counter(tokenize(query)).items():
+                if term not in self.postings:
+                    continue
+                rows, tfs = self.postings[term]
+                rows = np.frombuffer(rows, dtype=np.uint32)
+                tfs = np.frombuffer(tfs, dtype=np.uint16).astype(np.float32)
+                idf = math.log(1 + (live_rows - len(rows) + 0.5) / (len(rows) + 0.5))
+                scores[rows] += query_tf * idf * tfs * (K1 + 1) / (tfs + norms[rows])
+
+            if document_ids is not None:
+                # One slice per requested document rather than a pass over every row
+                live = np.zeros(self.rows, dtype=bool)
+                for document_id in document_ids:
+                    start, end = self.document_rows.get(document_id, (0, 0))
+                    live[start:end] = True
+                scores[~live] = 0
+            elif self.deleted:
+                if self._deleted_rows is None:
+                    self._deleted_rows = np.fromiter(self.deleted, dtype=np.int64, count=len(self.deleted))
+                scores[self._deleted_rows] = 0
+
+            matched = int(np.count_nonzero(scores))
+            top_k = min(top_k, matched)
+            if top_k <= 0:
+                return []
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+            best = best[np.argsort(-scores[best])]
+            return [
+                {"document_id": self.row_documents[row], "chunk": self.row_chunks[row], "score": float(scores[row])}
+                for row in best
+            ]
+
+
+class BM25IndexService:
+    """Service keeping one BM25 keyword index per case"""
+
+    def __init__(self, index_root: str):
+        self.index_root = index_root
+        self._indexes: Dict[str, BM25Index] = {}
+        self._lock = threading.Lock()
+
+    def _index(self, case_key: str) -> BM25Index:
+        with self._lock:
+            if case_key not in self._indexes:
+                self._indexes[case_key] = BM25Index(
+                    os.path.join(self.index_root, "cases", re.sub(r"[^A-Za-z0-9_-]", "_", case_key), "bm25")
+                )
+            return self._indexes[case_key]
+
+    def index_chunks(self, case_key: str, document_id: str, chunks: List[Dict[str, Any]]):
+        """Add or replace the chunks of a document in its case index"""
+        self._index(case_key).add(document_id, chunks)
+
+    def remove_document(self, case_key: str, document_id: str) -> int:
+        """Remove a document from its case index"""
+        return self._index(case_key).delete(document_id)
+
+    def search(
+        self,
+        query: str,
+        case_keys: List[str],
+        document_ids: Optional[List[str]] = None,
+        top_k: int = 8
+    ) -> List[Dict[str, Any]]:
+        """Find the chunks with the highest BM25 scores across the given case indexes"""
+        results = []
+        for case_key in case_keys:
+            results.extend(self._index(case_key).search(query, top_k, document_ids))
+        results.sort(key=lambda result: result["score"], reverse=True)
+        return results[:top_k]
+
+
+def fuse_scores(
+    vector_results: List[Dict[str, Any]],
+    keyword_results: List[Dict[str, Any]],
+    alpha: float = 0.5
+) -> Dict[tuple, float]:
+    """
+    Fuse vector and BM25 results into one hybrid score per chunk.
+
+    Each list's scores are min-max normalised to [0, 1] so the two scales
+    are comparable, then combined as alpha * vector + (1 - alpha) * keyword.
+    A chunk missing from one list contributes 0 for that side.
+
+    Returns:
+        Mapping of (document_id, chunk) to hybrid score
+    """
+    def normalise(results):
+        if not results:
+            return {}
+        scores = [result["score"] for result in results]
+        low, high = min(scores), max(scores)
+        spread = high - low
+        return {
+            (result["document_id"], result["chunk"]): (result["score"] - low) / spread if spread else 1.0
+            for result in results
+        }
+
+    vector_scores = normalise(vector_results)
+    keyword_scores = normalise(keyword_results)
+    return {
+        key: alpha * vector_scores.get(key, 0.0) + (1 - alpha) * keyword_scores.get(key, 0.0)
+        for key in set(vector_scores) | set(keyword_scores)
+    }
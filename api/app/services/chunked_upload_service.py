@@ -0,0 +1,319 @@
+# ChunkedUploadService for resumable uploads of large documents
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+from typing import Dict, Any, Optional, List
+
+from ..utils.upload_stream import sniff_mime_type, HEAD_SIZE, CHUNK_SIZE
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Default size of each chunk a client sends
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024  # 8 MB
+MIN_CHUNK_SIZE = 256 * 1024  # 256 KB
+MAX_CHUNK_SIZE = 64 * 1024 * 1024  # 64 MB
+
+# Sessions untouched for longer than this are removed by purge_expired
+SESSION_TTL_SECONDS = 24 * 60 * 60
+
+
+class ChunkedUploadError(Exception):
+    """Error raised for invalid chunked upload operations, carrying an HTTP status code"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        self.status_code = status_code
+        super().__init__(message)
+
+
+class ChunkWriter:
+    """
+    Writes a single chunk at its offset in the session's data file.
+
+    Chunks are written with positional writes, so different chunks of the
+    same upload can be written concurrently and in any order. A chunk sent
+    again loses its received marker before its bytes are overwritten, so a
+    retry that fails verification leaves it missing rather than corrupt.
+    """
+
+    def __init__(self, session_dir: str, index: int, offset: int, expected_size: int):
+        self.session_dir = session_dir
+        self.index = index
+        self.offset = offset
+        self.expected_size = expected_size
+        self.written = 0
+        self.digest = hashlib.sha256()
+        self.fd = None
+        try:
+            os.remove(self._marker_path())
+        except FileNotFoundError:
+            pass
+        self.fd = os.open(os.path.join(session_dir, "data.part"), os.O_WRONLY)
+
+    def write(self, data: bytes):
+        """Append bytes to the chunk, rejecting anything beyond its expected size"""
+        if self.written + len(data) > self.expected_size:
+            self.close()
+            raise ChunkedUploadError(
+                f"Chunk {self.index} is larger than the expected {self.expected_size} bytes"
+            )
+        view = memoryview(data)
+        while view:
+            count = os.pwrite(self.fd, view, self.offset + self.written)
+            self.written += count
+            view = view[count:]
+        self.digest.update(data)
+
+    def commit(self, checksum: str) -> Dict[str, Any]:
+        """
+        Verify the chunk against the client's SHA-256 checksum and mark it received.
+
+        A chunk that fails verification is not recorded, so the client can
+        simply send it again.
+        """
+        try:
+            if self.written != self.expected_size:
+                raise ChunkedUploadError(
+                    f"Chunk {self.index} is incomplete: received {self.written} of {self.expected_size} bytes"
+                )
+            sha256 = self.digest.hexdigest()
+            if sha256 != checksum.lower():
+                raise ChunkedUploadError(f"Checksum mismatch for chunk {self.index}", status_code=422)
+            os.fsync(self.fd)
+        finally:
+            self.close()
+
+        # One marker file per chunk avoids sharing mutable state between parallel requests
+        marker_path = self._marker_path()
+        temp_marker_path = f"{marker_path}.{uuid.uuid4().hex}"
+        with open(temp_marker_path, "w") as f:
+            f.write(sha256)
+        os.replace(temp_marker_path, marker_path)
+
+        return {"index": self.index, "offset": self.offset, "size": self.written, "sha256": sha256}
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _marker_path(self) -> str:
+        return os.path.join(self.session_dir, "chunks", str(self.index))
+
+
+class ChunkedUploadService:
+    """
+    Service implementing the resumable chunked upload protocol:
+    create a session, PUT each chunk at its offset with a checksum, then finalize.
+
+    Session state lives on disk next to the document storage directory so that
+    uploads survive restarts and can be resumed from any worker.
+    """
+
+    def __init__(self, storage_dir: str, max_size: int, default_chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.storage_dir = storage_dir
+        self.sessions_dir = os.path.join(storage_dir, ".uploads")
+        self.max_size = max_size
+        self.default_chunk_size = default_chunk_size
+
+    def create_session(
+        self,
+        filename: str,
+        total_size: int,
+        owner_id: Any,
+        chunk_size: Optional[int] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Start a new upload session and preallocate its data file.
+
+        Args:
+            filename: Original filename
+            total_size: Size of the complete file in bytes
+            owner_id: ID of the user creating the upload
+            chunk_size: Requested chunk size, clamped to the supported range
+            metadata: Extra fields returned again when the upload is finalized
+
+        Returns:
+            The session description
+        """
+        if total_size <= 0:
+            raise ChunkedUploadError("total_size must be greater than zero")
+        if total_size > self.max_size:
+            raise ChunkedUploadError(
+                f"Upload exceeds the maximum allowed size of {self.max_size} bytes", status_code=413
+            )
+
+        # Abandoned sessions are cleaned up lazily whenever a new one starts
+        self.purge_expired()
+
+        chunk_size = min(max(chunk_size or self.default_chunk_size, MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+        upload_id = uuid.uuid4().hex
+        session_dir = self._session_dir(upload_id)
+        os.makedirs(os.path.join(session_dir, "chunks"))
+
+        # Reserve the full length up front so chunks can be written at any offset
+        with open(os.path.join(session_dir, "data.part"), "wb") as f:
+            f.truncate(total_size)
+
+        session = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "total_size": total_size,
+            "chunk_size": chunk_size,
+            "total_chunks": (total_size + chunk_size - 1) // chunk_size,
+            "owner_id": owner_id,
+            "metadata": metadata or {},
+            "created_at": time.time(),
+        }
+        with open(os.path.join(session_dir, "session.json"), "w") as f:
+            json.dump(session, f)
+
+        logger.info(f"Created chunked upload {upload_id} for {filename} ({total_size} bytes)")
+        return self.get_session(upload_id, owner_id)
+
+    def get_session(self, upload_id: str, owner_id: Any) -> Dict[str, Any]:
+        """Return the session with its received and missing chunk indexes"""
+        session = self._load_session(upload_id, owner_id)
+        received = self._received_chunks(upload_id)
+        session["received_chunks"] = sorted(received)
+        session["missing_chunks"] = [i for i in range(session["total_chunks"]) if i not in received]
+        return session
+
+    def open_chunk(self, upload_id: str, owner_id: Any, offset: int) -> ChunkWriter:
+        """
+        Open a writer for the chunk starting at the given offset.
+
+        Raises:
+            ChunkedUploadError: If the offset is not a chunk boundary of this upload
+        """
+        session = self._load_session(upload_id, owner_id)
+        chunk_size = session["chunk_size"]
+        if offset < 0 or offset >= session["total_size"] or offset % chunk_size:
+            raise ChunkedUploadError(
+                f"Offset {offset} is not a chunk boundary (chunk size {chunk_size})"
+            )
+        expected_size = min(chunk_size, session["total_size"] - offset)
+        try:
+            return ChunkWriter(self._session_dir(upload_id), offset // chunk_size, offset, expected_size)
+        except FileNotFoundError:
+            # The upload was completed (or is being completed) since the session was read
+            raise ChunkedUploadError("Upload is already being completed", status_code=409)
+
+    def finalize(self, upload_id: str, owner_id: Any, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Assemble a completed upload into document storage.
+
+        The data file already holds every chunk at its final position, so
+        assembly is a single sequential read to compute the content hash,
+        followed by a rename into storage.
+
+        The data file is first claimed with an atomic rename, so of several
+        concurrent calls (from any worker) only one assembles the upload; the
+        others fail with a 409.
+
+        Args:
+            upload_id: Upload session ID
+            owner_id: ID of the user finalizing the upload
+            sha256: Optional SHA-256 of the whole file, verified when given
+
+        Returns:
+            Dict with the stored path, sha256, size, mime_type, head bytes,
+            original filename and session metadata
+        """
+        session = self.get_session(upload_id, owner_id)
+        if session["missing_chunks"]:
+            raise ChunkedUploadError(
+                f"Upload is incomplete: {len(session['missing_chunks'])} chunks missing", status_code=409
+            )
+
+        session_dir = self._session_dir(upload_id)
+        data_path = os.path.join(session_dir, "data.part")
+        claimed_path = os.path.join(session_dir, "data.finalizing")
+        try:
+            os.rename(data_path, claimed_path)
+        except FileNotFoundError:
+            raise ChunkedUploadError("Upload is already being completed", status_code=409)
+
+        try:
+            digest = hashlib.sha256()
+            head = b""
+            with open(claimed_path, "rb") as f:
+                while True:
+                    block = f.read(CHUNK_SIZE)
+                    if not block:
+                        break
+                    if len(head) < HEAD_SIZE:
+                        head += block[:HEAD_SIZE - len(head)]
+                    digest.update(block)
+
+            content_hash = digest.hexdigest()
+            if sha256 and sha256.lower() != content_hash:
+                raise ChunkedUploadError("Checksum mismatch for the assembled file", status_code=422)
+        except Exception:
+            # Release the claim so the upload can be fixed and completed again
+            os.rename(claimed_path, data_path)
+            raise
+
+        extension = os.path.splitext(session["filename"])[1].lower()
+        final_path = os.path.join(self.storage_dir, f"{content_hash}{extension}")
+        os.replace(claimed_path, final_path)
+        shutil.rmtree(session_dir, ignore_errors=True)
+
+        logger.info(f"Finalized chunked upload {upload_id} into {final_path}")
+        return {
+            "path": final_path,
+            "sha256": content_hash,
+            "size": session["total_size"],
+            "mime_type": sniff_mime_type(head, session["filename"]),
+            "head": head,
+            "filename": session["filename"],
+            "metadata": session["metadata"],
+        }
+
+    def abort(self, upload_id: str, owner_id: Any):
+        """Discard an upload session and its data"""
+        self._load_session(upload_id, owner_id)
+        shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+
+    def purge_expired(self, max_age: int = SESSION_TTL_SECONDS) -> List[str]:
+        """Remove sessions that have not been written to within max_age seconds"""
+        purged = []
+        if not os.path.isdir(self.sessions_dir):
+            return purged
+        cutoff = time.time() - max_age
+        for upload_id in os.listdir(self.sessions_dir):
+            session_dir = self._session_dir(upload_id)
+            data_path = os.path.join(session_dir, "data.part")
+            last_activity = os.path.getmtime(data_path if os.path.exists(data_path) else session_dir)
+            if last_activity < cutoff:
+                shutil.rmtree(session_dir, ignore_errors=True)
+                purged.append(upload_id)
+        return purged
+
+    def _session_dir(self, upload_id: str) -> str:
+        return os.path.join(self.sessions_dir, upload_id)
+
+    def _load_session(self, upload_id: str, owner_id: Any) -> Dict[str, Any]:
+        # Upload IDs are generated hex strings; anything else cannot name a session
+        if not upload_id.isalnum():
+            raise ChunkedUploadError("Upload session not found", status_code=404)
+        try:
+            with open(os.path.join(self._session_dir(upload_id), "session.json")) as f:
+                session = json.load(f)
+        except FileNotFoundError:
+            raise ChunkedUploadError("Upload session not found", status_code=404)
+        if session["owner_id"] != owner_id:
+            raise ChunkedUploadError("Upload session not found", status_code=404)
+        return session
+
+    def _received_chunks(self, upload_id: str) -> set:
+        chunks_dir = os.path.join(self._session_dir(upload_id), "chunks")
+        try:
+            return {int(name) for name in os.listdir(chunks_dir) if name.isdigit()}
+        except FileNotFoundError:
+            # Completed or aborted since the session was read
+            raise ChunkedUploadError("Upload session not found", status_code=404)
@@ -0,0 +1,286 @@
+# CorpusStore keeping extracted document text in a compact, memory-mapped file
+import os
+import json
+import mmap
+import bisect
+import threading
+from array import array
+from typing import List, Dict, Any, Optional, Iterator
+
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Rewrite the text file once this fraction of its bytes belongs to deleted documents
+COMPACTION_THRESHOLD = 0.25
+
+
+def encode_offsets(text: str, offsets: List[int]) -> Dict[int, int]:
+    """
+    Map character offsets in a string to byte offsets in its UTF-8 encoding.
+
+    The text is encoded piecewise between consecutive offsets, so converting
+    every chunk boundary of a document costs a single pass over it.
+
+    Returns:
+        Mapping of each character offset to its byte offset
+    """
+    mapping = {}
+    position = previous = 0
+    for offset in sorted(set(offsets)):
+        position += len(text[previous:offset].encode("utf-8"))
+        mapping[offset] = position
+        previous = offset
+    return mapping
+
+
+class CorpusStore:
+    """
+    Append-only store of extracted document text.
+
+    All documents are concatenated as UTF-8 in a single file that is read
+    through a memory map, with an offsets table recording where each
+    document and each of its pages starts. Reads return memoryview slices
+    of the map, so passages are served without loading whole documents
+    into Python strings. Offsets passed to and returned by the store are
+    byte offsets relative to the start of a document, which stay valid
+    when the file is compacted.
+
+    Files:
+        text.bin: Concatenated UTF-8 text of every document
+        pages.u64: Start offset of every page, relative to its document
+        documents.jsonl: Log of added and deleted documents
+        meta.json: Committed sizes of the three files above
+    """
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        self.text_path = os.path.join(store_dir, "text.bin")
+        self.pages_path = os.path.join(store_dir, "pages.u64")
+        self.log_path = os.path.join(store_dir, "documents.jsonl")
+        self.meta_path = os.path.join(store_dir, "meta.json")
+        self.lock = threading.RLock()
+        self._map = None
+        self._load()
+
+    def _load(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        meta = {}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+
+        self.text_bytes = meta.get("text_bytes", 0)
+        self.log_records = meta.get("log_records", 0)
+        self.documents: Dict[str, Dict[str, int]] = {}
+        self.dead_bytes = 0
+
+        self.pages = array("Q")
+        page_rows = meta.get("page_rows", 0)
+        if page_rows:
+            with open(self.pages_path, "rb") as f:
+                self.pages.fromfile(f, page_rows)
+
+        log_size = 0
+        if self.log_records:
+            with open(self.log_path, "rb") as f:
+                for number, line in enumerate(f):
+                    if number == self.log_records:
+                        break
+                    self._apply(json.loads(line))
+                    log_size += len(line)
+
+        # Drop anything written after the last committed sizes
+        for path, size in (
+            (self.text_path, self.text_bytes),
+            (self.pages_path, page_rows * self.pages.itemsize),
+            (self.log_path, log_size),
+        ):
+            with open(path, "ab") as f:
+                f.truncate(size)
+        self._write_meta()
+
+    def _apply(self, record: Dict[str, Any]):
+        previous = self.documents.pop(record["document_id"], None)
+        if previous:
+            self.dead_bytes += previous["length"]
+        if not record.get("deleted"):
+            self.documents[record["document_id"]] = {
+                key: record[key] for key in ("offset", "length", "page_row", "page_count")
+            }
+
+    def _write_meta(self):
+        temp_path = self.meta_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({
+                "text_bytes": self.text_bytes,
+                "page_rows": len(self.pages),
+                "log_records": self.log_records,
+            }, f)
+        os.replace(temp_path, self.meta_path)
+
+    def _append_log(self, record: Dict[str, Any]):
+        with open(self.log_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        self.log_records += 1
+        self._apply(record)
+
+    def _view(self) -> memoryview:
+        # Appends grow the file, so the map is recreated when it no longer covers it.
+        # Views handed out earlier keep their own map alive until they are released.
+        if self._map is None or len(self._map) < self.text_bytes:
+            self._map = None
+            if self.text_bytes:
+                with open(self.text_path, "rb") as f:
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._map) if self._map is not None else memoryview(b"")
+
+    def add(self, document_id: str, pages: List[str]) -> Dict[str, int]:
+        """
+        Store the text of a document, replacing any previous version of it.
+
+        Args:
+            document_id: Document ID
+            pages: Text of each page, in order (a single item for unpaged documents)
+
+        Returns:
+            The document's entry: offset and length in bytes, page_row and page_count
+        """
+        encoded = [page.encode("utf-8") for page in pages] or [b""]
+        with self.lock:
+            offset = self.text_bytes
+            page_row = len(self.pages)
+            position = 0
+            with open(self.text_path, "ab") as f:
+                for page in encoded:
+                    self.pages.append(position)
+                    f.write(page)
+                    position += len(page)
+            with open(self.pages_path, "ab") as f:
+                self.pages[page_row:].tofile(f)
+            self.text_bytes += position
+
+            self._append_log({
+                "document_id": document_id,
+                "offset": offset,
+                "length": position,
+                "page_row": page_row,
+                "page_count": len(encoded),
+            })
+            self._write_meta()
+            self._compact_if_needed()
+            return dict(self.documents[document_id])
+
+    def delete(self, document_id: str) -> bool:
+        """Remove a document. Returns False if it was not stored."""
+        with self.lock:
+            if document_id not in self.documents:
+                return False
+            self._append_log({"document_id": document_id, "deleted": True})
+            self._write_meta()
+            self._compact_if_needed()
+            return True
+
+    def _compact_if_needed(self):
+        if self.dead_bytes and self.dead_bytes >= COMPACTION_THRESHOLD * self.text_bytes:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the store without the text of deleted documents"""
+        with self.lock:
+            view = self._view()
+            documents = {}
+            pages = array("Q")
+            offset = 0
+
+            temp_path = self.text_path + ".tmp"
+            with open(temp_path, "wb") as f:
+                for document_id, entry in self.documents.items():
+                    f.write(view[entry["offset"]:entry["offset"] + entry["length"]])
+                    documents[document_id] = {
+                        "offset": offset,
+                        "length": entry["length"],
+                        "page_row": len(pages),
+                        "page_count": entry["page_count"],
+                    }
+                    pages.extend(self.pages[entry["page_row"]:entry["page_row"] + entry["page_count"]])
+                    offset += entry["length"]
+            view.release()
+
+            # Readers holding views of the old file keep its (unlinked) map
+            os.replace(temp_path, self.text_path)
+            self._map = None
+            with open(self.pages_path + ".tmp", "wb") as f:
+                pages.tofile(f)
+            os.replace(self.pages_path + ".tmp", self.pages_path)
+            with open(self.log_path + ".tmp", "w") as f:
+                for document_id, entry in documents.items():
+                    f.write(json.dumps({"document_id": document_id, **entry}) + "\n")
+            os.replace(self.log_path + ".tmp", self.log_path)
+
+            logger.info(f"Compacted corpus {self.store_dir}: {self.text_bytes} -> {offset} bytes")
+            self.documents = documents
+            self.pages = pages
+            self.text_bytes = offset
+            self.dead_bytes = 0
+            self.log_records = len(documents)
+            self._write_meta()
+
+    def __contains__(self, document_id: str) -> bool:
+        return document_id in self.documents
+
+    def get_document(self, document_id: str) -> Optional[Dict[str, int]]:
+        """Return the entry of a stored document"""
+        with self.lock:
+            entry = self.documents.get(document_id)
+            return dict(entry) if entry else None
+
+    def slice(self, document_id: str, start: int = 0, end: Optional[int] = None) -> memoryview:
+        """
+        Return a zero-copy view of a byte range of a document.
+
+        Raises:
+            KeyError: If the document is not stored
+        """
+        with self.lock:
+            entry = self.documents[document_id]
+            length = entry["length"]
+            end = length if end is None else min(end, length)
+            start = min(max(start, 0), end)
+            return self._view()[entry["offset"] + start:entry["offset"] + end]
+
+    def text(self, document_id: str, start: int = 0, end: Optional[int] = None) -> str:
+        """Decode a byte range of a document"""
+        with self.slice(document_id, start, end) as view:
+            return str(view, "utf-8", errors="replace")
+
+    def page_count(self, document_id: str) -> int:
+        return self.documents[document_id]["page_count"]
+
+    def page_span(self, document_id: str, number: int) -> tuple:
+        """Return the (start, end) byte offsets of a page, numbered from 0"""
+        with self.lock:
+            entry = self.documents[document_id]
+            if not 0 <= number < entry["page_count"]:
+                raise IndexError(f"Document {document_id} has no page {number}")
+            row = entry["page_row"] + number
+            start = self.pages[row]
+            end = self.pages[row + 1] if number + 1 < entry["page_count"] else entry["length"]
+            return start, end
+
+    def page(self, document_id: str, number: int) -> memoryview:
+        """Return a zero-copy view of one page of a document"""
+        start, end = self.page_span(document_id, number)
+        return self.slice(document_id, start, end)
+
+    def iter_pages(self, document_id: str) -> Iterator[memoryview]:
+        """Yield a view of each page of a document in order"""
+        for number in range(self.page_count(document_id)):
+            yield self.page(document_id, number)
+
+    def page_of(self, document_id: str, offset: int) -> int:
+        """Return the number of the page containing a byte offset of a document"""
+        with self.lock:
+            entry = self.documents[document_id]
+            row = entry["page_row"]
+            return bisect.bisect_right(self.pages, offset, row, row + entry["page_count"]) - row - 1
@@ -43,6 +43,19 @@ class GeminiService:
         """
         Query the Gemini AI model with context from documents and chat history
         """
+        # Construct prompt with proper context
+        prompt = self._construct_prompt(query, document_context, chat_history)
+        return self.generate(prompt, temperature=temperature)
+    
+    def generate(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_output_tokens: int = 8192
+    ) -> Dict[str, Any]:
+        """
+        Send a fully constructed prompt to the Gemini AI model
+        """
         if not self.initialized:
             return {
                 "error": "Gemini API not initialized",
@@ -50,9 +63,6 @@ class GeminiService:
             }
         
         try:
-            # Construct prompt with proper context
-            prompt = self._construct_prompt(query, document_context, chat_history)
-            
             # Generate response
             response = self.model.generate_content(
                 prompt,
@@ -60,7 +70,7 @@ class GeminiService:
                     temperature=temperature,
                     top_p=0.95,
                     top_k=40,
-                    max_output_tokens=8192,
+                    max_output_tokens=max_output_tokens,
                 )
             )
             
@@ -89,7 +99,25 @@ class GeminiService:
         system_instruction = """You are a legal assistant specializing in Zimbabwe law. Help the user with their legal research questions."""
         
         prompt_parts.append(system_instruction)
-        
+
+        # Add the retrieved document passages
+        if document_context:
+            passages = [
+                f"[{doc.get('name') or doc.get('id')}]\n{doc['content']}"
+                for doc in document_context
+                if doc.get("content")
+            ]
+            if passages:
+                prompt_parts.append("RELEVANT DOCUMENT PASSAGES:\n\n" + "\n\n".join(passages))
+
+        # Add the conversation so far
+        if chat_history:
+            turns = [
+                f"{(msg.get('role') or msg.get('type') or 'user').upper()}: {msg.get('content', '')}"
+                for msg in chat_history
+            ]
+            prompt_parts.append("CONVERSATION HISTORY:\n" + "\n".join(turns))
+
         # Add the current query
         prompt_parts.append(f"CURRENT QUERY: {query}\n\nPlease provide a helpful response.")
         
@@ -0,0 +1,204 @@
+# RetrievalService combining vector and BM25 keyword search over uploaded documents
+import os
+import re
+import hashlib
+from typing import List, Dict, Any, Optional, Union
+
+import numpy as np
+
+from .corpus_store_service import CorpusStore, encode_offsets
+from .vector_index_service import VectorIndexService
+from .bm25_index_service import BM25IndexService, fuse_scores
+from ..utils.document_processor import chunk_text
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Weight of the vector score in the hybrid ranking (the rest goes to BM25)
+HYBRID_ALPHA = float(os.getenv("RETRIEVAL_HYBRID_ALPHA", "0.5"))
+
+# Candidates taken from each ranker per requested passage before fusion
+CANDIDATE_MULTIPLIER = 4
+
+# Documents whose SimHashes differ in at most this many of 64 bits are near-duplicates.
+# Drafts differing in a few percent of their words typically land within 8 bits,
+# while unrelated documents differ in about 32.
+DUPLICATE_DISTANCE = 8
+
+
+def simhash(text: str) -> int:
+    """
+    Compute the 64-bit SimHash of a text from its word trigrams.
+
+    Each trigram votes on every bit with its hash, weighted by how often
+    it occurs; similar texts get fingerprints a small Hamming distance apart.
+    """
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return 0
+    features = {}
+    for i in range(max(len(words) - 2, 1)):
+        feature = " ".join(words[i:i + 3])
+        features[feature] = features.get(feature, 0) + 1
+
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "big") for f in features],
+        dtype=">u8"
+    )
+    weights = np.array(list(features.values()), dtype=np.int64)
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1).astype(np.int64)
+    votes = weights @ (2 * bits - 1)
+    return int("".join("1" if vote > 0 else "0" for vote in votes), 2)
+
+
+def hamming_distance(first: int, second: int) -> int:
+    return bin(first ^ second).count("1")
+
+
+class RetrievalService:
+    """
+    Hybrid retrieval over extracted document text.
+
+    Every document is chunked once and the same chunks are added to both the
+    vector index (semantic similarity) and the BM25 index (exact terms such as
+    section numbers, party names and defined terms). Queries take the best
+    candidates from each and rank them by a fused score.
+
+    The extracted text itself is kept once, in a memory-mapped corpus
+    store; the indexes only record the byte range of each chunk.
+    """
+
+    def __init__(self, index_root: str, embedder=None, alpha: float = HYBRID_ALPHA):
+        self.corpus = CorpusStore(os.path.join(index_root, "corpus"))
+        self.vector_index = VectorIndexService(index_root, embedder=embedder, corpus=self.corpus)
+        self.keyword_index = BM25IndexService(index_root)
+        self.alpha = alpha
+
+    def index_document(
+        self,
+        case_key: str,
+        document_id: str,
+        name: str,
+        text: Union[str, List[str]],
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        Store a document's text in the corpus, chunk it and add it to both
+        indexes of its case.
+
+        Args:
+            case_key: Case the document belongs to
+            document_id: Document ID
+            name: Display name of the document
+            text: Extracted text, or the text of each page
+            metadata: Extra fields kept in the document's registry entry
+
+        Returns:
+            The number of chunks indexed
+        """
+        previous = self.vector_index.get_document(document_id)
+        if previous and previous["case_key"] != case_key:
+            self.keyword_index.remove_document(previous["case_key"], document_id)
+
+        pages = [text] if isinstance(text, str) else text
+        self.corpus.add(document_id, pages)
+
+        # Chunks are located by byte offsets so passages can be sliced straight out of the corpus
+        full_text = "".join(pages)
+        chunks = chunk_text(full_text)
+        byte_offsets = encode_offsets(full_text, [offset for chunk in chunks for offset in (chunk["start"], chunk["end"])])
+        for chunk in chunks:
+            chunk["start"] = byte_offsets[chunk["start"]]
+            chunk["end"] = byte_offsets[chunk["end"]]
+            chunk["page"] = self.corpus.page_of(document_id, chunk["start"])
+        self.keyword_index.index_chunks(case_key, document_id, chunks)
+        return self.vector_index.index_chunks(
+            case_key, document_id, name, chunks, metadata={**(metadata or {}), "simhash": simhash(full_text)}
+        )
+
+    def remove_document(self, document_id: str) -> bool:
+        """Remove a document from both indexes. Returns False if it was not indexed."""
+        entry = self.vector_index.get_document(document_id)
+        if entry is None:
+            return False
+        self.keyword_index.remove_document(entry["case_key"], document_id)
+        self.corpus.delete(document_id)
+        return self.vector_index.remove_document(document_id)
+
+    def get_document(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Return the registry entry of an indexed document"""
+        return self.vector_index.get_document(document_id)
+
+    def search(
+        self,
+        query: str,
+        case_key: Optional[str] = None,
+        document_ids: Optional[List[str]] = None,
+        top_k: int = 8,
+        dedupe: bool = False,
+        owner_id: Optional[Any] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Find the passages most relevant to a query using the hybrid ranking.
+
+        Args:
+            query: Natural language query
+            case_key: Case whose documents are searched
+            document_ids: Restrict the search to these documents
+            top_k: Number of passages to return
+            dedupe: Skip passages from near-duplicates (e.g. earlier drafts) of
+                documents that already contributed a higher-ranked passage
+            owner_id: Only search the documents this user uploaded
+
+        Returns:
+            Passages ordered by decreasing hybrid score
+        """
+        if owner_id is not None:
+            document_ids = self.vector_index.owned_documents(owner_id, case_key, document_ids)
+            if not document_ids:
+                return []
+
+        case_keys = self.vector_index.resolve_case_keys(case_key, document_ids)
+        if not case_keys:
+            return []
+
+        candidates = top_k * CANDIDATE_MULTIPLIER
+        vector_results = self.vector_index.search(query, case_key, document_ids, candidates)
+        keyword_results = self.keyword_index.search(query, case_keys, document_ids, candidates)
+        fused = fuse_scores(vector_results, keyword_results, self.alpha)
+
+        # Only the passages returned are read from the corpus
+        entries = {
+            doc_id: self.vector_index.get_document(doc_id)
+            for doc_id, _ in fused
+            if self.vector_index.get_document(doc_id)
+        }
+
+        passages = []
+        kept_fingerprints = {}
+        for (document_id, chunk), score in sorted(fused.items(), key=lambda item: item[1], reverse=True):
+            if document_id not in entries:
+                continue
+            if dedupe and not self._keep_document(document_id, entries[document_id], kept_fingerprints):
+                continue
+            passage = self.vector_index.get_passage(entries[document_id]["case_key"], document_id, chunk)
+            if passage is None:
+                continue
+            passage["score"] = score
+            passages.append(passage)
+            if len(passages) == top_k:
+                break
+        return passages
+
+    def _keep_document(self, document_id: str, entry: Dict[str, Any], kept_fingerprints: Dict[str, int]) -> bool:
+        # Only the few documents already in the results are compared against
+        fingerprint = entry.get("simhash")
+        if fingerprint is None or document_id in kept_fingerprints:
+            return True
+        if any(
+            hamming_distance(fingerprint, kept) <= DUPLICATE_DISTANCE
+            for kept in kept_fingerprints.values()
+        ):
+            return False
+        kept_fingerprints[document_id] = fingerprint
+        return True
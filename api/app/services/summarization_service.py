@@ -0,0 +1,254 @@
+# SummarizationService for map-reduce summaries of documents too long for a single prompt
+import os
+import re
+import time
+import zlib
+import asyncio
+import hashlib
+from typing import List, Dict, Any, Optional
+
+from .gemini_service import GeminiService
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Bump when the prompts change so cached summaries are not reused for them
+PROMPT_VERSION = "1"
+
+# Average number of words in each chunk summarized by the map step
+TARGET_CHUNK_WORDS = int(os.getenv("SUMMARY_CHUNK_WORDS", "1500"))
+
+# Average number of partial summaries merged by each reduce step
+MERGE_FAN_IN = 6
+
+# Gemini calls allowed in flight and per minute for one summarization
+MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "4"))
+REQUESTS_PER_MINUTE = int(os.getenv("SUMMARY_REQUESTS_PER_MINUTE", "60"))
+
+MAP_PROMPT = """You are a legal assistant specializing in Zimbabwe law. Summarize the following excerpt of a longer legal document.
+Keep every party name, date, amount, section or case reference, finding and order that appears in it.{focus}
+
+EXCERPT:
+{text}"""
+
+REDUCE_PROMPT = """You are a legal assistant specializing in Zimbabwe law. The following are summaries of consecutive parts of one legal document.
+Combine them into a single coherent summary in document order, removing repetition but keeping every party name, date, amount, section or case reference, finding and order.{focus}
+
+PARTIAL SUMMARIES:
+{text}"""
+
+
+class SummarizationError(Exception):
+    """Error raised when a part of a document could not be summarized"""
+    pass
+
+
+def split_into_chunks(text: str, target_words: int = TARGET_CHUNK_WORDS) -> List[str]:
+    """
+    Split text into chunks of roughly target_words words at content-defined boundaries.
+
+    A chunk ends after a word pair whose hash hits a fixed pattern (subject to
+    minimum and maximum sizes), so boundaries depend only on the nearby text.
+    An edit therefore changes the chunks around it but leaves the boundaries,
+    and so the cached summaries, of the rest of the document intact.
+    """
+    minimum = max(target_words // 2, 1)
+    divisor = max(target_words - minimum, 1)
+    maximum = target_words * 2
+
+    chunks = []
+    start = None
+    count = 0
+    previous = ""
+    for match in re.finditer(r"\S+", text):
+        word = match.group()
+        if start is None:
+            start = match.start()
+        count += 1
+        boundary = zlib.crc32(f"{previous} {word}".encode("utf-8")) % divisor == 0
+        previous = word
+        if (count >= minimum and boundary) or count >= maximum:
+            chunks.append(text[start:match.end()])
+            start = None
+            count = 0
+    if start is not None:
+        chunks.append(text[start:])
+    return chunks
+
+
+def group_nodes(keys: List[str], fan_in: int = MERGE_FAN_IN) -> List[List[int]]:
+    """
+    Group consecutive tree nodes for merging, again at content-defined boundaries.
+
+    Returns:
+        Lists of node positions; every group but the last has at least two nodes
+    """
+    groups = []
+    current = []
+    for position, key in enumerate(keys):
+        current.append(position)
+        if (len(current) >= 2 and int(key[:8], 16) % fan_in == 0) or len(current) >= fan_in * 2:
+            groups.append(current)
+            current = []
+    if current:
+        groups.append(current)
+    return groups
+
+
+class RateLimiter:
+    """Spaces out calls so that no more than requests_per_minute start in any minute"""
+
+    def __init__(self, requests_per_minute: int):
+        self.interval = 60.0 / requests_per_minute
+        self.next_slot = 0.0
+
+    async def acquire(self):
+        # Slots are claimed without awaiting, so concurrent callers never share one
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class SummaryCache:
+    """On-disk cache of node summaries keyed by content hash"""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, summary: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(summary)
+        os.replace(temp_path, path)
+
+
+class SummarizationService:
+    """
+    Map-reduce summarization of long documents with Gemini.
+
+    The document is split into chunks that are summarized concurrently
+    (the map step), and the partial summaries are merged a few at a time,
+    level by level, until a single summary remains (the reduce step).
+    Every node of this tree is keyed by a hash of its content: leaves by
+    their text, merges by the keys of their children. Summaries are cached
+    under these keys, so summarizing an edited document only calls Gemini
+    for the chunks that changed and the merges above them.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        gemini: Optional[GeminiService] = None,
+        max_concurrency: int = MAX_CONCURRENCY,
+        requests_per_minute: int = REQUESTS_PER_MINUTE,
+        target_chunk_words: int = TARGET_CHUNK_WORDS,
+        fan_in: int = MERGE_FAN_IN
+    ):
+        self.cache = SummaryCache(cache_dir)
+        self.gemini = gemini or GeminiService()
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = RateLimiter(requests_per_minute)
+        self.target_chunk_words = target_chunk_words
+        self.fan_in = fan_in
+
+    def _key(self, kind: str, content: str, focus: str) -> str:
+        material = "\0".join([PROMPT_VERSION, self.gemini.model_name, kind, focus, content])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def summarize(self, text: str, focus: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Summarize a document of any length.
+
+        Args:
+            text: Full text of the document
+            focus: Optional instruction on what the summary should concentrate on
+
+        Returns:
+            Dict with the summary and statistics: chunks, levels, gemini_calls
+            and cached_nodes
+
+        Raises:
+            SummarizationError: If Gemini fails to summarize any part
+        """
+        focus = focus or ""
+        stats = {"gemini_calls": 0, "cached_nodes": 0}
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        chunks = split_into_chunks(text, self.target_chunk_words)
+        if not chunks:
+            return {"summary": "", "chunks": 0, "levels": 0, **stats}
+
+        # Map: summarize every chunk
+        keys = [self._key("map", chunk, focus) for chunk in chunks]
+        summaries = await asyncio.gather(*[
+            self._summarize_node(key, MAP_PROMPT, chunk, focus, semaphore, stats)
+            for key, chunk in zip(keys, chunks)
+        ])
+
+        # Reduce: merge groups of partial summaries until one remains
+        levels = 1
+        while len(summaries) > 1:
+            groups = group_nodes(keys, self.fan_in)
+            tasks = []
+            next_keys = []
+            for group in groups:
+                if len(group) == 1:
+                    # A lone node is carried up unchanged
+                    next_keys.append(keys[group[0]])
+                    tasks.append(asyncio.sleep(0, result=summaries[group[0]]))
+                    continue
+                key = self._key("reduce", "".join(keys[position] for position in group), focus)
+                merged = "\n\n".join(
+                    f"PART {number}:\n{summaries[position]}" for number, position in enumerate(group, 1)
+                )
+                next_keys.append(key)
+                tasks.append(self._summarize_node(key, REDUCE_PROMPT, merged, focus, semaphore, stats))
+            summaries = await asyncio.gather(*tasks)
+            keys = next_keys
+            levels += 1
+
+        logger.info(
+            f"Summarized {len(chunks)} chunks in {levels} levels with "
+            f"{stats['gemini_calls']} Gemini calls ({stats['cached_nodes']} cached)"
+        )
+        return {"summary": summaries[0], "chunks": len(chunks), "levels": levels, **stats}
+
+    async def _summarize_node(
+        self,
+        key: str,
+        template: str,
+        text: str,
+        focus: str,
+        semaphore: asyncio.Semaphore,
+        stats: Dict[str, int]
+    ) -> str:
+        cached = self.cache.get(key)
+        if cached is not None:
+            stats["cached_nodes"] += 1
+            return cached
+
+        prompt = template.format(text=text, focus=f"\nFocus on: {focus}" if focus else "")
+        async with semaphore:
+            await self.rate_limiter.acquire()
+            stats["gemini_calls"] += 1
+            result = await asyncio.to_thread(self.gemini.generate, prompt, 0.2, 2048)
+
+        if result.get("error"):
+            raise SummarizationError(f"Gemini failed to summarize part of the document: {result['error']}")
+        summary = result["response"].strip()
+        self.cache.put(key, summary)
+        return summary
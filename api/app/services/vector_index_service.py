@@ -0,0 +1,526 @@
+# VectorIndexService for retrieving the most relevant passages of uploaded documents
+import os
+import re
+import json
+import zlib
+import threading
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from ..utils.document_processor import chunk_text
+from ..utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Import these libraries only if available
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+# Local CPU embedding model used when sentence-transformers is installed
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+# Dimensions of the dependency-free fallback embedder
+HASHING_DIMENSIONS = 384
+
+# Compact an index once this fraction of its rows belongs to deleted documents
+COMPACTION_THRESHOLD = 0.25
+
+
+class HashingEmbedder:
+    """
+    Fallback embedder based on signed feature hashing of words and word bigrams.
+
+    It needs no model download, so retrieval keeps working (as a lexical
+    similarity search) on machines without sentence-transformers.
+    """
+
+    def __init__(self, dimensions: int = HASHING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.name = f"hashing-{dimensions}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = re.findall(r"\w+", text.lower())
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                hashed = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if hashed & 0x80000000 else -1.0
+                vectors[row, hashed % self.dimensions] += sign
+        return _normalize(vectors)
+
+
+class SentenceTransformerEmbedder:
+    """Embedder running a sentence-transformers model on the CPU"""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dimensions = self.model.get_sentence_embedding_dimension()
+        self.name = model_name
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(
+            texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=True
+        )
+        return vectors.astype(np.float32)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+def get_embedder():
+    """Return the shared embedder, loading the local model on first use"""
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            if SENTENCE_TRANSFORMERS_AVAILABLE:
+                try:
+                    _embedder = SentenceTransformerEmbedder()
+                    logger.info(f"Loaded embedding model '{EMBEDDING_MODEL}'")
+                except Exception as e:
+                    logger.error(f"Failed to load embedding model '{EMBEDDING_MODEL}': {e}")
+            if _embedder is None:
+                logger.warning("sentence-transformers is not available. Using the hashing embedder.")
+                _embedder = HashingEmbedder()
+        return _embedder
+
+
+class VectorIndex:
+    """
+    Append-only, memory-mapped vector index for the chunks of one case.
+
+    Vectors are stored as a raw float32 matrix (one row per chunk) with the
+    chunk metadata in a parallel JSON-lines file. A document's chunks are
+    appended together, so its live rows are one contiguous range and a
+    search restricted to some documents masks rows by slicing. Deleting a
+    document only marks its rows as deleted; the files are rewritten once
+    enough rows are dead to make compaction worthwhile.
+    """
+
+    def __init__(self, index_dir: str, embedder_name: str, dimensions: int):
+        self.index_dir = index_dir
+        self.embedder_name = embedder_name
+        self.dimensions = dimensions
+        self.vectors_path = os.path.join(index_dir, "vectors.f32")
+        self.chunks_path = os.path.join(index_dir, "chunks.jsonl")
+        self.meta_path = os.path.join(index_dir, "meta.json")
+        self.lock = threading.RLock()
+        self._vectors = None
+        self._load()
+
+    @property
+    def rows(self) -> int:
+        return len(self.chunks)
+
+    def _rebuild_lookup(self):
+        self.row_lookup = {(chunk["document_id"], chunk["chunk"]): row for row, chunk in enumerate(self.chunks)}
+        self.document_rows = live_row_ranges((chunk["document_id"] for chunk in self.chunks), self.deleted)
+        self._deleted_rows = None
+
+    def _load(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        meta = {}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+
+        if meta and (meta.get("embedder") != self.embedder_name or meta.get("dimensions") != self.dimensions):
+            logger.warning(
+                f"Index {self.index_dir} was built with {meta.get('embedder')}; "
+                f"resetting it for {self.embedder_name}. Documents must be re-indexed."
+            )
+            meta = {}
+
+        rows = meta.get("rows", 0)
+        self.chunks = []
+        if rows and os.path.exists(self.chunks_path):
+            with open(self.chunks_path) as f:
+                for line in f:
+                    if len(self.chunks) == rows:
+                        break
+                    self.chunks.append(json.loads(line))
+        self.deleted = set(meta.get("deleted", []))
+        self._rebuild_lookup()
+
+        # Drop anything written after the last committed row count
+        self._truncate_files()
+        self._write_meta()
+
+    def _truncate_files(self):
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(self.rows * self.dimensions * 4)
+        with open(self.chunks_path, "w") as f:
+            for chunk in self.chunks:
+                f.write(json.dumps(chunk) + "\n")
+        self._vectors = None
+
+    def _write_meta(self):
+        temp_path = self.meta_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({
+                "embedder": self.embedder_name,
+                "dimensions": self.dimensions,
+                "rows": self.rows,
+                "deleted": sorted(self.deleted),
+            }, f)
+        os.replace(temp_path, self.meta_path)
+
+    def _matrix(self) -> np.ndarray:
+        if self._vectors is None or self._vectors.shape[0] != self.rows:
+            if self.rows == 0:
+                self._vectors = np.zeros((0, self.dimensions), dtype=np.float32)
+            else:
+                self._vectors = np.memmap(
+                    self.vectors_path, dtype=np.float32, mode="r", shape=(self.rows, self.dimensions)
+                )
+        return self._vectors
+
+    def add(self, document_id: str, chunks: List[Dict[str, Any]], vectors: np.ndarray):
+        """Append the chunks of a document, replacing any previous version of it"""
+        with self.lock:
+            self.delete(document_id, compact=False)
+            start = self.rows
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            with open(self.chunks_path, "a") as f:
+                for number, chunk in enumerate(chunks):
+                    record = {"document_id": document_id, "chunk": number, **chunk}
+                    f.write(json.dumps(record) + "\n")
+                    self.row_lookup[(document_id, number)] = len(self.chunks)
+                    self.chunks.append(record)
+            if self.rows > start:
+                self.document_rows[document_id] = (start, self.rows)
+            self._write_meta()
+            self._compact_if_needed()
+
+    def delete(self, document_id: str, compact: bool = True) -> int:
+        """Mark every chunk of a document as deleted and return how many there were"""
+        with self.lock:
+            start, end = self.document_rows.pop(document_id, (0, 0))
+            if end > start:
+                self.deleted.update(range(start, end))
+                self._deleted_rows = None
+                self._write_meta()
+                if compact:
+                    self._compact_if_needed()
+            return end - start
+
+    def _compact_if_needed(self):
+        if self.deleted and len(self.deleted) >= COMPACTION_THRESHOLD * self.rows:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the index files without the rows of deleted documents"""
+        with self.lock:
+            keep = [row for row in range(self.rows) if row not in self.deleted]
+            vectors = np.array(self._matrix()[keep]) if keep else np.zeros((0, self.dimensions), dtype=np.float32)
+            self._vectors = None
+
+            temp_path = self.vectors_path + ".tmp"
+            with open(temp_path, "wb") as f:
+                f.write(vectors.tobytes())
+            os.replace(temp_path, self.vectors_path)
+
+            self.chunks = [self.chunks[row] for row in keep]
+            self.deleted = set()
+            self._rebuild_lookup()
+            self._truncate_files()
+            self._write_meta()
+
+    def _live_mask(self, document_ids: Optional[List[str]]) -> np.ndarray:
+        # Costs one slice per requested document rather than a pass over every row
+        if document_ids is None:
+            if self._deleted_rows is None:
+                self._deleted_rows = np.fromiter(self.deleted, dtype=np.int64, count=len(self.deleted))
+            live = np.ones(self.rows, dtype=bool)
+            live[self._deleted_rows] = False
+            return live
+        live = np.zeros(self.rows, dtype=bool)
+        for document_id in document_ids:
+            start, end = self.document_rows.get(document_id, (0, 0))
+            live[start:end] = True
+        return live
+
+    def get_chunk(self, document_id: str, chunk: int) -> Optional[Dict[str, Any]]:
+        """Return the record of a live chunk"""
+        with self.lock:
+            row = self.row_lookup.get((document_id, chunk))
+            if row is None or row in self.deleted:
+                return None
+            return self.chunks[row]
+
+    def search(
+        self,
+        query_vector: np.ndarray,
+        top_k: int,
+        document_ids: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the top_k live chunks most similar to the query vector.
+
+        Args:
+            query_vector: Normalized query embedding
+            top_k: Number of chunks to return
+            document_ids: Optionally restrict the search to these documents
+
+        Returns:
+            Chunk records with their cosine similarity under "score"
+        """
+        with self.lock:
+            if self.rows == 0:
+                return []
+            scores = self._matrix() @ query_vector.astype(np.float32)
+
+            live = self._live_mask(document_ids)
+            scores = np.where(live, scores, -np.inf)
+
+            top_k = min(top_k, int(np.count_nonzero(live)))
+            if top_k <= 0:
+                return []
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+            best = best[np.argsort(-scores[best])]
+            return [{**self.chunks[row], "score": float(scores[row])} for row in best]
+
+
+class VectorIndexService:
+    """
+    Service that chunks, embeds and indexes extracted document text,
+    keeping one vector index per case, and retrieves the passages most
+    relevant to a query.
+
+    When a corpus store is given, chunk records only keep the byte range
+    of their passage and the text is read back from the corpus.
+    """
+
+    def __init__(self, index_root: str, embedder=None, corpus=None):
+        self.index_root = index_root
+        self.registry_path = os.path.join(index_root, "documents.json")
+        self._embedder = embedder
+        self.corpus = corpus
+        self._indexes: Dict[str, VectorIndex] = {}
+        self._lock = threading.RLock()
+        self._registry = None
+        # Document IDs by owner, so a user's documents are found without scanning the registry
+        self._owned: Dict[tuple, set] = {}
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = get_embedder()
+        return self._embedder
+
+    def _index(self, case_key: str) -> VectorIndex:
+        with self._lock:
+            if case_key not in self._indexes:
+                self._indexes[case_key] = VectorIndex(
+                    os.path.join(self.index_root, "cases", _safe_key(case_key)),
+                    self.embedder.name,
+                    self.embedder.dimensions
+                )
+            return self._indexes[case_key]
+
+    def _documents(self) -> Dict[str, Dict[str, Any]]:
+        # Maps each document ID to the case index holding its chunks
+        if self._registry is None:
+            self._registry = {}
+            if os.path.exists(self.registry_path):
+                with open(self.registry_path) as f:
+                    self._registry = json.load(f)
+            for document_id, entry in self._registry.items():
+                self._owned.setdefault(_owner_key(entry), set()).add(document_id)
+        return self._registry
+
+    def _set_entry(self, document_id: str, entry: Optional[Dict[str, Any]]):
+        # Replaces (or removes, given None) a registry entry, keeping the owner lookup in step
+        documents = self._documents()
+        previous = documents.pop(document_id, None)
+        if previous is not None:
+            self._owned.get(_owner_key(previous), set()).discard(document_id)
+        if entry is not None:
+            documents[document_id] = entry
+            self._owned.setdefault(_owner_key(entry), set()).add(document_id)
+
+    def _save_documents(self):
+        os.makedirs(self.index_root, exist_ok=True)
+        temp_path = self.registry_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self._documents(), f)
+        os.replace(temp_path, self.registry_path)
+
+    def index_document(self, case_key: str, document_id: str, name: str, text: str) -> int:
+        """
+        Chunk, embed and add a document's text to its case index.
+
+        Returns:
+            The number of chunks indexed
+        """
+        return self.index_chunks(case_key, document_id, name, chunk_text(text))
+
+    def index_chunks(
+        self,
+        case_key: str,
+        document_id: str,
+        name: str,
+        chunks: List[Dict[str, Any]],
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        Embed and add already chunked document text to its case index.
+        Any metadata is stored in the document's registry entry.
+        """
+        # Embedding is the slow step, so it runs before the lock is taken
+        if chunks:
+            vectors = self.embedder.embed([chunk["text"] for chunk in chunks])
+            if self.corpus is not None:
+                chunks = [{key: value for key, value in chunk.items() if key != "text"} for chunk in chunks]
+
+        with self._lock:
+            previous = self._documents().get(document_id)
+            if previous and previous["case_key"] != case_key:
+                self._index(previous["case_key"]).delete(document_id)
+
+            if chunks:
+                self._index(case_key).add(document_id, chunks, vectors)
+            else:
+                self._index(case_key).delete(document_id)
+
+            self._set_entry(document_id, {
+                **(metadata or {}), "case_key": case_key, "name": name, "chunks": len(chunks)
+            })
+            self._save_documents()
+
+        logger.info(f"Indexed {len(chunks)} chunks of document {document_id} for case {case_key}")
+        return len(chunks)
+
+    def remove_document(self, document_id: str) -> bool:
+        """Remove a document from its case index. Returns False if it was not indexed."""
+        with self._lock:
+            entry = self._documents().get(document_id)
+            if entry is None:
+                return False
+            self._set_entry(document_id, None)
+            self._index(entry["case_key"]).delete(document_id)
+            self._save_documents()
+        return True
+
+    def get_document(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Return the registry entry of an indexed document"""
+        with self._lock:
+            return self._documents().get(document_id)
+
+    def owned_documents(
+        self,
+        owner_id: Any,
+        case_key: Optional[str] = None,
+        document_ids: Optional[List[str]] = None
+    ) -> List[str]:
+        """IDs of the documents a user uploaded, optionally only those in a case or among given IDs"""
+        with self._lock:
+            documents = self._documents()
+            if document_ids is not None:
+                candidates = document_ids
+            else:
+                candidates = sorted(
+                    self._owned.get(("owner", owner_id), set()) | self._owned.get(("case", f"user-{owner_id}"), set())
+                )
+            return [
+                document_id for document_id in candidates
+                if document_id in documents
+                and is_document_owner(documents[document_id], owner_id)
+                and (case_key is None or documents[document_id]["case_key"] == case_key)
+            ]
+
+    def search(
+        self,
+        query: str,
+        case_key: Optional[str] = None,
+        document_ids: Optional[List[str]] = None,
+        top_k: int = 8
+    ) -> List[Dict[str, Any]]:
+        """
+        Find the passages most relevant to a query.
+
+        Args:
+            query: Natural language query
+            case_key: Case whose documents are searched
+            document_ids: Restrict the search to these documents (searched across
+                their cases when no case_key is given)
+            top_k: Number of passages to return
+
+        Returns:
+            Passages ordered by decreasing similarity
+        """
+        case_keys = self.resolve_case_keys(case_key, document_ids)
+        if not case_keys:
+            return []
+        indexes = [self._index(key) for key in case_keys]
+
+        query_vector = self.embedder.embed([query])[0]
+        results = []
+        for index in indexes:
+            results.extend(index.search(query_vector, top_k, document_ids))
+        results.sort(key=lambda passage: passage["score"], reverse=True)
+        return [self._resolve_passage(passage) for passage in results[:top_k]]
+
+    def resolve_case_keys(self, case_key: Optional[str], document_ids: Optional[List[str]]) -> List[str]:
+        """Case indexes to search for a case, or for a set of documents when no case is given"""
+        if case_key is not None:
+            return [case_key]
+        if not document_ids:
+            return []
+        with self._lock:
+            documents = self._documents()
+            return sorted({documents[d]["case_key"] for d in document_ids if d in documents})
+
+    def get_passage(self, case_key: str, document_id: str, chunk: int) -> Optional[Dict[str, Any]]:
+        """Return the text and location of one indexed chunk"""
+        record = self._index(case_key).get_chunk(document_id, chunk)
+        return self._resolve_passage(dict(record)) if record else None
+
+    def _resolve_passage(self, passage: Dict[str, Any]) -> Dict[str, Any]:
+        entry = self.get_document(passage["document_id"])
+        passage["name"] = entry["name"] if entry else passage["document_id"]
+        if "text" not in passage and self.corpus is not None:
+            passage["text"] = self.corpus.text(passage["document_id"], passage["start"], passage["end"])
+        return passage
+
+
+def is_document_owner(entry: Dict[str, Any], owner_id: Any) -> bool:
+    """Whether a registry entry belongs to a user: they uploaded it, or it is in their own index"""
+    if "owner_id" in entry:
+        return entry["owner_id"] == owner_id
+    return entry["case_key"] == f"user-{owner_id}"
+
+
+def _owner_key(entry: Dict[str, Any]) -> tuple:
+    # Entries indexed before uploads recorded their owner belong to the user whose own index holds them
+    if "owner_id" in entry:
+        return ("owner", entry["owner_id"])
+    return ("case", entry["case_key"])
+
+
+def live_row_ranges(row_documents, deleted) -> Dict[str, tuple]:
+    """
+    Map each document to the [start, end) range of its live rows, given the
+    document of every row. A document's live rows were appended together,
+    so they are contiguous.
+    """
+    ranges = {}
+    for row, document_id in enumerate(row_documents):
+        if row not in deleted:
+            ranges[document_id] = (ranges.get(document_id, (row,))[0], row + 1)
+    return ranges
+
+
+def _safe_key(key: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]", "_", str(key))
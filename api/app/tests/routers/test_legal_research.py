@@ -0,0 +1,177 @@
+import hashlib
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.app.dependencies import get_settings, Settings
+from api.app.routers import legal_research
+from api.app.services.chunked_upload_service import ChunkedUploadService, MIN_CHUNK_SIZE
+from api.app.services.retrieval_service import RetrievalService
+from api.app.services.vector_index_service import HashingEmbedder
+
+LEASE = b"The tenant shall pay the rent monthly to the landlord before the fifth day."
+
+
+@pytest.fixture
+def retrieval(tmp_path):
+    return RetrievalService(index_root=str(tmp_path / "indexes"), embedder=HashingEmbedder())
+
+
+@pytest.fixture
+def research_client(tmp_path, retrieval, monkeypatch):
+    app = FastAPI()
+    app.include_router(legal_research.router)
+    app.dependency_overrides[get_settings] = lambda: Settings(upload_dir=str(tmp_path))
+    app.dependency_overrides[legal_research.get_retrieval_service] = lambda: retrieval
+    chunked_uploads = ChunkedUploadService(storage_dir=str(tmp_path / "documents"), max_size=4 * MIN_CHUNK_SIZE)
+    app.dependency_overrides[legal_research.get_chunked_upload_service] = lambda: chunked_uploads
+    # Background indexing looks the service up directly
+    monkeypatch.setattr(legal_research, "get_retrieval_service", lambda: retrieval)
+    monkeypatch.setattr(legal_research.gemini_service, "query_gemini", lambda **kwargs: "answer")
+    return TestClient(app)
+
+
+def _upload(client, user_id, case_id=None, content=LEASE, name="Lease"):
+    response = client.post(
+        "/legal-research/upload-document",
+        files={"file": ("lease.txt", content, "text/plain")},
+        data={"document_name": name, **({"case_id": case_id} if case_id else {})},
+        headers={"Authorization": f"Bearer user_{user_id}_token"},
+    )
+    assert response.status_code == 200
+    return response.json()["document_id"]
+
+
+def _query(client, user_id, **params):
+    response = client.post(
+        "/legal-research/query",
+        json={"query": "when is the rent due", **params},
+        headers={"Authorization": f"Bearer user_{user_id}_token"},
+    )
+    assert response.status_code == 200
+    return response.json()["document_context_used"]
+
+
+def test_same_file_in_two_cases_is_indexed_in_both(research_client):
+    first = _upload(research_client, 1, case_id="1", name="Lease (case 1)")
+    second = _upload(research_client, 1, case_id="2", name="Lease (case 2)")
+
+    assert first != second
+    assert _upload(research_client, 1, case_id="1", name="Lease (case 1)") == first
+    assert _query(research_client, 1, case_id="1") == ["Lease (case 1)"]
+    assert _query(research_client, 1, case_id="2") == ["Lease (case 2)"]
+
+
+def test_documents_are_only_served_to_their_uploader(research_client):
+    document_id = _upload(research_client, 1, case_id="1")
+    owner = {"Authorization": "Bearer user_1_token"}
+    other = {"Authorization": "Bearer user_2_token"}
+    admin = {"Authorization": "Bearer admin_token"}
+
+    for method, path in [
+        ("get", f"/legal-research/documents/{document_id}"),
+        ("get", f"/legal-research/documents/{document_id}/file"),
+        ("post", f"/legal-research/documents/{document_id}/summary"),
+        ("delete", f"/legal-research/documents/{document_id}"),
+    ]:
+        assert research_client.request(method, path, headers=other).status_code == 404
+
+    assert _query(research_client, 2, document_ids=[document_id]) == []
+    assert _query(research_client, 2, case_id="1") == []
+    assert _query(research_client, 1, document_ids=[document_id]) == ["Lease"]
+    assert research_client.get(f"/legal-research/documents/{document_id}/file", headers=owner).content == LEASE
+    assert research_client.get(f"/legal-research/documents/{document_id}", headers=admin).status_code == 200
+    assert research_client.delete(f"/legal-research/documents/{document_id}", headers=owner).status_code == 200
+
+
+def test_chunked_upload_is_verified_and_completed(research_client):
+    headers = {"Authorization": "Bearer user_1_token"}
+    session = research_client.post("/legal-research/uploads", json={
+        "filename": "lease.txt", "total_size": len(LEASE), "document_name": "Lease",
+    }, headers=headers).json()
+    chunk_url = f"/legal-research/uploads/{session['upload_id']}/chunks/0"
+
+    response = research_client.put(chunk_url, content=LEASE, headers={**headers, "X-Chunk-SHA256": "0" * 64})
+    assert response.status_code == 422
+    response = research_client.put(
+        chunk_url, content=LEASE, headers={**headers, "X-Chunk-SHA256": hashlib.sha256(LEASE).hexdigest()}
+    )
+    assert response.status_code == 200
+
+    response = research_client.post(f"/legal-research/uploads/{session['upload_id']}/complete", headers=headers)
+    assert response.status_code == 200
+    document_id = response.json()["document_id"]
+    assert research_client.get(f"/legal-research/documents/{document_id}/file", headers=headers).content == LEASE
+
+
+def _multipart_body(boundary, filename, content, **fields):
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    ]
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f'Content-Type: application/octet-stream\r\n\r\n'.encode() + content + b"\r\n"
+    )
+    return b"".join(parts) + f"--{boundary}--\r\n".encode()
+
+
+def _stored_files(tmp_path):
+    storage_dir = tmp_path / "legal_research"
+    return os.listdir(storage_dir) if storage_dir.exists() else []
+
+
+def test_upload_reports_text_extraction_as_pending(research_client):
+    response = research_client.post(
+        "/legal-research/upload-document",
+        files={"file": ("lease.txt", LEASE, "text/plain")},
+        data={"document_name": "Lease"},
+        headers={"Authorization": "Bearer user_1_token"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["text_extraction_status"] == "pending"
+    assert response.json()["text_preview"] == LEASE.decode()
+
+
+def test_chunked_upload_without_content_length_is_capped(research_client, tmp_path):
+    research_client.app.dependency_overrides[get_settings] = lambda: Settings(
+        upload_dir=str(tmp_path), max_upload_size=1024
+    )
+    body = _multipart_body("x-boundary", "lease.txt", b"a" * (200 * 1024), document_name="Lease")
+
+    def stream():
+        for start in range(0, len(body), 8192):
+            yield body[start:start + 8192]
+
+    response = research_client.post(
+        "/legal-research/upload-document",
+        content=stream(),
+        headers={
+            "Authorization": "Bearer user_1_token",
+            "Content-Type": "multipart/form-data; boundary=x-boundary",
+        },
+    )
+
+    assert response.status_code == 413
+    assert _stored_files(tmp_path) == []
+
+
+@pytest.mark.parametrize("filename, fields, status_code", [
+    ("malware.exe", {"document_name": "Lease"}, 400),
+    ("lease.txt", {}, 422),
+])
+def test_rejected_uploads_leave_nothing_in_storage(research_client, tmp_path, filename, fields, status_code):
+    response = research_client.post(
+        "/legal-research/upload-document",
+        content=_multipart_body("x-boundary", filename, LEASE, **fields),
+        headers={
+            "Authorization": "Bearer user_1_token",
+            "Content-Type": "multipart/form-data; boundary=x-boundary",
+        },
+    )
+
+    assert response.status_code == status_code
+    assert _stored_files(tmp_path) == []
@@ -0,0 +1,107 @@
+import random
+
+import pytest
+
+from api.app.services.bm25_index_service import BM25Index, tokenize, fuse_scores
+from api.app.services.retrieval_service import RetrievalService, simhash, hamming_distance, DUPLICATE_DISTANCE
+from api.app.services.vector_index_service import HashingEmbedder
+
+
+def test_tokenize_keeps_legal_references_whole_and_split():
+    terms = tokenize("See s.12(3) of SI-142/2019.")
+
+    assert "s.12(3)" in terms
+    assert {"s", "12", "3"} <= set(terms)
+    assert "si-142/2019" in terms
+    assert "142" in terms
+
+
+def test_bm25_ranks_exact_terms_and_handles_deletes(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add("doc-a", [{"text": "Section 12(3) requires written notice."}, {"text": "Unrelated recital."}])
+    index.add("doc-b", [{"text": "Notice may be given orally."}])
+
+    results = index.search("section 12(3) notice", top_k=5)
+    assert (results[0]["document_id"], results[0]["chunk"]) == ("doc-a", 0)
+    assert {r["document_id"] for r in results} == {"doc-a", "doc-b"}
+
+    index.delete("doc-a")
+    assert [r["document_id"] for r in index.search("notice", top_k=5)] == ["doc-b"]
+
+    # The log and tombstones survive a reload
+    reloaded = BM25Index(str(tmp_path))
+    assert [r["document_id"] for r in reloaded.search("section notice", top_k=5)] == ["doc-b"]
+    assert reloaded.search("recital", top_k=5) == []
+
+
+def test_bm25_document_filter_survives_replacement_and_reload(tmp_path):
+    index = BM25Index(str(tmp_path))
+    # Enough other rows that the replaced ones are not compacted away
+    index.add("doc-f", [{"text": f"Filing {number}."} for number in range(8)])
+    index.add("doc-a", [{"text": "Notice of appeal."}, {"text": "Notice of motion."}])
+    # Replaced right after itself, so its new rows directly follow its deleted ones
+    index.add("doc-a", [{"text": "Amended notice of appeal."}])
+    index.add("doc-b", [{"text": "Notice to vacate."}])
+
+    for current in (index, BM25Index(str(tmp_path))):
+        assert current.document_rows == {"doc-f": (0, 8), "doc-a": (10, 11), "doc-b": (11, 12)}
+        assert [(r["document_id"], r["chunk"]) for r in current.search("notice", 5, ["doc-a"])] == [("doc-a", 0)]
+        assert current.search("notice", 5, ["doc-missing"]) == []
+
+
+def test_fuse_scores_normalises_each_ranker():
+    vector = [{"document_id": "a", "chunk": 0, "score": 0.9}, {"document_id": "b", "chunk": 0, "score": 0.1}]
+    keyword = [{"document_id": "b", "chunk": 0, "score": 14.0}, {"document_id": "c", "chunk": 0, "score": 2.0}]
+
+    fused = fuse_scores(vector, keyword, alpha=0.5)
+
+    assert fused == {("a", 0): 0.5, ("b", 0): 0.5, ("c", 0): 0.0}
+
+
+def test_hybrid_search_finds_exact_party_names(tmp_path):
+    service = RetrievalService(str(tmp_path), embedder=HashingEmbedder())
+    service.index_document("case-1", "doc-1", "Pleadings", "Moyo v Chikore concerns a boundary dispute.")
+    service.index_document("case-1", "doc-2", "Notes", "A dispute about farm boundaries and fences.")
+
+    results = service.search("Chikore", case_key="case-1", top_k=1)
+
+    assert results[0]["document_id"] == "doc-1"
+    assert results[0]["name"] == "Pleadings"
+    assert "Moyo v Chikore" in results[0]["text"]
+
+    assert service.remove_document("doc-1") is True
+    assert [r["document_id"] for r in service.search("Chikore boundary", case_key="case-1")] == ["doc-2"]
+
+
+def make_agreement(seed, words=800):
+    rng = random.Random(seed)
+    return " ".join(f"term{rng.randrange(3000)}" for _ in range(words))
+
+
+def amend(text, changes):
+    words = text.split()
+    for position in range(0, changes * 50, 50):
+        words[position] = "amended"
+    return " ".join(words)
+
+
+def test_simhash_separates_drafts_from_other_documents():
+    lease = make_agreement(1)
+
+    assert hamming_distance(simhash(lease), simhash(amend(lease, 5))) <= DUPLICATE_DISTANCE
+    assert hamming_distance(simhash(lease), simhash(make_agreement(2))) > DUPLICATE_DISTANCE * 2
+
+
+def test_dedupe_skips_passages_from_near_duplicate_drafts(tmp_path):
+    service = RetrievalService(str(tmp_path), embedder=HashingEmbedder())
+    lease = "The tenant shall pay rent monthly to the landlord. " + make_agreement(1)
+    service.index_document("case-1", "doc-v1", "Lease v1", lease)
+    service.index_document("case-1", "doc-v2", "Lease v2", amend(lease, 5))
+    service.index_document("case-1", "doc-notes", "Notes", "The landlord may increase the rent after notice.")
+
+    everything = service.search("tenant rent landlord", case_key="case-1", top_k=3)
+    deduped = service.search("tenant rent landlord", case_key="case-1", top_k=3, dedupe=True)
+
+    assert {r["document_id"] for r in everything} == {"doc-v1", "doc-v2", "doc-notes"}
+    assert len({r["document_id"] for r in deduped} & {"doc-v1", "doc-v2"}) == 1
+    assert "doc-notes" in {r["document_id"] for r in deduped}
@@ -0,0 +1,138 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from api.app.services.chunked_upload_service import (
+    ChunkedUploadService, ChunkedUploadError, MIN_CHUNK_SIZE
+)
+
+
+def _send_chunk(service, upload_id, owner_id, offset, data, checksum=None):
+    writer = service.open_chunk(upload_id, owner_id, offset)
+    try:
+        # Feed the chunk in small pieces, as a streamed request body would arrive
+        for start in range(0, len(data), 4096):
+            writer.write(data[start:start + 4096])
+        return writer.commit(checksum or hashlib.sha256(data).hexdigest())
+    finally:
+        writer.close()
+
+
+@pytest.fixture
+def service(tmp_path):
+    return ChunkedUploadService(storage_dir=str(tmp_path), max_size=10 * MIN_CHUNK_SIZE)
+
+
+def test_parallel_out_of_order_chunks_assemble_into_storage(service, tmp_path):
+    data = os.urandom(3 * MIN_CHUNK_SIZE + 123)
+    session = service.create_session("bundle.pdf", len(data), owner_id=7, chunk_size=MIN_CHUNK_SIZE)
+    assert session["total_chunks"] == 4
+    assert session["missing_chunks"] == [0, 1, 2, 3]
+
+    offsets = [3 * MIN_CHUNK_SIZE, MIN_CHUNK_SIZE, 0, 2 * MIN_CHUNK_SIZE]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(
+            lambda offset: _send_chunk(
+                service, session["upload_id"], 7, offset, data[offset:offset + MIN_CHUNK_SIZE]
+            ),
+            offsets
+        ))
+
+    stored = service.finalize(session["upload_id"], 7, sha256=hashlib.sha256(data).hexdigest())
+
+    assert stored["sha256"] == hashlib.sha256(data).hexdigest()
+    assert stored["size"] == len(data)
+    with open(stored["path"], "rb") as f:
+        assert f.read() == data
+    assert os.listdir(os.path.join(str(tmp_path), ".uploads")) == []
+
+
+def test_interrupted_upload_resumes_from_missing_chunks(service):
+    data = os.urandom(2 * MIN_CHUNK_SIZE)
+    upload_id = service.create_session("scan.png", len(data), owner_id=1, chunk_size=MIN_CHUNK_SIZE)["upload_id"]
+
+    _send_chunk(service, upload_id, 1, 0, data[:MIN_CHUNK_SIZE])
+    # The second chunk is cut off halfway through
+    with pytest.raises(ChunkedUploadError):
+        _send_chunk(service, upload_id, 1, MIN_CHUNK_SIZE, data[MIN_CHUNK_SIZE:MIN_CHUNK_SIZE + 1000],
+                    checksum=hashlib.sha256(data[MIN_CHUNK_SIZE:]).hexdigest())
+
+    assert service.get_session(upload_id, 1)["missing_chunks"] == [1]
+    with pytest.raises(ChunkedUploadError) as excinfo:
+        service.finalize(upload_id, 1)
+    assert excinfo.value.status_code == 409
+
+    _send_chunk(service, upload_id, 1, MIN_CHUNK_SIZE, data[MIN_CHUNK_SIZE:])
+    assert service.finalize(upload_id, 1)["sha256"] == hashlib.sha256(data).hexdigest()
+
+
+def test_chunk_with_bad_checksum_is_not_recorded(service):
+    data = os.urandom(MIN_CHUNK_SIZE)
+    upload_id = service.create_session("notes.txt", len(data), owner_id=1)["upload_id"]
+
+    with pytest.raises(ChunkedUploadError) as excinfo:
+        _send_chunk(service, upload_id, 1, 0, data, checksum="0" * 64)
+
+    assert excinfo.value.status_code == 422
+    assert service.get_session(upload_id, 1)["received_chunks"] == []
+
+
+def test_failed_resend_of_a_received_chunk_marks_it_missing(service):
+    data = os.urandom(MIN_CHUNK_SIZE)
+    upload_id = service.create_session("notes.txt", len(data), owner_id=1)["upload_id"]
+    _send_chunk(service, upload_id, 1, 0, data)
+
+    # The retry overwrites the chunk's bytes before its checksum fails
+    with pytest.raises(ChunkedUploadError):
+        _send_chunk(service, upload_id, 1, 0, os.urandom(MIN_CHUNK_SIZE), checksum="0" * 64)
+
+    assert service.get_session(upload_id, 1)["missing_chunks"] == [0]
+    with pytest.raises(ChunkedUploadError) as excinfo:
+        service.finalize(upload_id, 1)
+    assert excinfo.value.status_code == 409
+
+
+def test_session_validation(service):
+    with pytest.raises(ChunkedUploadError) as excinfo:
+        service.create_session("huge.pdf", 11 * MIN_CHUNK_SIZE, owner_id=1)
+    assert excinfo.value.status_code == 413
+
+    upload_id = service.create_session("a.pdf", 2 * MIN_CHUNK_SIZE, owner_id=1, chunk_size=MIN_CHUNK_SIZE)["upload_id"]
+    with pytest.raises(ChunkedUploadError):
+        service.open_chunk(upload_id, 1, offset=100)
+    with pytest.raises(ChunkedUploadError) as excinfo:
+        service.get_session(upload_id, owner_id=2)
+    assert excinfo.value.status_code == 404
+
+
+def test_concurrent_completions_assemble_the_upload_once(service):
+    data = os.urandom(2 * MIN_CHUNK_SIZE)
+    upload_id = service.create_session("brief.pdf", len(data), owner_id=1, chunk_size=MIN_CHUNK_SIZE)["upload_id"]
+    _send_chunk(service, upload_id, 1, 0, data[:MIN_CHUNK_SIZE])
+    _send_chunk(service, upload_id, 1, MIN_CHUNK_SIZE, data[MIN_CHUNK_SIZE:])
+
+    def complete(_):
+        try:
+            return service.finalize(upload_id, 1)["sha256"]
+        except ChunkedUploadError as e:
+            return e.status_code
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(complete, range(4)))
+
+    assert results.count(hashlib.sha256(data).hexdigest()) == 1
+    assert all(result in (404, 409) for result in results if isinstance(result, int))
+
+
+def test_failed_completion_can_be_retried(service):
+    data = os.urandom(MIN_CHUNK_SIZE)
+    upload_id = service.create_session("memo.txt", len(data), owner_id=1)["upload_id"]
+    _send_chunk(service, upload_id, 1, 0, data)
+
+    with pytest.raises(ChunkedUploadError) as excinfo:
+        service.finalize(upload_id, 1, sha256="0" * 64)
+    assert excinfo.value.status_code == 422
+
+    assert service.finalize(upload_id, 1)["sha256"] == hashlib.sha256(data).hexdigest()
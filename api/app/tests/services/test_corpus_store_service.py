@@ -0,0 +1,62 @@
+from api.app.services.corpus_store_service import CorpusStore, encode_offsets
+from api.app.services.retrieval_service import RetrievalService
+from api.app.services.vector_index_service import HashingEmbedder
+
+
+def test_encode_offsets_maps_characters_to_utf8_bytes():
+    text = "Section 5 — Révision"
+    mapping = encode_offsets(text, [0, 10, 12, len(text)])
+
+    for offset, position in mapping.items():
+        assert text[:offset].encode("utf-8") == text.encode("utf-8")[:position]
+
+
+def test_slices_documents_and_pages_without_copying(tmp_path):
+    store = CorpusStore(str(tmp_path))
+    store.add("doc-1", ["Page one text. ", "Page two — twée. ", "Page three."])
+    store.add("doc-2", ["Another document."])
+
+    view = store.page("doc-1", 1)
+    assert isinstance(view, memoryview)
+    assert str(view, "utf-8") == "Page two — twée. "
+    assert store.text("doc-2") == "Another document."
+    assert store.page_count("doc-1") == 3
+
+    start, end = store.page_span("doc-1", 2)
+    assert store.text("doc-1", start, end) == "Page three."
+    assert store.page_of("doc-1", start) == 2
+    assert store.page_of("doc-1", start - 1) == 1
+    assert [str(page, "utf-8") for page in store.iter_pages("doc-2")] == ["Another document."]
+
+
+def test_replace_delete_compact_and_reopen(tmp_path):
+    store = CorpusStore(str(tmp_path))
+    store.add("doc-1", ["first version"])
+    store.add("doc-2", ["kept " * 20])
+    held = store.slice("doc-2", 0, 4)
+
+    store.add("doc-1", ["second version"])
+    assert store.delete("doc-1") is True
+    assert store.delete("doc-1") is False
+
+    # Deleting most of the text triggers compaction; earlier views stay readable
+    store.add("doc-3", ["x"])
+    store.delete("doc-2")
+    assert bytes(held) == b"kept"
+
+    reopened = CorpusStore(str(tmp_path))
+    assert "doc-1" not in reopened and "doc-2" not in reopened
+    assert reopened.text("doc-3") == "x"
+    assert reopened.text_bytes == 1
+
+
+def test_retrieval_reads_passages_from_the_corpus(tmp_path):
+    service = RetrievalService(str(tmp_path), embedder=HashingEmbedder())
+    service.index_document("case-1", "doc-1", "Judgment", ["Preamble.\f", "The appeal under s.12(3) is dismissed — costs follow."])
+
+    results = service.search("s.12(3) appeal dismissed", case_key="case-1", top_k=1)
+
+    assert "s.12(3)" in results[0]["text"]
+    assert results[0]["page"] == 0
+    with open(tmp_path / "cases" / "case-1" / "chunks.jsonl") as f:
+        assert "dismissed" not in f.read()
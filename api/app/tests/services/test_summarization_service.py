@@ -0,0 +1,76 @@
+import asyncio
+import random
+
+import pytest
+
+from api.app.services.summarization_service import (
+    SummarizationService, SummarizationError, split_into_chunks
+)
+
+
+class FakeGemini:
+    model_name = "fake-model"
+
+    def __init__(self, fail=False):
+        self.prompts = []
+        self.fail = fail
+
+    def generate(self, prompt, temperature=0.7, max_output_tokens=8192):
+        self.prompts.append(prompt)
+        if self.fail:
+            return {"error": "quota exceeded", "response": ""}
+        return {"response": f"summary {len(self.prompts)}"}
+
+
+def make_document(words=6000, seed=1):
+    rng = random.Random(seed)
+    return " ".join(f"word{rng.randrange(5000)}" for _ in range(words))
+
+
+def test_chunks_resynchronise_after_an_edit():
+    text = make_document()
+    edited = text.replace(text.split()[3000], "amended clause here", 1)
+
+    before = split_into_chunks(text, 200)
+    after = split_into_chunks(edited, 200)
+
+    assert all(100 <= len(chunk.split()) <= 400 for chunk in before[:-1])
+    assert len(set(before) - set(after)) <= 2
+
+
+def test_resummarizing_an_edited_document_recomputes_only_changed_branches(tmp_path):
+    gemini = FakeGemini()
+    service = SummarizationService(str(tmp_path), gemini=gemini, requests_per_minute=60000, target_chunk_words=200)
+    text = make_document()
+
+    first = asyncio.run(service.summarize(text))
+    assert first["chunks"] > 10 and first["levels"] >= 3
+    assert first["gemini_calls"] == len(gemini.prompts)
+    assert first["cached_nodes"] == 0
+
+    again = asyncio.run(service.summarize(text))
+    assert again["gemini_calls"] == 0
+    assert again["summary"] == first["summary"]
+
+    edited = text.replace(text.split()[3000], "amended clause here", 1)
+    changed = asyncio.run(service.summarize(edited))
+    assert 0 < changed["gemini_calls"] <= 2 + 2 * changed["levels"]
+
+
+def test_focus_is_part_of_the_prompt_and_cache_key(tmp_path):
+    gemini = FakeGemini()
+    service = SummarizationService(str(tmp_path), gemini=gemini, requests_per_minute=60000)
+
+    asyncio.run(service.summarize("The respondent was evicted on 3 May 2021."))
+    result = asyncio.run(service.summarize("The respondent was evicted on 3 May 2021.", focus="dates"))
+
+    assert result["gemini_calls"] == 1
+    assert "Focus on: dates" in gemini.prompts[-1]
+
+
+def test_gemini_errors_are_raised_and_not_cached(tmp_path):
+    service = SummarizationService(str(tmp_path), gemini=FakeGemini(fail=True), requests_per_minute=60000)
+
+    with pytest.raises(SummarizationError):
+        asyncio.run(service.summarize("Short judgment text."))
+    assert not any(tmp_path.iterdir())
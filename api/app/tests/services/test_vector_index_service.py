@@ -0,0 +1,113 @@
+import threading
+
+import pytest
+
+from api.app.services.vector_index_service import VectorIndexService, HashingEmbedder
+from api.app.utils.document_processor import chunk_text
+
+
+@pytest.fixture
+def service(tmp_path):
+    return VectorIndexService(index_root=str(tmp_path), embedder=HashingEmbedder())
+
+
+def test_chunk_text_overlaps_and_tracks_offsets():
+    text = " ".join(f"w{i}" for i in range(450))
+    chunks = chunk_text(text, max_words=200, overlap=50)
+
+    assert [len(chunk["text"].split()) for chunk in chunks] == [200, 200, 150]
+    assert chunks[1]["text"].split()[0] == "w150"
+    for chunk in chunks:
+        assert text[chunk["start"]:chunk["end"]] == chunk["text"]
+    assert chunk_text("") == []
+
+
+def test_search_returns_most_relevant_passages(service):
+    service.index_document("case-1", "doc-lease", "Lease", "The tenant shall pay rent monthly to the landlord.")
+    service.index_document("case-1", "doc-will", "Will", "The testator bequeaths the farm to his daughter.")
+    service.index_document("case-2", "doc-other", "Other case", "The tenant shall pay rent monthly.")
+
+    results = service.search("when must the tenant pay rent", case_key="case-1", top_k=1)
+
+    assert [r["document_id"] for r in results] == ["doc-lease"]
+    assert results[0]["name"] == "Lease"
+
+
+def test_search_can_be_restricted_to_documents_across_cases(service):
+    service.index_document("case-1", "doc-lease", "Lease", "The tenant shall pay rent monthly.")
+    service.index_document("case-2", "doc-other", "Other", "The tenant shall pay rent weekly.")
+
+    results = service.search("tenant rent", document_ids=["doc-other"], top_k=5)
+
+    assert {r["document_id"] for r in results} == {"doc-other"}
+
+
+def test_embedding_a_document_does_not_block_searches(service):
+    service.index_document("case-1", "doc-lease", "Lease", "The tenant shall pay rent monthly.")
+    embedding = threading.Event()
+    release = threading.Event()
+    embed = service.embedder.embed
+
+    def slow_embed(texts):
+        if any("bequeaths" in text for text in texts):
+            embedding.set()
+            release.wait(5)
+        return embed(texts)
+
+    service.embedder.embed = slow_embed
+    indexer = threading.Thread(
+        target=service.index_document, args=("case-2", "doc-will", "Will", "The testator bequeaths the farm.")
+    )
+    indexer.start()
+    try:
+        assert embedding.wait(5)
+        # Searching another case finishes while the document is still being embedded
+        results = []
+        searcher = threading.Thread(target=lambda: results.extend(service.search("tenant rent", case_key="case-1")))
+        searcher.start()
+        searcher.join(1)
+        assert [r["document_id"] for r in results] == ["doc-lease"]
+    finally:
+        release.set()
+        indexer.join()
+    assert service.get_document("doc-will")["chunks"] == 1
+
+
+def test_delete_and_reindex_are_incremental_and_persistent(service, tmp_path):
+    service.index_document("case-1", "doc-a", "A", "Section 12 of the Labour Act applies.")
+    service.index_document("case-1", "doc-b", "B", "The contract was signed in Harare.")
+    service.index_document("case-1", "doc-a", "A v2", "Section 13 of the Labour Act applies.")
+
+    assert service.remove_document("doc-b") is True
+    assert service.remove_document("doc-b") is False
+
+    # A fresh service reads the same on-disk index
+    reopened = VectorIndexService(index_root=str(tmp_path), embedder=HashingEmbedder())
+    results = reopened.search("Labour Act section", case_key="case-1", top_k=5)
+
+    assert [r["document_id"] for r in results] == ["doc-a"]
+    assert "Section 13" in results[0]["text"]
+    assert reopened.get_document("doc-a")["name"] == "A v2"
+
+
+def test_document_filter_and_owner_lookup_survive_replacement_and_reload(service, tmp_path):
+    # Enough other rows that the replaced ones are not compacted away
+    service.index_chunks("case-1", "doc-f", "F", [{"text": f"Filing {number}."} for number in range(8)],
+                         metadata={"owner_id": 3})
+    service.index_chunks("case-1", "doc-a", "A", [{"text": "Notice of appeal."}, {"text": "Notice of motion."}],
+                         metadata={"owner_id": 1})
+    service.index_chunks("case-1", "doc-a", "A v2", [{"text": "Amended notice of appeal."}], metadata={"owner_id": 1})
+    service.index_chunks("case-1", "doc-b", "B", [{"text": "Notice to vacate."}], metadata={"owner_id": 2})
+    # Indexed before uploads recorded their owner, in user 2's own index
+    service.index_chunks("user-2", "doc-c", "C", [{"text": "Notice of set down."}])
+
+    reopened = VectorIndexService(index_root=str(tmp_path), embedder=HashingEmbedder())
+    for current in (service, reopened):
+        assert current._index("case-1").document_rows == {"doc-f": (0, 8), "doc-a": (10, 11), "doc-b": (11, 12)}
+        results = current.search("notice", case_key="case-1", document_ids=["doc-a"], top_k=5)
+        assert [(r["document_id"], r["chunk"]) for r in results] == [("doc-a", 0)]
+        assert current.owned_documents(2) == ["doc-b", "doc-c"]
+        assert current.owned_documents(2, case_key="case-1") == ["doc-b"]
+
+    reopened.remove_document("doc-b")
+    assert reopened.owned_documents(2) == ["doc-c"]
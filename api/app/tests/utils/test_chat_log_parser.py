@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from api.app.utils import document_processor
+from api.app.utils.document_processor import iter_chat_log, parse_chat_log
+
+
+@pytest.fixture(autouse=True)
+def small_reads(monkeypatch):
+    # Tiny blocks make every element straddle read boundaries
+    monkeypatch.setattr(document_processor, "CHAT_LOG_READ_SIZE", 7)
+
+
+def write(tmp_path, content):
+    path = tmp_path / "chat.log"
+    path.write_text(content, encoding="utf-8")
+    return str(path)
+
+
+def test_streams_json_arrays_across_block_boundaries(tmp_path):
+    messages = [
+        {"role": "user", "content": "Is the lease valid? " + "x" * 100},
+        {"role": "assistant", "content": "Yes — see s.12(3) [and] {braces}, \"quotes\""},
+        12345,
+        [1, 2],
+    ]
+    path = write(tmp_path, "  \n" + json.dumps(messages, indent=2) + "\n")
+
+    parsed = iter_chat_log(path)
+
+    assert next(parsed) == messages[0]
+    assert list(parsed) == messages[1:]
+    assert parse_chat_log(write(tmp_path, "[ ]")) == []
+
+
+def test_parses_transcripts_line_by_line(tmp_path):
+    path = write(tmp_path, "\n".join([
+        "preamble without a speaker",
+        "User: Hello",
+        "",
+        "I need help with a dispute.",
+        "AI: Certainly.",
+        "You: Thanks",
+    ]))
+
+    assert parse_chat_log(path) == [
+        {"role": "user", "content": "Hello\nI need help with a dispute."},
+        {"role": "assistant", "content": "Certainly."},
+        {"role": "user", "content": "Thanks"},
+    ]
+
+
+def test_bracketed_transcripts_and_json_objects_fall_back_to_text(tmp_path):
+    path = write(tmp_path, "[12/03/2021, 10:32] note\nUser: Hi\nAssistant: Hello")
+    assert [m["role"] for m in parse_chat_log(path)] == ["user", "assistant"]
+
+    path = write(tmp_path, '{"role": "user"}\nUser: Hi')
+    assert parse_chat_log(path) == [{"role": "user", "content": "Hi"}]
+
+
+def test_malformed_json_after_the_first_element_keeps_earlier_messages(tmp_path, caplog):
+    path = write(tmp_path, '[{"role": "user", "content": "a"}, {"role": "assistant", "content": "b"}, {"role": ')
+
+    with caplog.at_level("WARNING"):
+        assert parse_chat_log(path) == [
+            {"role": "user", "content": "a"},
+            {"role": "assistant", "content": "b"},
+        ]
+    assert "malformed element" in caplog.text
+    with pytest.raises(FileNotFoundError):
+        iter_chat_log(str(tmp_path / "missing.log"))
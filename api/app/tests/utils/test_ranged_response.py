@@ -0,0 +1,76 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from api.app.utils.ranged_response import parse_range, ranged_file_response
+
+DATA = bytes(range(256)) * 40
+ETAG = '"abc123"'
+
+
+def make_client(path, accel_redirect_path=None):
+    app = FastAPI()
+
+    @app.get("/file")
+    async def get_file(request: Request):
+        return ranged_file_response(
+            request, str(path), ETAG, "application/pdf", "Brief.pdf", accel_redirect_path=accel_redirect_path
+        )
+
+    return TestClient(app)
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-99", 1000) == (0, 99)
+    assert parse_range("bytes=900-", 1000) == (900, 999)
+    assert parse_range("bytes=-100", 1000) == (900, 999)
+    assert parse_range("bytes=500-5000", 1000) == (500, 999)
+    assert parse_range("bytes=1000-", 1000) == "unsatisfiable"
+    assert parse_range("bytes=0-1,5-9", 1000) is None
+    assert parse_range(None, 1000) is None
+
+
+def test_full_and_partial_responses(tmp_path):
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(DATA)
+    client = make_client(path)
+
+    response = client.get("/file")
+    assert response.status_code == 200
+    assert response.content == DATA
+    assert response.headers["etag"] == ETAG
+    assert response.headers["accept-ranges"] == "bytes"
+
+    response = client.get("/file", headers={"Range": "bytes=100-4199"})
+    assert response.status_code == 206
+    assert response.content == DATA[100:4200]
+    assert response.headers["content-range"] == f"bytes 100-4199/{len(DATA)}"
+
+    response = client.get("/file", headers={"Range": f"bytes={len(DATA)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(DATA)}"
+
+
+def test_conditional_requests(tmp_path):
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(DATA)
+    client = make_client(path)
+
+    response = client.get("/file", headers={"If-None-Match": ETAG})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # A stale If-Range gets the whole current file instead of a range of it
+    response = client.get("/file", headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+    assert response.status_code == 200
+    assert response.content == DATA
+
+
+def test_accel_redirect_sends_no_body(tmp_path):
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(DATA)
+    client = make_client(path, accel_redirect_path="/protected-uploads/legal_research/doc.pdf")
+
+    response = client.get("/file", headers={"Range": "bytes=0-9"})
+    assert response.status_code == 200
+    assert response.headers["x-accel-redirect"] == "/protected-uploads/legal_research/doc.pdf"
+    assert response.content == b""
@@ -0,0 +1,51 @@
+import hashlib
+import os
+
+import pytest
+
+from api.app.utils.upload_stream import stream_to_path, sniff_mime_type, UploadTooLargeError
+
+
+def test_stream_to_path_hashes_and_stores_in_one_pass(tmp_path):
+    chunks = [b"%PDF-1.7\n", b"x" * 5000, b"%%EOF"]
+    data = b"".join(chunks)
+
+    stored = stream_to_path(iter(chunks), str(tmp_path), max_size=len(data), filename="Brief.PDF")
+
+    assert stored["sha256"] == hashlib.sha256(data).hexdigest()
+    assert stored["size"] == len(data)
+    assert stored["mime_type"] == "application/pdf"
+    assert stored["path"] == os.path.join(str(tmp_path), stored["sha256"] + ".pdf")
+    with open(stored["path"], "rb") as f:
+        assert f.read() == data
+    # Only the final file is left in storage
+    assert os.listdir(tmp_path) == [os.path.basename(stored["path"])]
+
+
+def test_stream_to_path_rejects_oversize_stream_and_cleans_up(tmp_path):
+    consumed = []
+
+    def chunks():
+        for i in range(10):
+            consumed.append(i)
+            yield b"a" * 100
+
+    with pytest.raises(UploadTooLargeError):
+        stream_to_path(chunks(), str(tmp_path), max_size=250, filename="notes.txt")
+
+    # Reading stops as soon as the limit is crossed
+    assert len(consumed) == 3
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("head, filename, expected", [
+    (b"\x89PNG\r\n\x1a\n\x00\x00", "scan.png", "image/png"),
+    (b"\xff\xd8\xff\xe0\x00\x10JFIF", "photo.jpg", "image/jpeg"),
+    (b"PK\x03\x04\x14\x00", "contract.docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    (b"Section 12(3) of the Act", "notes.md", "text/markdown"),
+    (b"Plain text without an extension", None, "text/plain"),
+    (b"caf\xc3", "cut.txt", "text/plain"),
+    (b"\x00\x01\x02\x03", "blob.bin", "application/octet-stream"),
+])
+def test_sniff_mime_type(head, filename, expected):
+    assert sniff_mime_type(head, filename) == expected
@@ -1,8 +1,11 @@
 import os
+import re
+import html
+import zipfile
 import tempfile
 import subprocess
 import json
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Iterator
 import logging
 
 # Import these libraries only if available
@@ -109,86 +112,270 @@ def extract_text_from_image(image_path: str) -> str:
         logger.error(f"Error performing OCR on image: {str(e)}")
         return f"Failed to extract text from image: {str(e)}"
 
-def parse_chat_log(chat_log_path: str) -> list:
+def extract_text_from_docx(docx_path: str) -> str:
     """
-    Parse a chat log file into a structured format.
+    Extract text from a Word (.docx) document using only the standard library.
+    
+    Args:
+        docx_path: Path to the .docx file
+        
+    Returns:
+        Extracted text content as a string, one paragraph per line
+    """
+    try:
+        with zipfile.ZipFile(docx_path) as archive:
+            xml = archive.read("word/document.xml").decode("utf-8")
+    except (zipfile.BadZipFile, KeyError) as e:
+        logger.error(f"Error reading Word document {docx_path}: {str(e)}")
+        return ""
+    
+    paragraphs = []
+    for paragraph in re.findall(r"<w:p[ >].*?</w:p>", xml, flags=re.DOTALL):
+        runs = re.findall(r"<w:t(?: [^>]*)?>(.*?)</w:t>", paragraph, flags=re.DOTALL)
+        paragraphs.append(html.unescape("".join(runs)))
+    
+    return "\n".join(paragraphs)
+
+def extract_text_from_file(file_path: str) -> str:
+    """
+    Extract text from a stored document, choosing the method from its extension.
+    
+    Args:
+        file_path: Path to the document
+        
+    Returns:
+        Extracted text content as a string
+    """
+    file_extension = os.path.splitext(file_path)[1].lower()
+    
+    if file_extension == '.pdf':
+        return extract_text_from_pdf(file_path)
+    if file_extension in ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif']:
+        return extract_text_from_image(file_path)
+    if file_extension == '.docx':
+        return extract_text_from_docx(file_path)
+    
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        return f.read()
+
+def extract_pages_from_file(file_path: str) -> List[str]:
+    """
+    Extract the text of a stored document page by page.
+    
+    PDFs are split into their pages with PyMuPDF when it is available, or on
+    the form feeds pdftotext writes between pages. Other documents are
+    returned as a single page.
+    
+    Args:
+        file_path: Path to the document
+        
+    Returns:
+        List of page texts, in order
+    """
+    if os.path.splitext(file_path)[1].lower() == '.pdf' and PYMUPDF_AVAILABLE:
+        try:
+            with fitz.open(file_path) as doc:
+                return [page.get_text() for page in doc]
+        except Exception as e:
+            logger.error(f"Error extracting pages with PyMuPDF: {str(e)}")
+    
+    text = extract_text_from_file(file_path)
+    # Keep each form feed at the end of its page so words never join across pages
+    return [page for page in re.split(r"(?<=\f)", text) if page] or [""]
+
+def chunk_text(text: str, max_words: int = 200, overlap: int = 40) -> List[Dict[str, Any]]:
+    """
+    Split text into overlapping word windows for retrieval.
+    
+    Args:
+        text: Text to split
+        max_words: Maximum number of words per chunk
+        overlap: Number of words shared by consecutive chunks
+        
+    Returns:
+        List of chunks with their text and start/end character offsets
+    """
+    if overlap >= max_words:
+        raise ValueError("overlap must be smaller than max_words")
+    
+    spans = [match.span() for match in re.finditer(r"\S+", text)]
+    chunks = []
+    step = max_words - overlap
+    
+    for first in range(0, len(spans), step):
+        window = spans[first:first + max_words]
+        start, end = window[0][0], window[-1][1]
+        chunks.append({"text": text[start:end], "start": start, "end": end})
+        if first + max_words >= len(spans):
+            break
+    
+    return chunks
+
+# Characters read from a chat log at a time by the streaming parser
+CHAT_LOG_READ_SIZE = 1024 * 1024
+
+# Line prefixes starting a new message in plain text chat logs
+CHAT_ROLE_PREFIXES = {
+    "User:": "user",
+    "You:": "user",
+    "Assistant:": "assistant",
+    "AI:": "assistant",
+}
+
+def iter_chat_log(chat_log_path: str) -> Iterator[Any]:
+    """
+    Parse a chat log file lazily, yielding one message at a time.
+    
+    The file is read once, in fixed-size blocks. A JSON array of messages is
+    decoded element by element; anything else is parsed line by line as a
+    "User:" / "Assistant:" transcript. Memory use is bounded by the largest
+    single message rather than the size of the file. A malformed element
+    after the first ends the array: the messages before it are kept and
+    the error is logged.
     
     Args:
         chat_log_path: Path to the chat log file
         
     Returns:
-        List of chat messages
+        Iterator over the chat messages
     """
     if not os.path.exists(chat_log_path):
         raise FileNotFoundError(f"Chat log file not found: {chat_log_path}")
-    
-    try:
-        # Try to parse as JSON first
-        with open(chat_log_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+    return _iter_chat_log(chat_log_path)
+
+def _iter_chat_log(chat_log_path: str) -> Iterator[Any]:
+    with open(chat_log_path, 'r', encoding='utf-8') as f:
+        head = f.read(CHAT_LOG_READ_SIZE)
+        if head.lstrip().startswith("["):
+            messages = _iter_json_array(f, head)
             try:
-                # Check if this is a JSON array of messages
-                messages = json.loads(content)
-                if isinstance(messages, list):
-                    return messages
+                # Transcripts may also start with "[" (e.g. timestamps), so only
+                # commit to JSON once the first element has decoded
+                first = next(messages)
+            except StopIteration:
+                return
             except json.JSONDecodeError:
-                # Not JSON, continue to text parsing
-                pass
+                f.seek(0)
+            else:
+                yield first
+                try:
+                    yield from messages
+                except json.JSONDecodeError as e:
+                    # Keep what was decoded rather than dropping the whole log
+                    logger.warning(f"Stopped reading chat log {chat_log_path} at a malformed element: {str(e)}")
+                return
+        else:
+            f.seek(0)
         
-        # Parse as plain text with simple format detection
-        messages = []
-        current_role = None
-        current_content = []
+        yield from _iter_chat_lines(f)
+
+def _iter_json_array(f, buffer: str) -> Iterator[Any]:
+    decoder = json.JSONDecoder()
+    position = buffer.index("[") + 1
+    eof = False
+    read_size = CHAT_LOG_READ_SIZE
+    
+    def skip_whitespace(buffer, position):
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+        return position
+    
+    while True:
+        position = skip_whitespace(buffer, position)
+        if position == len(buffer):
+            if eof:
+                raise json.JSONDecodeError("Unterminated array", buffer, position)
+            block = f.read(read_size)
+            eof = not block
+            buffer = buffer[position:] + block
+            position = 0
+            continue
         
-        with open(chat_log_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-            
-            for line in lines:
-                line = line.strip()
-                
-                # Skip empty lines
-                if not line:
-                    continue
-                
-                # Check for user/assistant markers
-                if line.startswith("User:") or line.startswith("You:"):
-                    # Save previous message if it exists
-                    if current_role and current_content:
-                        messages.append({
-                            "role": current_role,
-                            "content": "\n".join(current_content)
-                        })
-                    
-                    # Start new user message
-                    current_role = "user"
-                    current_content = [line[line.index(":")+1:].strip()]
-                
-                elif line.startswith("Assistant:") or line.startswith("AI:"):
-                    # Save previous message if it exists
-                    if current_role and current_content:
-                        messages.append({
-                            "role": current_role,
-                            "content": "\n".join(current_content)
-                        })
-                    
-                    # Start new assistant message
-                    current_role = "assistant"
-                    current_content = [line[line.index(":")+1:].strip()]
-                
-                else:
-                    # Continue current message
-                    if current_role:
-                        current_content.append(line)
-            
-            # Add the last message
+        if buffer[position] == "]":
+            return
+        
+        try:
+            message, end = decoder.raw_decode(buffer, position)
+            # A number cut off at the end of the buffer decodes as a shorter number
+            if end == len(buffer) and not eof:
+                raise json.JSONDecodeError("Value may continue", buffer, end)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # The element is incomplete: read more, growing the reads so a huge
+            # element is not decoded from scratch once per block
+            block = f.read(read_size)
+            eof = not block
+            buffer = buffer[position:] + block
+            position = 0
+            read_size *= 2
+            continue
+        
+        read_size = CHAT_LOG_READ_SIZE
+        position = skip_whitespace(buffer, end)
+        while position == len(buffer) and not eof:
+            block = f.read(read_size)
+            eof = not block
+            buffer = buffer[position:] + block
+            position = skip_whitespace(buffer, 0)
+        if position < len(buffer) and buffer[position] == ",":
+            position += 1
+        elif position == len(buffer) or buffer[position] != "]":
+            raise json.JSONDecodeError("Expected ',' or ']'", buffer, position)
+        
+        # Only yield once the separator confirms the element really is one
+        yield message
+        
+        # Drop consumed text so the buffer only holds the current element
+        if position > CHAT_LOG_READ_SIZE:
+            buffer = buffer[position:]
+            position = 0
+
+def _iter_chat_lines(lines) -> Iterator[Dict[str, str]]:
+    current_role = None
+    current_content = []
+    
+    for line in lines:
+        line = line.strip()
+        
+        # Skip empty lines
+        if not line:
+            continue
+        
+        # Check for user/assistant markers
+        prefix = next((prefix for prefix in CHAT_ROLE_PREFIXES if line.startswith(prefix)), None)
+        if prefix:
+            # Emit the previous message if it exists
             if current_role and current_content:
-                messages.append({
-                    "role": current_role,
-                    "content": "\n".join(current_content)
-                })
+                yield {"role": current_role, "content": "\n".join(current_content)}
+            
+            # Start the new message
+            current_role = CHAT_ROLE_PREFIXES[prefix]
+            current_content = [line[len(prefix):].strip()]
+        
+        elif current_role:
+            # Continue current message
+            current_content.append(line)
+    
+    # Emit the last message
+    if current_role and current_content:
+        yield {"role": current_role, "content": "\n".join(current_content)}
+
+def parse_chat_log(chat_log_path: str) -> list:
+    """
+    Parse a chat log file into a structured format.
+    
+    Args:
+        chat_log_path: Path to the chat log file
         
-        return messages
+    Returns:
+        List of chat messages
+    """
+    if not os.path.exists(chat_log_path):
+        raise FileNotFoundError(f"Chat log file not found: {chat_log_path}")
     
+    try:
+        return list(iter_chat_log(chat_log_path))
     except Exception as e:
         logger.error(f"Error parsing chat log: {str(e)}")
         return []
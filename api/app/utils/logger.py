@@ -41,8 +41,9 @@ def get_logger(name):
             if log_dir and not os.path.exists(log_dir):
                 os.makedirs(log_dir)
                 
+            # The file is only opened by the first record written, not on import
             file_handler = RotatingFileHandler(
-                LOG_FILE, maxBytes=MAX_LOG_SIZE, backupCount=BACKUP_COUNT
+                LOG_FILE, maxBytes=MAX_LOG_SIZE, backupCount=BACKUP_COUNT, delay=True
             )
             file_handler.setFormatter(formatter)
             logger.addHandler(file_handler)
@@ -0,0 +1,119 @@
+# Conditional and ranged file responses for document downloads
+import os
+import re
+from typing import Optional, Tuple, Union
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import Response, FileResponse, StreamingResponse
+
+from .upload_stream import CHUNK_SIZE
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: Optional[str], size: int) -> Union[Tuple[int, int], str, None]:
+    """
+    Parse a single-range Range header against a file size.
+
+    Returns:
+        (start, end) inclusive byte positions, None when the header should be
+        ignored (absent, malformed or multi-range) and the whole file sent,
+        or "unsatisfiable" when no byte of the range exists
+    """
+    match = RANGE_PATTERN.match((header or "").strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return "unsatisfiable"
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return "unsatisfiable"
+    return start, end
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag"""
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _iter_range(path: str, start: int, length: int):
+    # Positional reads avoid sharing a file offset with anything else
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        position = start
+        end = start + length
+        while position < end:
+            data = os.pread(fd, min(CHUNK_SIZE, end - position), position)
+            if not data:
+                break
+            position += len(data)
+            yield data
+    finally:
+        os.close(fd)
+
+
+def ranged_file_response(
+    request: Request,
+    path: str,
+    etag: str,
+    media_type: str,
+    filename: str,
+    accel_redirect_path: Optional[str] = None,
+    as_attachment: bool = False
+) -> Response:
+    """
+    Respond to a download request with support for If-None-Match and Range.
+
+    Args:
+        request: The incoming request
+        path: Path of the stored file
+        etag: Quoted strong ETag of the content
+        media_type: MIME type of the file
+        filename: Name offered to the client
+        accel_redirect_path: Internal nginx URI of the file. When given, nginx
+            serves the bytes (and handles Range) and the app sends no body
+        as_attachment: Whether to ask the client to save rather than display the file
+    """
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f"{'attachment' if as_attachment else 'inline'}; filename*=utf-8''{quote(filename)}",
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    if accel_redirect_path:
+        headers["X-Accel-Redirect"] = quote(accel_redirect_path)
+        return Response(media_type=media_type, headers=headers)
+
+    size = os.path.getsize(path)
+    byte_range = None
+    # A Range is only honoured when If-Range (if sent) still matches the current content
+    if request.headers.get("if-range", etag) == etag:
+        byte_range = parse_range(request.headers.get("range"), size)
+
+    if byte_range == "unsatisfiable":
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    length = end - start + 1
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(length)
+    return StreamingResponse(_iter_range(path, start, length), status_code=206, media_type=media_type, headers=headers)
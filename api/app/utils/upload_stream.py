@@ -0,0 +1,354 @@
+import os
+import uuid
+import hashlib
+import mimetypes
+from typing import Dict, Any, BinaryIO, Iterable, List, Optional
+
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+# Size of each read from the incoming upload
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+# Number of leading bytes kept for MIME sniffing and text previews
+HEAD_SIZE = 8192
+
+# Bytes allowed in a multipart body on top of the file, for the boundaries and form fields
+FORM_OVERHEAD = 64 * 1024
+
+# Largest accepted value of a single (non-file) form field
+MAX_FIELD_SIZE = 16 * 1024
+
+# Magic byte signatures checked before falling back to the file extension
+MAGIC_SIGNATURES = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "application/msword"),
+]
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload grows beyond the configured size limit"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"Upload exceeds the maximum allowed size of {max_size} bytes")
+
+
+class InvalidUploadError(Exception):
+    """Error raised for malformed or unacceptable upload bodies, carrying an HTTP status code"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        self.status_code = status_code
+        super().__init__(message)
+
+
+def sniff_mime_type(head: bytes, filename: Optional[str] = None) -> str:
+    """
+    Detect the MIME type of a file from its leading bytes.
+
+    Args:
+        head: The first bytes of the file
+        filename: Original filename, used to refine ZIP containers and as a fallback
+
+    Returns:
+        The detected MIME type
+    """
+    for signature, mime_type in MAGIC_SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+
+    guessed_type = mimetypes.guess_type(filename or "")[0]
+
+    # Office Open XML documents are ZIP containers, so trust the extension for those
+    if head.startswith(b"PK\x03\x04"):
+        return guessed_type or "application/zip"
+
+    if b"\x00" not in head and _is_utf8_text(head):
+        return guessed_type if guessed_type and guessed_type.startswith("text/") else "text/plain"
+
+    return guessed_type or "application/octet-stream"
+
+
+def _is_utf8_text(head: bytes) -> bool:
+    """Check whether a sample decodes as UTF-8, tolerating a character cut off at the end"""
+    try:
+        head.decode("utf-8")
+        return True
+    except UnicodeDecodeError as e:
+        return e.start >= len(head) - 3 and e.reason == "unexpected end of data"
+
+
+class StorageWriter:
+    """
+    Writes an incoming file into the storage directory as its bytes arrive.
+
+    The SHA-256 digest, byte count and MIME sniffing sample are computed while
+    the bytes are written, and the size limit is enforced on every write. The
+    data goes to a temporary name inside the destination directory and is
+    atomically renamed once complete, so no second copy of the file is made.
+    """
+
+    def __init__(self, destination_dir: str, max_size: int, filename: Optional[str] = None):
+        self.destination_dir = destination_dir
+        self.max_size = max_size
+        self.filename = filename
+        self.partial_path = os.path.join(destination_dir, f".incoming-{uuid.uuid4().hex}")
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+        self._out: Optional[BinaryIO] = None
+
+    def write(self, chunk: bytes):
+        """Append a chunk, rejecting it if the file would grow beyond max_size"""
+        if not chunk:
+            return
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise UploadTooLargeError(self.max_size)
+        if len(self.head) < HEAD_SIZE:
+            self.head += chunk[:HEAD_SIZE - len(self.head)]
+        self.digest.update(chunk)
+        self._open().write(chunk)
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Move the completed file to its content-addressed name.
+
+        Returns:
+            Dict with the stored path, sha256, size, mime_type and head bytes
+        """
+        self._open().close()
+        sha256 = self.digest.hexdigest()
+        extension = os.path.splitext(self.filename or "")[1].lower()
+        final_path = os.path.join(self.destination_dir, f"{sha256}{extension}")
+        os.replace(self.partial_path, final_path)
+
+        return {
+            "path": final_path,
+            "sha256": sha256,
+            "size": self.size,
+            "mime_type": sniff_mime_type(self.head, self.filename),
+            "head": self.head,
+        }
+
+    def discard(self):
+        """Remove the partially written file"""
+        if self._out is not None:
+            self._out.close()
+        if os.path.exists(self.partial_path):
+            os.unlink(self.partial_path)
+
+    def _open(self) -> BinaryIO:
+        if self._out is None:
+            os.makedirs(self.destination_dir, exist_ok=True)
+            self._out = open(self.partial_path, "wb")
+        return self._out
+
+
+def stream_to_path(
+    chunks: Iterable[bytes],
+    destination_dir: str,
+    max_size: int,
+    filename: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Write a stream of byte chunks into the storage directory in a single pass.
+
+    Args:
+        chunks: Iterable of byte chunks
+        destination_dir: Final storage directory
+        max_size: Maximum number of bytes accepted
+        filename: Original filename, used for MIME detection and the stored extension
+
+    Returns:
+        Dict with the stored path, sha256, size, mime_type and head bytes
+
+    Raises:
+        UploadTooLargeError: If the stream exceeds max_size
+    """
+    writer = StorageWriter(destination_dir, max_size, filename)
+    try:
+        for chunk in chunks:
+            writer.write(chunk)
+        return writer.finish()
+    except BaseException:
+        writer.discard()
+        raise
+
+
+class MultipartUploadReader:
+    """
+    Reads a multipart/form-data upload straight from the request stream.
+
+    The body is parsed as it arrives: bytes of the file part are written to
+    storage (in the threadpool) chunk by chunk, and every received byte counts
+    towards the limit, so chunked requests without a Content-Length are
+    capped as well. The file's extension is checked as soon as its part
+    headers arrive, before any of its content is read.
+    """
+
+    def __init__(
+        self,
+        destination_dir: str,
+        max_size: int,
+        allowed_extensions: Optional[Iterable[str]] = None,
+        required_fields: Iterable[str] = (),
+    ):
+        self.destination_dir = destination_dir
+        self.max_size = max_size
+        self.allowed_extensions = set(allowed_extensions) if allowed_extensions is not None else None
+        self.required_fields = list(required_fields)
+        self.fields: Dict[str, str] = {}
+        self.writer: Optional[StorageWriter] = None
+        self._pending: List[bytes] = []
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._field_name: Optional[str] = None
+        self._field_data = b""
+        self._in_file = False
+        self._ended = False
+
+    async def read(self, request) -> Dict[str, Any]:
+        """
+        Store the request's file part and collect its form fields.
+
+        Returns:
+            Dict describing the stored file (see StorageWriter.finish), plus
+            the original filename and the form fields
+
+        Raises:
+            UploadTooLargeError: If the body grows beyond the limit
+            InvalidUploadError: If the body is malformed, the file type is not
+                allowed, or the file or a required field is missing
+        """
+        content_type, params = parse_options_header(request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise InvalidUploadError("Expected a multipart/form-data body", status_code=415)
+
+        parser = MultipartParser(params[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_end": self._on_end,
+        })
+        received = 0
+        try:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > self.max_size + FORM_OVERHEAD:
+                    raise UploadTooLargeError(self.max_size)
+                parser.write(chunk)
+                if self._pending:
+                    pending, self._pending = self._pending, []
+                    await run_in_threadpool(self._write_pending, pending)
+            parser.finalize()
+
+            if not self._ended:
+                raise InvalidUploadError("Incomplete multipart body")
+            if self.writer is None:
+                raise InvalidUploadError("Missing file", status_code=422)
+            missing = [name for name in self.required_fields if not self.fields.get(name)]
+            if missing:
+                raise InvalidUploadError(f"Missing form fields: {', '.join(missing)}", status_code=422)
+
+            stored = await run_in_threadpool(self.writer.finish)
+        except BaseException:
+            if self.writer is not None:
+                await run_in_threadpool(self.writer.discard)
+            raise
+
+        return {**stored, "filename": self.writer.filename, "fields": self.fields}
+
+    def _write_pending(self, pending: List[bytes]):
+        for data in pending:
+            self.writer.write(data)
+
+    def _on_part_begin(self):
+        self._disposition = b""
+        self._field_name = None
+        self._field_data = b""
+        self._in_file = False
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        if b"name" not in options:
+            raise InvalidUploadError('The Content-Disposition header field "name" must be provided')
+        self._field_name = options[b"name"].decode("utf-8", errors="replace")
+        if b"filename" not in options:
+            return
+
+        if self.writer is not None:
+            raise InvalidUploadError("Only one file may be uploaded")
+        filename = options[b"filename"].decode("utf-8", errors="replace")
+        extension = os.path.splitext(filename)[1].lower()
+        if self.allowed_extensions is not None and extension not in self.allowed_extensions:
+            raise InvalidUploadError(f"Unsupported file type: {extension}")
+        self.writer = StorageWriter(self.destination_dir, self.max_size, filename)
+        self._in_file = True
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self._pending.append(data[start:end])
+        else:
+            self._field_data += data[start:end]
+            if len(self._field_data) > MAX_FIELD_SIZE:
+                raise InvalidUploadError(f"Form field {self._field_name} is too large")
+
+    def _on_part_end(self):
+        if not self._in_file:
+            self.fields[self._field_name] = self._field_data.decode("utf-8", errors="replace")
+
+    def _on_end(self):
+        self._ended = True
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware rejecting oversize uploads from the Content-Length header,
+    before any of the body is read. Bodies sent without one are capped by
+    MultipartUploadReader as they arrive.
+    """
+
+    def __init__(self, app, max_size: int, paths: Iterable[str]):
+        self.app = app
+        self.max_size = max_size
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.paths:
+            headers = dict(scope.get("headers") or [])
+            content_length = headers.get(b"content-length")
+            if content_length and content_length.isdigit() and int(content_length) > self.max_size + FORM_OVERHEAD:
+                response = JSONResponse(
+                    status_code=413,
+                    content={"detail": f"Upload exceeds the maximum allowed size of {self.max_size} bytes"},
+                )
+                await response(scope, receive, send)
+                return
+
+        await self.app(scope, receive, send)
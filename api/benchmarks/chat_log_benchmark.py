@@ -0,0 +1,77 @@
+"""
+Benchmark the streaming chat log parser on a large generated log.
+
+Usage (from the repository root):
+    python -m api.benchmarks.chat_log_benchmark --size-mb 1024 --format text
+    python -m api.benchmarks.chat_log_benchmark --size-mb 1024 --format json
+
+Reports parse time, throughput and the peak resident memory of the process,
+which should stay flat regardless of the size of the log.
+"""
+import os
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+
+from api.app.utils.document_processor import iter_chat_log
+
+WORDS = "the lease tenant landlord rent notice court order section act appeal evidence".split()
+
+
+def generate_log(path: str, size_bytes: int, log_format: str):
+    """Write a chat log of roughly size_bytes bytes in the given format"""
+    rng = random.Random(0)
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        if log_format == "json":
+            f.write("[\n")
+        first = True
+        while written < size_bytes:
+            role = rng.choice(["user", "assistant"])
+            content = " ".join(rng.choices(WORDS, k=rng.randint(10, 120)))
+            if log_format == "json":
+                line = ("" if first else ",\n") + json.dumps({"role": role, "content": content})
+            else:
+                line = f"{'User' if role == 'user' else 'Assistant'}: {content}\n{content}\n\n"
+            f.write(line)
+            written += len(line)
+            first = False
+        if log_format == "json":
+            f.write("\n]\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=1024, help="Size of the generated log")
+    parser.add_argument("--format", choices=["text", "json"], default="text")
+    parser.add_argument("--path", help="Parse this existing log instead of generating one")
+    args = parser.parse_args()
+
+    path = args.path
+    generated = path is None
+    if generated:
+        path = os.path.join(tempfile.mkdtemp(), f"chat.{args.format}")
+        print(f"Generating a {args.size_mb} MB {args.format} log at {path}...")
+        generate_log(path, args.size_mb * 1024 * 1024, args.format)
+
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    size = os.path.getsize(path)
+    started = time.perf_counter()
+    count = sum(1 for _ in iter_chat_log(path))
+    elapsed = time.perf_counter() - started
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(f"Parsed {count} messages from {size / 1024**2:.0f} MB in {elapsed:.1f}s "
+          f"({size / 1024**2 / elapsed:.1f} MB/s)")
+    print(f"Peak RSS: {peak_rss / 1024:.0f} MB (before parsing: {baseline_rss / 1024:.0f} MB)")
+
+    if generated:
+        os.unlink(path)
+        os.rmdir(os.path.dirname(path))
+
+
+if __name__ == "__main__":
+    main()
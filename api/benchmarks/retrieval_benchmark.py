@@ -0,0 +1,76 @@
+"""
+Benchmark hybrid retrieval over a large generated set of indexed documents.
+
+Usage (from the repository root):
+    python -m api.benchmarks.retrieval_benchmark --documents 20000 --cases 20 --owners 200
+
+Indexes the documents with the hashing embedder, then reports the median
+and 95th percentile latency of the searches the query route runs: a user's
+documents in one case, a user's documents across their cases, and an
+administrator's unfiltered search of one case.
+"""
+import time
+import random
+import argparse
+import statistics
+import tempfile
+
+from api.app.services.retrieval_service import RetrievalService
+from api.app.services.vector_index_service import HashingEmbedder
+
+WORDS = (
+    "the lease tenant landlord rent notice court order section act appeal evidence contract "
+    "agreement party plaintiff defendant judgment clause breach damages deposit eviction"
+).split()
+
+
+def build_service(index_root: str, documents: int, cases: int, owners: int) -> RetrievalService:
+    """Index the generated documents, each owned by one user and filed under one case"""
+    rng = random.Random(0)
+    service = RetrievalService(index_root=index_root, embedder=HashingEmbedder())
+    # The registry is written once at the end rather than after every document, to keep setup fast
+    save_documents, service.vector_index._save_documents = service.vector_index._save_documents, lambda: None
+    for number in range(documents):
+        text = " ".join(rng.choices(WORDS, k=rng.randint(150, 600)))
+        service.index_document(
+            f"case-{number % cases}", f"doc-{number}", f"Document {number}", text,
+            metadata={"owner_id": number % owners},
+        )
+    save_documents()
+    return service
+
+
+def measure(search, queries: list) -> str:
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return f"median {statistics.median(timings):.1f} ms, p95 {timings[int(len(timings) * 0.95) - 1]:.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=20000, help="Number of documents indexed")
+    parser.add_argument("--cases", type=int, default=20, help="Number of cases they are spread over")
+    parser.add_argument("--owners", type=int, default=200, help="Number of users who uploaded them")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries timed per search")
+    args = parser.parse_args()
+
+    index_root = tempfile.mkdtemp()
+    print(f"Indexing {args.documents} documents in {index_root}...")
+    started = time.perf_counter()
+    service = build_service(index_root, args.documents, args.cases, args.owners)
+    print(f"Indexed in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(1)
+    queries = [" ".join(rng.choices(WORDS, k=rng.randint(2, 8))) for _ in range(args.queries)]
+    owner = 0
+    print("User, one case:       " + measure(lambda q: service.search(q, case_key="case-0", owner_id=owner), queries))
+    print("User, all their cases: " + measure(lambda q: service.search(q, owner_id=owner), queries))
+    print("Admin, one case:      " + measure(lambda q: service.search(q, case_key="case-0"), queries))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,4 +6,4 @@ class AnalyticsConfig(AppConfig):
     
     def ready(self):
         # Import signal handlers
-        import backend.analytics.signals
+        from . import signals
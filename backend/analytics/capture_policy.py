@@ -0,0 +1,127 @@
+"""
+Policy deciding which API request bodies are captured into APIUsage.request_data.
+
+A body is only read and parsed when the request passes every check, cheapest
+first: its method, its content type, the per-endpoint sample rate and the
+declared Content-Length against the byte cap. Captured bodies are reduced
+to their top-level keys by default, or to their top-level fields with
+sensitive values masked.
+
+Configured through settings.ANALYTICS_CAPTURE:
+
+    ANALYTICS_CAPTURE = {
+        'SAMPLE_RATE': 0.1,           # Fraction of eligible requests captured
+        'MAX_BYTES': 8192,            # Larger bodies are never read
+        'KEYS_ONLY': True,            # Store only the top-level key names
+        'METHODS': ['POST', 'PUT', 'PATCH'],
+        'CONTENT_TYPES': ['application/json'],
+        'ENDPOINTS': [                # First matching path pattern overrides the defaults
+            {'pattern': r'^/api/auth/', 'sample_rate': 0},
+            {'pattern': r'^/api/clients/', 'sample_rate': 1.0, 'keys_only': False},
+        ],
+    }
+"""
+import re
+import json
+import random
+import logging
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'SAMPLE_RATE': 1.0,
+    'MAX_BYTES': 8192,
+    'KEYS_ONLY': True,
+    'METHODS': ['POST', 'PUT', 'PATCH'],
+    'CONTENT_TYPES': ['application/json'],
+    'ENDPOINTS': [],
+}
+
+# Fields whose values are masked when values are captured
+SENSITIVE_FIELDS = ('password', 'token', 'secret', 'auth', 'key', 'credential')
+
+
+class CaptureRule(NamedTuple):
+    sample_rate: float
+    max_bytes: int
+    keys_only: bool
+
+
+class CapturePolicy:
+    """Compiled capture configuration; see the module docstring for the options"""
+
+    def __init__(self, config: dict):
+        self.config = config
+        config = {**DEFAULTS, **config}
+        self.methods = frozenset(method.upper() for method in config['METHODS'])
+        self.content_types = frozenset(config['CONTENT_TYPES'])
+        self.default_rule = CaptureRule(
+            float(config['SAMPLE_RATE']), int(config['MAX_BYTES']), bool(config['KEYS_ONLY'])
+        )
+        self.endpoint_rules = [
+            (re.compile(endpoint['pattern']), CaptureRule(
+                float(endpoint.get('sample_rate', self.default_rule.sample_rate)),
+                int(endpoint.get('max_bytes', self.default_rule.max_bytes)),
+                bool(endpoint.get('keys_only', self.default_rule.keys_only)),
+            ))
+            for endpoint in config['ENDPOINTS']
+        ]
+        # Paths repeat heavily, so rule lookups are memoized per policy
+        self.rule_for = lru_cache(maxsize=1024)(self._match_rule)
+
+    def _match_rule(self, path: str) -> CaptureRule:
+        for pattern, rule in self.endpoint_rules:
+            if pattern.search(path):
+                return rule
+        return self.default_rule
+
+    def rule_for_request(self, request) -> Optional[CaptureRule]:
+        """Return the rule to capture a request's body with, or None to skip it, without reading the body"""
+        if request.method not in self.methods:
+            return None
+        if request.META.get('CONTENT_TYPE', '').split(';')[0].strip().lower() not in self.content_types:
+            return None
+        rule = self.rule_for(request.path)
+        if rule.sample_rate <= 0 or (rule.sample_rate < 1 and random.random() >= rule.sample_rate):
+            return None
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return None
+        # Bodies without a declared length are not read, as their size is unknown
+        if length <= 0 or length > rule.max_bytes:
+            return None
+        return rule
+
+    def extract(self, body: bytes, rule: CaptureRule) -> Optional[dict]:
+        """Reduce a captured JSON body to what is stored, or None if it is not a JSON object"""
+        try:
+            data = json.loads(body)
+        except (ValueError, UnicodeDecodeError) as e:
+            logger.debug(f"Captured request body is not JSON: {e}")
+            return None
+        if not isinstance(data, dict):
+            return None
+        if rule.keys_only:
+            return {'keys': sorted(data)}
+        return {
+            key: '****' if any(field in key.lower() for field in SENSITIVE_FIELDS) else value
+            for key, value in data.items()
+        }
+
+
+_policy = None
+
+
+def get_capture_policy() -> CapturePolicy:
+    """Return the capture policy configured in settings"""
+    global _policy
+    config = getattr(settings, 'ANALYTICS_CAPTURE', {})
+    # Rebuilt when the setting is replaced, e.g. by override_settings
+    if _policy is None or _policy.config is not config:
+        _policy = CapturePolicy(config)
+    return _policy
@@ -0,0 +1,196 @@
+"""
+Compressed columnar files of model rows, in Parquet or Arrow IPC stream
+format.
+
+Rows are read in keyset-paginated batches (ordered by primary key, each
+batch starting after the last key of the previous one), so memory stays
+bounded and every batch is an index range scan however large the table.
+Each model has a fixed Arrow schema derived from its fields, so files of the
+same model written at different times can be read together.
+"""
+import os
+import json
+
+from django.db import connection, models
+
+# Import pyarrow only if available
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+BATCH_SIZE = 10_000
+COMPRESSION = 'zstd'
+SCHEMA_VERSION = '1'
+
+# Supported formats: file extension and media type
+FORMATS = {
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('.arrows', 'application/vnd.apache.arrow.stream'),
+}
+
+
+def _column(field):
+    """(Arrow type, converter) of a model field; the converter prepares non-null values"""
+    if isinstance(field, (models.ForeignKey, models.IntegerField)):
+        return pa.int64(), None
+    if isinstance(field, models.BooleanField):
+        return pa.bool_(), None
+    if isinstance(field, models.FloatField):
+        return pa.float64(), None
+    if isinstance(field, models.DecimalField):
+        return pa.decimal128(field.max_digits, field.decimal_places), None
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC'), None
+    if isinstance(field, models.DateField):
+        return pa.date32(), None
+    if isinstance(field, models.TimeField):
+        return pa.time64('us'), None
+    if isinstance(field, models.DurationField):
+        return pa.duration('us'), None
+    if isinstance(field, models.BinaryField):
+        return pa.binary(), bytes
+    if isinstance(field, models.JSONField):
+        return pa.string(), json.dumps
+    return pa.string(), str
+
+
+def model_columns(model) -> list:
+    """Names, Arrow types and converters of a model's concrete columns"""
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError('pyarrow is required to write columnar files')
+    return [(field.attname, *_column(field)) for field in model._meta.concrete_fields]
+
+
+def model_schema(model):
+    """Arrow schema of a model's rows"""
+    return pa.schema(
+        [pa.field(name, arrow_type) for name, arrow_type, _ in model_columns(model)],
+        metadata={'model': model._meta.label, 'schema_version': SCHEMA_VERSION},
+    )
+
+
+def queryset_batches(queryset, batch_size: int = BATCH_SIZE):
+    """Yield the rows of a queryset as lists of value tuples, keyset-paginated by primary key"""
+    model = queryset.model
+    names = [field.attname for field in model._meta.concrete_fields]
+    pk_index = names.index(model._meta.pk.attname)
+    queryset = queryset.order_by('pk')
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(pk__gt=last)
+        rows = list(page.values_list(*names)[:batch_size])
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][pk_index]
+
+
+def table_batches(table: str, model, batch_size: int = BATCH_SIZE):
+    """
+    Yield the rows of a database table with the columns of a model, e.g. a
+    detached partition, keyset-paginated by primary key
+    """
+    quote = connection.ops.quote_name
+    names = [field.column for field in model._meta.concrete_fields]
+    pk = model._meta.pk.column
+    pk_index = names.index(pk)
+    select = f"SELECT {', '.join(quote(name) for name in names)} FROM {quote(table)}"
+    last = None
+    with connection.cursor() as cursor:
+        while True:
+            if last is None:
+                cursor.execute(f"{select} ORDER BY {quote(pk)} LIMIT %s", [batch_size])
+            else:
+                cursor.execute(f"{select} WHERE {quote(pk)} > %s ORDER BY {quote(pk)} LIMIT %s", [last, batch_size])
+            rows = cursor.fetchall()
+            if not rows:
+                return
+            yield rows
+            last = rows[-1][pk_index]
+
+
+def record_batch(model, rows: list):
+    """Arrow record batch of rows read with queryset_batches or table_batches"""
+    columns = model_columns(model)
+    arrays = []
+    for position, (name, arrow_type, convert) in enumerate(columns):
+        values = [row[position] for row in rows]
+        if convert:
+            values = [convert(value) if value is not None else None for value in values]
+        arrays.append(pa.array(values, type=arrow_type))
+    return pa.RecordBatch.from_arrays(arrays, schema=model_schema(model))
+
+
+def _open_writer(sink, model, format: str):
+    if format == 'parquet':
+        return pq.ParquetWriter(sink, model_schema(model), compression=COMPRESSION)
+    return pa.ipc.new_stream(sink, model_schema(model), options=pa.ipc.IpcWriteOptions(compression=COMPRESSION))
+
+
+def write_columnar(path: str, model, batches, format: str = 'parquet') -> int:
+    """
+    Write batches of a model's rows to a Parquet or Arrow IPC stream file.
+
+    The file is written under a temporary name and moved into place once
+    complete, so a partial file is never left at the final path.
+
+    Returns:
+        Number of rows written
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary_path = f'{path}.tmp'
+    rows_written = 0
+    with pa.OSFile(temporary_path, 'wb') as sink:
+        writer = _open_writer(sink, model, format)
+        try:
+            for rows in batches:
+                writer.write_batch(record_batch(model, rows))
+                rows_written += len(rows)
+        finally:
+            writer.close()
+    os.replace(temporary_path, path)
+    return rows_written
+
+
+class _ChunkSink:
+    """Write-only file object collecting what an Arrow writer writes, so it can be streamed"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_columnar(model, batches, format: str = 'parquet'):
+    """Yield a Parquet or Arrow IPC stream file of batches of a model's rows, chunk by chunk"""
+    sink = _ChunkSink()
+    writer = _open_writer(pa.PythonFile(sink, mode='w'), model, format)
+    for rows in batches:
+        writer.write_batch(record_batch(model, rows))
+        data = sink.take()
+        if data:
+            yield data
+    writer.close()
+    yield sink.take()
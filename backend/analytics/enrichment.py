@@ -0,0 +1,79 @@
+"""
+Enrichment of activity records, applied by the background writer after the
+request has finished: client IP normalization and user-agent parsing.
+"""
+import re
+import ipaddress
+from functools import lru_cache
+
+# Checked in order; the first match names the browser
+BROWSERS = (
+    ('Edge', re.compile(r'Edg(?:e|A|iOS)?/([\d.]+)')),
+    ('Opera', re.compile(r'(?:OPR|Opera)/([\d.]+)')),
+    ('Firefox', re.compile(r'(?:Firefox|FxiOS)/([\d.]+)')),
+    ('Chrome', re.compile(r'(?:Chrome|CriOS)/([\d.]+)')),
+    ('Safari', re.compile(r'Version/([\d.]+).*Safari/')),
+)
+
+OPERATING_SYSTEMS = (
+    ('Windows', re.compile(r'Windows NT')),
+    ('Android', re.compile(r'Android')),
+    ('iOS', re.compile(r'iPhone|iPad|iPod')),
+    ('macOS', re.compile(r'Mac OS X|Macintosh')),
+    ('Linux', re.compile(r'Linux|X11')),
+)
+
+BOT_PATTERN = re.compile(r'bot|crawl|spider|slurp|curl|wget|python-requests|httpx', re.IGNORECASE)
+
+
+def normalize_ip(value: str):
+    """
+    Return the canonical form of the first address in a client IP value
+    (e.g. an X-Forwarded-For list), or None if it is not a valid address.
+    IPv4-mapped IPv6 addresses become plain IPv4.
+    """
+    if not value:
+        return None
+    candidate = value.split(',')[0].strip()
+    if candidate.startswith('[') and ']' in candidate:
+        candidate = candidate[1:candidate.index(']')]
+    elif candidate.count(':') == 1:
+        # IPv4 address with a port
+        candidate = candidate.split(':')[0]
+    try:
+        address = ipaddress.ip_address(candidate)
+    except ValueError:
+        return None
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return str(address)
+
+
+@lru_cache(maxsize=1024)
+def parse_user_agent(user_agent: str) -> dict:
+    """Browser, browser version, operating system and device type of a User-Agent header"""
+    browser, version = 'Other', ''
+    for name, pattern in BROWSERS:
+        match = pattern.search(user_agent)
+        if match:
+            browser, version = name, match.group(1)
+            break
+    operating_system = next((name for name, pattern in OPERATING_SYSTEMS if pattern.search(user_agent)), 'Other')
+
+    if BOT_PATTERN.search(user_agent):
+        device = 'bot'
+    elif 'iPad' in user_agent or ('Android' in user_agent and 'Mobile' not in user_agent):
+        device = 'tablet'
+    elif 'Mobi' in user_agent or 'iPhone' in user_agent:
+        device = 'mobile'
+    else:
+        device = 'desktop'
+    return {'browser': browser, 'browser_version': version, 'os': operating_system, 'device': device}
+
+
+def enrich_activity(records: list):
+    """Normalize the IP addresses and parse the user agents of unsaved UserActivity records"""
+    for record in records:
+        record.ip_address = normalize_ip(record.ip_address)
+        if record.user_agent:
+            record.details = {**(record.details or {}), 'client': parse_user_agent(record.user_agent)}
@@ -0,0 +1,43 @@
+"""
+Datasets available for columnar export of analytics history, shared by the
+export_analytics command and the admin export endpoint.
+"""
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from billing.models import TimeEntry, Invoice
+from .columnar import FORMATS
+from .models import APIUsage, UserActivity
+
+# Dataset name: (model, field the date range applies to)
+DATASETS = {
+    'api_usage': (APIUsage, 'timestamp'),
+    'user_activity': (UserActivity, 'timestamp'),
+    'time_entries': (TimeEntry, 'date'),
+    'invoices': (Invoice, 'issue_date'),
+}
+
+
+def dataset_queryset(name: str, start: date = None, end: date = None):
+    """
+    Rows of a dataset between two dates, both inclusive (UTC days for
+    timestamps, filtered as a range so partitions outside it are skipped)
+    """
+    model, field = DATASETS[name]
+    queryset = model.objects.all()
+    is_datetime = model._meta.get_field(field).get_internal_type() == 'DateTimeField'
+    if start:
+        value = datetime.combine(start, time.min, tzinfo=dt_timezone.utc) if is_datetime else start
+        queryset = queryset.filter(**{f'{field}__gte': value})
+    if end:
+        if is_datetime:
+            queryset = queryset.filter(**{
+                f'{field}__lt': datetime.combine(end, time.min, tzinfo=dt_timezone.utc) + timedelta(days=1)
+            })
+        else:
+            queryset = queryset.filter(**{f'{field}__lte': end})
+    return queryset
+
+
+def export_filename(name: str, start: date = None, end: date = None, format: str = 'parquet') -> str:
+    period = f"_{start or 'start'}_{end or 'now'}" if start or end else ''
+    return f'{name}{period}{FORMATS[format][0]}'
@@ -0,0 +1,117 @@
+"""
+Mergeable latency sketches for percentile queries over rollups.
+
+A sketch is a log-linear (HDR-style) histogram of response times in
+milliseconds. Values below 2 * SUB_BUCKETS are counted exactly; above that,
+every power of two is split into SUB_BUCKETS equal buckets, so each bucket
+covers at most 1 / SUB_BUCKETS of its values (about 3%). Merging two
+sketches adds their counts, so the sketch of a day or a month is the merge
+of its hourly sketches and percentiles never need the raw rows.
+
+Sketches are stored as a version byte followed by varint (index delta,
+count) pairs of the non-empty buckets, typically a few hundred bytes.
+"""
+import math
+
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+FORMAT_VERSION = 1
+
+
+def bucket_index(value: int) -> int:
+    """Index of the bucket holding a value"""
+    value = max(int(value), 0)
+    if value < 2 * SUB_BUCKETS:
+        return value
+    exponent = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (exponent + 1) * SUB_BUCKETS + (value >> exponent) - SUB_BUCKETS
+
+
+def bucket_bounds(index: int):
+    """Lowest and highest value of a bucket"""
+    if index < 2 * SUB_BUCKETS:
+        return index, index
+    exponent = index // SUB_BUCKETS - 1
+    sub_bucket = index % SUB_BUCKETS + SUB_BUCKETS
+    return sub_bucket << exponent, ((sub_bucket + 1) << exponent) - 1
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, position: int):
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+class LatencySketch:
+    """Log-linear histogram of latencies in milliseconds"""
+
+    def __init__(self, counts: dict = None):
+        self.counts = counts or {}
+
+    def add(self, value: int, count: int = 1):
+        index = bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+
+    def merge(self, other: 'LatencySketch'):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def percentile(self, fraction: float):
+        """
+        Estimate a percentile, e.g. percentile(0.95), as the midpoint of the
+        bucket holding it. Returns None for an empty sketch.
+        """
+        total = self.total
+        if not total:
+            return None
+        rank = max(math.ceil(fraction * total), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                low, high = bucket_bounds(index)
+                return (low + high) / 2
+        return None
+
+    def to_bytes(self) -> bytes:
+        out = bytearray([FORMAT_VERSION])
+        previous = 0
+        for index in sorted(self.counts):
+            if self.counts[index]:
+                _write_varint(out, index - previous)
+                _write_varint(out, self.counts[index])
+                previous = index
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data) -> 'LatencySketch':
+        data = bytes(data or b'')
+        counts = {}
+        if not data:
+            return cls(counts)
+        if data[0] != FORMAT_VERSION:
+            raise ValueError(f'Unknown latency sketch format {data[0]}')
+        position, index = 1, 0
+        while position < len(data):
+            delta, position = _read_varint(data, position)
+            count, position = _read_varint(data, position)
+            index += delta
+            counts[index] = count
+        return cls(counts)
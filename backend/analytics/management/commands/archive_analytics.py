@@ -0,0 +1,122 @@
+"""
+Management command to archive raw API usage and user activity older than
+ANALYTICS_RETENTION_MONTHS. Each expired month is exported to a Parquet file
+in ANALYTICS_ARCHIVE_DIR (<table>/YYYY-MM.parquet) and then removed: on
+PostgreSQL its partition is detached and dropped, elsewhere its rows are
+deleted. On PostgreSQL the partitions of the coming months are created too,
+and expired rows left in the default partition are archived like plain rows,
+to a numbered file when their month already has an archive.
+
+Months are only archived once they are rolled up, so dashboards keep their
+history. This should be run as a scheduled task (e.g., using cron) once a day.
+"""
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from analytics.columnar import PYARROW_AVAILABLE, write_columnar, queryset_batches, table_batches, BATCH_SIZE
+from analytics.partitions import (
+    PARTITIONED_MODELS, month_start, add_months, is_partitioned, ensure_partitions, monthly_partitions,
+    drop_partition,
+)
+from analytics.rollups import get_watermark
+
+
+class Command(BaseCommand):
+    help = 'Export raw analytics rows older than the retention period to Parquet files and remove them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months', type=int, default=getattr(settings, 'ANALYTICS_RETENTION_MONTHS', 13),
+            help='Number of whole months of raw rows to keep, besides the current month'
+        )
+        parser.add_argument(
+            '--archive-dir', type=str, default=getattr(settings, 'ANALYTICS_ARCHIVE_DIR', 'analytics_archive'),
+            help='Directory the Parquet files are written to'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Number of rows read per query'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report what would be archived without changing anything'
+        )
+
+    def handle(self, *args, **options):
+        if not PYARROW_AVAILABLE:
+            raise CommandError('pyarrow is required to archive analytics rows')
+        watermark = get_watermark()
+        if watermark is None:
+            raise CommandError('No rollups exist yet; run rollup_analytics first')
+
+        now = timezone.now()
+        # Whole months before the cutoff are archived
+        cutoff = min(add_months(month_start(now), -options['months']), month_start(watermark))
+        self.options = options
+
+        for model in PARTITIONED_MODELS:
+            if is_partitioned(model):
+                self.archive_partitions(model, now, cutoff)
+            else:
+                self.archive_rows(model, cutoff)
+
+    def archive_path(self, model, month, numbered=False):
+        base = os.path.join(self.options['archive_dir'], model._meta.db_table, f'{month:%Y-%m}')
+        path = f'{base}.parquet'
+        number = 1
+        while numbered and os.path.exists(path):
+            number += 1
+            path = f'{base}.{number}.parquet'
+        return path
+
+    def archive_partitions(self, model, now, cutoff):
+        dry_run = self.options['dry_run']
+        if not dry_run:
+            for name in ensure_partitions(model, now):
+                self.stdout.write(f'Created partition {name}')
+
+        archived = set()
+        for name, month in monthly_partitions(model):
+            if add_months(month, 1) > cutoff:
+                continue
+            archived.add(month)
+            path = self.archive_path(model, month)
+            if dry_run:
+                self.stdout.write(f'Would archive partition {name} to {path}')
+                continue
+            rows = write_columnar(path, model, table_batches(name, model, self.options['batch_size']))
+            drop_partition(model, name)
+            self.stdout.write(self.style.SUCCESS(f'Archived {rows} rows of partition {name} to {path}'))
+
+        # What is left before the cutoff sits in the default partition, e.g. rows that arrived after
+        # their month was archived; those months may already have an archive, which must be kept
+        self.archive_rows(model, cutoff, skip=archived, numbered=True)
+
+    def archive_rows(self, model, cutoff, skip=(), numbered=False):
+        first = model.objects.aggregate(first=Min('timestamp'))['first']
+        if first is None:
+            return
+
+        month = month_start(first)
+        while add_months(month, 1) <= cutoff:
+            rows = model.objects.filter(timestamp__gte=month, timestamp__lt=add_months(month, 1))
+            if month not in skip and rows.exists():
+                self.archive_month(model, rows, month, numbered)
+            month = add_months(month, 1)
+
+    def archive_month(self, model, rows, month, numbered=False):
+        batch_size = self.options['batch_size']
+        path = self.archive_path(model, month, numbered)
+        name = model._meta.verbose_name_plural
+        if self.options['dry_run']:
+            self.stdout.write(f'Would archive {rows.count()} {name} rows to {path}')
+            return
+        count = write_columnar(path, model, queryset_batches(rows, batch_size))
+        while True:
+            ids = list(rows.order_by().values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            model.objects.filter(pk__in=ids).delete()
+        self.stdout.write(self.style.SUCCESS(f'Archived {count} {name} rows to {path}'))
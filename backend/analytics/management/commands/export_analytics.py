@@ -0,0 +1,42 @@
+"""
+Management command to export analytics history (API usage, user activity,
+time entries and invoices) to compressed columnar files for offline
+analysis with tools such as pandas, Polars or DuckDB.
+"""
+import os
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from analytics.columnar import PYARROW_AVAILABLE, FORMATS, BATCH_SIZE, write_columnar, queryset_batches
+from analytics.exports import DATASETS, dataset_queryset, export_filename
+
+class Command(BaseCommand):
+    help = 'Export analytics datasets to Parquet or Arrow IPC files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dataset', action='append', choices=sorted(DATASETS),
+            help='Dataset to export; may be repeated (defaults to all datasets)'
+        )
+        parser.add_argument('--start', type=str, help='First day to export (YYYY-MM-DD)')
+        parser.add_argument('--end', type=str, help='Last day to export (YYYY-MM-DD)')
+        parser.add_argument('--format', choices=sorted(FORMATS), default='parquet', help='File format')
+        parser.add_argument('--output-dir', type=str, default='.', help='Directory the files are written to')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Number of rows read per query')
+
+    def handle(self, *args, **options):
+        if not PYARROW_AVAILABLE:
+            raise CommandError('pyarrow is required to export analytics datasets')
+        try:
+            start = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else None
+            end = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else None
+        except ValueError as e:
+            raise CommandError(f'Invalid date: {e}')
+
+        for name in options['dataset'] or DATASETS:
+            model = DATASETS[name][0]
+            path = os.path.join(options['output_dir'], export_filename(name, start, end, options['format']))
+            rows = write_columnar(
+                path, model, queryset_batches(dataset_queryset(name, start, end), options['batch_size']),
+                options['format']
+            )
+            self.stdout.write(self.style.SUCCESS(f'Exported {rows} rows of {name} to {path}'))
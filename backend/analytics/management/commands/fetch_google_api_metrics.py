@@ -1,54 +1,122 @@
-from django.core.management.base import BaseCommand
-from backend.analytics.models import GoogleApiUsageMetric # Adjust import if model is elsewhere
+"""
+Management command to fetch Google Cloud API usage metrics and store them
+(uses mocked data). Yesterday and the day before are fetched by default;
+--start-date and --end-date backfill any range of days.
+
+Metrics are read as a stream and upserted in chunks with one bulk INSERT ...
+ON CONFLICT per chunk on the (metric_date, service_name, metric_name, unit)
+key, so a long backfill costs two queries per chunk rather than per metric.
+"""
 import datetime
+from decimal import Decimal
+from itertools import islice
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from analytics.models import GoogleApiUsageMetric
 # from django.conf import settings # For GOOGLE_CLOUD_PROJECT_ID, GOOGLE_CREDENTIALS_PATH
 # from google.cloud import service_usage_v1, monitoring_v3 # etc.
 # import os
 
+BATCH_SIZE = 1000
+
+KEY_FIELDS = ('metric_date', 'service_name', 'metric_name', 'unit')
+UPDATE_FIELDS = ('metric_value', 'cost', 'last_updated_at')
+
+# Mocked daily figures (request count, cost), alternating from yesterday backwards
+MOCK_DAYS = ((1250, Decimal('15.75')), (1100, Decimal('12.50')))
+
+
+def fetch_metrics(start: datetime.date, end: datetime.date):
+    """Yield the metrics of each day from end back to start, as field dicts (mocked)"""
+    today = datetime.date.today()
+    day = end
+    while day >= start:
+        request_count, cost = MOCK_DAYS[((today - day).days - 1) % len(MOCK_DAYS)]
+        yield {
+            'metric_date': day, 'service_name': 'Vertex AI API',
+            'metric_name': 'aiplatform.googleapis.com/prediction/request_count',
+            'metric_value': request_count, 'unit': 'requests', 'cost': None,
+        }
+        yield {
+            'metric_date': day, 'service_name': 'Vertex AI API',
+            'metric_name': 'billing/cost',
+            'metric_value': None, 'cost': cost, 'unit': 'USD',
+        }
+        day -= datetime.timedelta(days=1)
+
+
+def chunks(iterable, size: int):
+    """Split an iterable into lists of at most size items, lazily"""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def upsert_metrics(data_points: list) -> list:
+    """
+    Insert or update metrics with one bulk statement.
+
+    Returns:
+        (metric, created) pairs, in the order of data_points
+    """
+    metrics = [
+        GoogleApiUsageMetric(**{field: data_point.get(field) for field in KEY_FIELDS + ('metric_value', 'cost')})
+        for data_point in data_points
+    ]
+    keys = [tuple(getattr(metric, field) for field in KEY_FIELDS) for metric in metrics]
+    existing = set(
+        GoogleApiUsageMetric.objects.filter(
+            metric_date__range=(min(key[0] for key in keys), max(key[0] for key in keys)),
+            service_name__in={key[1] for key in keys},
+            metric_name__in={key[2] for key in keys},
+        ).values_list(*KEY_FIELDS)
+    )
+    GoogleApiUsageMetric.objects.bulk_create(
+        metrics, update_conflicts=True, unique_fields=KEY_FIELDS, update_fields=UPDATE_FIELDS
+    )
+    return [(metric, key not in existing) for metric, key in zip(metrics, keys)]
+
+
 class Command(BaseCommand):
     help = 'Fetches API usage metrics from Google Cloud and stores them (uses mocked data).'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', type=str, help='First day to fetch (YYYY-MM-DD)')
+        parser.add_argument('--end-date', type=str, help='Last day to fetch (YYYY-MM-DD), defaults to yesterday')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE, help='Number of metrics upserted per query'
+        )
+
     def handle(self, *args, **options):
-        self.stdout.write("Starting to fetch Google API metrics (using mocked data)...")
-        
-        yesterday = datetime.date.today() - datetime.timedelta(days=1)
-        two_days_ago = datetime.date.today() - datetime.timedelta(days=2)
-
-        mock_metrics_data = [
-            {
-                'metric_date': yesterday, 'service_name': 'Vertex AI API', 
-                'metric_name': 'aiplatform.googleapis.com/prediction/request_count', 
-                'metric_value': 1250, 'unit': 'requests', 'cost': None,
-            },
-            {
-                'metric_date': yesterday, 'service_name': 'Vertex AI API', 
-                'metric_name': 'billing/cost', 
-                'metric_value': None, 'cost': 15.75, 'unit': 'USD',
-            },
-            {
-                'metric_date': two_days_ago, 'service_name': 'Vertex AI API', 
-                'metric_name': 'aiplatform.googleapis.com/prediction/request_count', 
-                'metric_value': 1100, 'unit': 'requests', 'cost': None,
-            },
-            {
-                'metric_date': two_days_ago, 'service_name': 'Vertex AI API', 
-                'metric_name': 'billing/cost', 
-                'metric_value': None, 'cost': 12.50, 'unit': 'USD',
-            }
-        ]
-
-        for data_point in mock_metrics_data:
-            obj, created = GoogleApiUsageMetric.objects.update_or_create(
-                metric_date=data_point['metric_date'],
-                service_name=data_point['service_name'],
-                metric_name=data_point['metric_name'],
-                unit=data_point['unit'],
-                defaults={
-                    'metric_value': data_point.get('metric_value'),
-                    'cost': data_point.get('cost')
-                }
+        try:
+            end = (
+                datetime.datetime.strptime(options['end_date'], '%Y-%m-%d').date() if options['end_date']
+                else datetime.date.today() - datetime.timedelta(days=1)
+            )
+            start = (
+                datetime.datetime.strptime(options['start_date'], '%Y-%m-%d').date() if options['start_date']
+                else end - datetime.timedelta(days=1)
             )
-            action = "created" if created else "updated"
-            self.stdout.write(f"Successfully {action} metric: {obj}")
-        
+        except ValueError as e:
+            raise CommandError(f'Invalid date: {e}')
+        if start > end:
+            raise CommandError('--start-date must not be after --end-date')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        self.stdout.write("Starting to fetch Google API metrics (using mocked data)...")
+
+        created_count = updated_count = 0
+        for chunk in chunks(fetch_metrics(start, end), options['batch_size']):
+            with transaction.atomic():
+                results = upsert_metrics(chunk)
+            for obj, created in results:
+                action = "created" if created else "updated"
+                self.stdout.write(f"Successfully {action} metric: {obj}")
+                if created:
+                    created_count += 1
+                else:
+                    updated_count += 1
+
+        self.stdout.write(f"{created_count} metrics created, {updated_count} updated from {start} to {end}.")
         self.stdout.write(self.style.SUCCESS("Mocked Google API metrics fetch complete."))
@@ -5,11 +5,12 @@ This should be run as a scheduled task (e.g., using cron) once a day.
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.db.models import Count, Avg, Sum
-from analytics.models import APIUsage, UserActivity, AnalyticsSummary
+from analytics.models import AnalyticsSummary
+from analytics.rollups import usage_rows, distinct_users, total_usage, average_latency
 from accounts.models import User
 from documents.models import Document
 from billing.models import Invoice
-from datetime import timedelta
+from datetime import timedelta, datetime, time, timezone as dt_timezone
 
 class Command(BaseCommand):
     help = 'Generate daily analytics summary'
@@ -27,22 +28,21 @@ class Command(BaseCommand):
         start_datetime = timezone.datetime.combine(yesterday, timezone.datetime.min.time())
         end_datetime = timezone.datetime.combine(yesterday, timezone.datetime.max.time())
         
-        # Active users (users who performed any activity)
-        active_users = UserActivity.objects.filter(
-            timestamp__range=(start_datetime, end_datetime)
-        ).values('user').distinct().count()
+        day_start = datetime.combine(yesterday, time.min, tzinfo=dt_timezone.utc)
+        day_end = day_start + timedelta(days=1)
+        
+        # Active users (users who performed any activity), estimated from HyperLogLog sketches
+        active_users = distinct_users('users', day_start, day_end)
         
         # New users
         new_users = User.objects.filter(
             date_joined__range=(start_datetime, end_datetime)
         ).count()
         
-        # API usage
-        api_calls = APIUsage.objects.filter(
-            timestamp__range=(start_datetime, end_datetime)
-        )
-        total_api_calls = api_calls.count()
-        avg_response_time = api_calls.aggregate(avg=Avg('response_time_ms'))['avg'] or 0
+        # API usage, read from the hourly and daily rollups
+        api_usage = total_usage(usage_rows(day_start, day_end))
+        total_api_calls = api_usage['request_count']
+        avg_response_time = average_latency(api_usage)
         
         # Documents processed
         documents_processed = Document.objects.filter(
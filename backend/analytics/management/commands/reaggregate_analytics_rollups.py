@@ -0,0 +1,54 @@
+"""
+Management command to recompute the rollups of a past date range from the
+raw API usage and user activity rows, e.g. after rows were imported late or
+the rollup format changed. Ranges after the rollup watermark are left to
+rollup_analytics, and days before the oldest raw row, e.g. months removed by
+archive_analytics, keep their rollups since they could only be rebuilt empty.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.core.management.base import BaseCommand, CommandError
+from analytics.rollups import rollup_range, get_watermark, earliest_raw_timestamp, floor_day
+
+
+class Command(BaseCommand):
+    help = 'Recompute analytics rollups for a date range (UTC days)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start', type=str,
+            help='First day to recompute (YYYY-MM-DD); defaults to the day of the oldest raw row'
+        )
+        parser.add_argument(
+            '--end', type=str,
+            help='Last day to recompute (YYYY-MM-DD); defaults to the rollup watermark'
+        )
+
+    def handle(self, *args, **options):
+        watermark = get_watermark()
+        if watermark is None:
+            raise CommandError('No rollups exist yet; run rollup_analytics first')
+
+        earliest = earliest_raw_timestamp()
+        first_day = floor_day(earliest) if earliest is not None else watermark
+        try:
+            start = self._day_start(options['start']) if options['start'] else first_day
+            end = self._day_start(options['end']) + timedelta(days=1) if options['end'] else watermark
+        except ValueError as e:
+            raise CommandError(f'Invalid date: {e}')
+
+        if start < first_day:
+            self.stdout.write(self.style.WARNING(
+                f'No raw rows before {first_day}; rollups before it are kept as they are'
+            ))
+            start = first_day
+        end = min(end, watermark)
+        if start >= end:
+            self.stdout.write(self.style.WARNING('Nothing to recompute in that range'))
+            return
+
+        days = rollup_range(start, end)
+        self.stdout.write(self.style.SUCCESS(f'Recomputed rollups of {days} day(s) from {start} to {end}'))
+
+    @staticmethod
+    def _day_start(value: str) -> datetime:
+        return datetime.combine(datetime.strptime(value, '%Y-%m-%d').date(), time.min, tzinfo=dt_timezone.utc)
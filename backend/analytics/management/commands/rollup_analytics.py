@@ -0,0 +1,18 @@
+"""
+Management command to roll up raw API usage and user activity into the
+hourly and daily rollup tables. It only aggregates the hours completed since
+the previous run, so it should be run every few minutes (e.g. using cron).
+The first run backfills everything since the oldest raw row.
+"""
+from django.core.management.base import BaseCommand
+from analytics.rollups import update_rollups
+
+class Command(BaseCommand):
+    help = 'Roll up API usage and user activity completed since the last run'
+
+    def handle(self, *args, **options):
+        start, end = update_rollups()
+        if start == end:
+            self.stdout.write(f'Rollups are up to date as of {end}')
+            return
+        self.stdout.write(self.style.SUCCESS(f'Rolled up analytics from {start} to {end}'))
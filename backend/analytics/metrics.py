@@ -0,0 +1,190 @@
+"""
+Real-time metrics for the admin dashboard: sliding-window counters,
+distinct-user sketches and gauges, shared between worker processes through
+the Django cache.
+
+Each process buffers counter increments and the users it has seen in
+memory, and flushes them to the cache every few seconds:
+- counters are summed per minute in keys expiring after MAX_WINDOW_MINUTES,
+  so a window is the sum of its minute keys, read with one get_many;
+- distinct users are HyperLogLog sketches per hour. A process keeps its own
+  sketch of the hour and writes it merged with the cached one, so an update
+  lost to a concurrent write is restored by the next flush;
+- gauges (totals such as the number of users) live in the cache, move with
+  model signals and are recounted from the database only when missing,
+  at most once per GAUGE_TIMEOUT.
+
+With a shared cache (REDIS_URL) the figures cover every worker; with the
+default local-memory cache they only cover the process answering.
+"""
+import os
+import logging
+import threading
+from time import monotonic, time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .hll import HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'analytics:metrics'
+
+# Longest counter window, in minutes
+MAX_WINDOW_MINUTES = 60
+# Longest distinct-user window, in hours
+MAX_WINDOW_HOURS = 24
+# Gauges are recounted from the database this often, correcting any drift
+GAUGE_TIMEOUT = 3600
+
+
+def _minute(now: float) -> int:
+    return int(now // 60)
+
+
+def _hour(now: float) -> int:
+    return int(now // 3600)
+
+
+class MetricsRegistry:
+    """
+    Process-local buffer of metric updates, flushed to the cache.
+
+    Args:
+        flush_interval_ms: Longest time an update stays in memory before being flushed
+    """
+
+    def __init__(self, flush_interval_ms=5000):
+        self.flush_interval = flush_interval_ms / 1000
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._counters = defaultdict(int)
+        self._sketches = {}
+        self._dirty = set()
+        self._last_flush = monotonic()
+
+    def _check_fork(self):
+        # A forked worker must not flush the updates its parent buffered
+        if self._pid != os.getpid():
+            self._reset()
+
+    def incr(self, name: str, amount: int = 1, now: float = None):
+        """Add to a sliding-window counter"""
+        with self._lock:
+            self._check_fork()
+            self._counters[(name, _minute(now or time()))] += amount
+        self._maybe_flush()
+
+    def add_user(self, name: str, user_id, now: float = None):
+        """Record a user in a distinct-user metric"""
+        key = (name, _hour(now or time()))
+        with self._lock:
+            self._check_fork()
+            sketch = self._sketches.get(key)
+            if sketch is None:
+                sketch = self._sketches[key] = HyperLogLog()
+            sketch.add(user_id)
+            self._dirty.add(key)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self, now: float = None):
+        """Write buffered updates to the cache"""
+        with self._lock:
+            self._check_fork()
+            counters, self._counters = self._counters, defaultdict(int)
+            dirty, self._dirty = self._dirty, set()
+            sketches = {key: HyperLogLog(self._sketches[key].registers) for key in dirty}
+            # Only the current hour's sketch can still change
+            current_hour = _hour(now or time())
+            self._sketches = {key: sketch for key, sketch in self._sketches.items() if key[1] >= current_hour}
+            self._last_flush = monotonic()
+
+        try:
+            for (name, minute), amount in counters.items():
+                key = f'{KEY_PREFIX}:counter:{name}:{minute}'
+                if cache.add(key, amount, timeout=(MAX_WINDOW_MINUTES + 1) * 60):
+                    continue
+                try:
+                    cache.incr(key, amount)
+                except ValueError:
+                    # Expired between add and incr
+                    cache.set(key, amount, timeout=(MAX_WINDOW_MINUTES + 1) * 60)
+            for (name, hour), sketch in sketches.items():
+                key = f'{KEY_PREFIX}:users:{name}:{hour}'
+                cached = cache.get(key)
+                if cached:
+                    sketch.merge(HyperLogLog.from_bytes(cached))
+                cache.set(key, sketch.to_bytes(), timeout=(MAX_WINDOW_HOURS + 1) * 3600)
+        except Exception as e:
+            # Metrics must never break the request that happened to flush them
+            logger.warning(f"Error flushing metrics: {e}")
+
+    def counter(self, name: str, minutes: int, now: float = None) -> int:
+        """Total of a counter over the last `minutes` minutes, the current one included"""
+        self.flush()
+        last = _minute(now or time())
+        keys = [f'{KEY_PREFIX}:counter:{name}:{minute}' for minute in range(last - minutes + 1, last + 1)]
+        return sum(cache.get_many(keys).values())
+
+    def distinct_users(self, name: str, hours: int, now: float = None) -> int:
+        """Estimated distinct users of a metric over the last `hours` hours, the current one included"""
+        self.flush()
+        last = _hour(now or time())
+        keys = [f'{KEY_PREFIX}:users:{name}:{hour}' for hour in range(last - hours + 1, last + 1)]
+        union = HyperLogLog()
+        for registers in cache.get_many(keys).values():
+            union.merge(HyperLogLog.from_bytes(registers))
+        return union.count()
+
+    def gauge(self, name: str, seed) -> int:
+        """Value of a gauge, set from seed() when the cache has none"""
+        key = f'{KEY_PREFIX}:gauge:{name}'
+        value = cache.get(key)
+        if value is None:
+            value = seed()
+            cache.add(key, value, timeout=GAUGE_TIMEOUT)
+        return value
+
+    def gauge_add(self, name: str, amount: int):
+        """Move a gauge; a gauge not in the cache is left to be seeded on its next read"""
+        try:
+            cache.incr(f'{KEY_PREFIX}:gauge:{name}', amount)
+        except ValueError:
+            pass
+        except Exception as e:
+            logger.warning(f"Error updating gauge {name}: {e}")
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Return the process-wide metrics registry, configured from settings"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry(
+                flush_interval_ms=getattr(settings, 'ANALYTICS_METRICS_FLUSH_INTERVAL_MS', 5000),
+            )
+        return _registry
+
+
+def record_request(user_id, status_code: int, response_time_ms: int):
+    """Feed the metrics of one API request"""
+    metrics = get_metrics()
+    metrics.incr('api_requests')
+    metrics.incr('api_latency_ms', response_time_ms)
+    if status_code >= 400:
+        metrics.incr('api_errors')
+    if user_id is not None:
+        metrics.add_user('active_users', user_id)
@@ -1,28 +1,35 @@
 from time import time
-import json
 import logging
+from django.conf import settings
 from django.utils import timezone
 from analytics.models import APIUsage
+from analytics.usage_writer import get_usage_writer
+from analytics.capture_policy import get_capture_policy
+from analytics.metrics import record_request
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
 class RequestBodyCaptureMiddleware:
-    """Middleware to capture the request body before it gets consumed."""
+    """
+    Middleware that reads the request body before a view consumes it, for the
+    requests the capture policy selects. Other bodies are left untouched.
+    """
     
     def __init__(self, get_response):
         self.get_response = get_response
         
     def __call__(self, request):
-        # Only store a copy for certain request methods and API endpoints
-        if request.method in ['POST', 'PUT', 'PATCH'] and request.path.startswith('/api/'):
-            try:
-                request._body = request.body
-                if request.path == '/api/clients/':
-                    print(f"DEBUG: Original request body for client creation: {request.body.decode('utf-8')}")
-            except Exception as e:
-                print(f"DEBUG: Failed to store request body: {str(e)}")
-                request._body = None
+        request.analytics_capture = None
+        if request.path.startswith('/api/'):
+            rule = get_capture_policy().rule_for_request(request)
+            if rule is not None:
+                try:
+                    # request.body caches the bytes, so the view can still read them
+                    request.analytics_body = request.body
+                    request.analytics_capture = rule
+                except Exception as e:
+                    logger.debug(f"Failed to capture request body for {request.path}: {e}")
                 
         return self.get_response(request)
 
@@ -44,27 +51,18 @@ class APIUsageMiddleware:
             # Calculate response time
             response_time_ms = int((time() - start_time) * 1000)
             
-            # Sanitize request data - remove sensitive information
+            # Only bodies selected by the capture policy are parsed and stored
             request_data = None
-            # We need to use a custom attribute that stores a copy of the body
-            if request.method in ['POST', 'PUT', 'PATCH'] and hasattr(request, '_body'):
-                try:
-                    # Try to parse JSON body from our stored copy
-                    if request._body:
-                        data = json.loads(request._body)
-                        print(f"DEBUG: Request body in middleware for {request.path}: {data}")
-                        # Remove sensitive fields
-                        sensitive_fields = ['password', 'token', 'secret', 'auth', 'key', 'credential']
-                        if isinstance(data, dict):
-                            request_data = {k: '****' if any(s in k.lower() for s in sensitive_fields) else v 
-                                           for k, v in data.items()}
-                except Exception as e:
-                    print(f"DEBUG: Error parsing request body: {str(e)}")
-                    request_data = None
+            rule = getattr(request, 'analytics_capture', None)
+            if rule is not None:
+                request_data = get_capture_policy().extract(request.analytics_body, rule)
+            
+            user_id = request.user.pk if request.user.is_authenticated else None
+            # Real-time counters for the admin summary, kept in memory and the cache
+            record_request(user_id, response.status_code, response_time_ms)
             
-            # Store the API usage data
-            APIUsage.objects.create(
-                user=request.user if request.user.is_authenticated else None,
+            usage = APIUsage(
+                user_id=user_id,
                 endpoint=request.path,
                 method=request.method,
                 status_code=response.status_code,
@@ -72,7 +70,10 @@ class APIUsageMiddleware:
                 request_data=request_data,
                 timestamp=timezone.now()
             )
-        
-        return response
+            # Written in batches by a background thread, off the request path
+            if getattr(settings, 'ANALYTICS_USAGE_ASYNC', True):
+                get_usage_writer().submit(usage)
+            else:
+                usage.save()
         
         return response
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_auto_20250515_1846'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('position', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GoogleApiUsageMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric_date', models.DateField()),
+                ('service_name', models.CharField(max_length=255)),
+                ('metric_name', models.CharField(max_length=255)),
+                ('metric_value', models.BigIntegerField(blank=True, default=0, null=True)),
+                ('cost', models.DecimalField(blank=True, decimal_places=4, max_digits=10, null=True)),
+                ('unit', models.CharField(blank=True, max_length=50)),
+                ('fetched_at', models.DateTimeField(auto_now_add=True)),
+                ('last_updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Google API Usage Metric',
+                'verbose_name_plural': 'Google API Usage Metrics',
+                'ordering': ['-metric_date', 'service_name'],
+                'unique_together': {('metric_date', 'service_name', 'metric_name', 'unit')},
+            },
+        ),
+        migrations.CreateModel(
+            name='APIUsageRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('endpoint', models.CharField(max_length=255)),
+                ('method', models.CharField(max_length=10)),
+                ('request_count', models.BigIntegerField(default=0)),
+                ('error_count', models.BigIntegerField(default=0)),
+                ('latency_sum_ms', models.BigIntegerField(default=0)),
+                ('latency_histogram', models.JSONField(default=list)),
+            ],
+            options={
+                'verbose_name_plural': 'API Usage Rollups',
+                'indexes': [models.Index(fields=['granularity', 'bucket_start'], name='analytics_a_granula_feca01_idx')],
+                'unique_together': {('granularity', 'bucket_start', 'endpoint', 'method')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('activity_type', models.CharField(max_length=100)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Activity Rollups',
+                'indexes': [models.Index(fields=['granularity', 'bucket_start'], name='analytics_a_granula_1c398e_idx')],
+                'unique_together': {('granularity', 'bucket_start', 'activity_type')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:46
+
+from django.db import migrations, models
+
+
+def reset_rollups(apps, schema_editor):
+    # Existing rollups have no sketch; dropping them with the watermark makes
+    # the next rollup_analytics run rebuild them from the raw rows
+    apps.get_model('analytics', 'APIUsageRollup').objects.all().delete()
+    apps.get_model('analytics', 'ActivityRollup').objects.all().delete()
+    apps.get_model('analytics', 'RollupWatermark').objects.filter(name='analytics_rollups').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='apiusagerollup',
+            name='latency_histogram',
+        ),
+        migrations.AddField(
+            model_name='apiusagerollup',
+            name='latency_sketch',
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.RunPython(reset_rollups, migrations.RunPython.noop),
+    ]
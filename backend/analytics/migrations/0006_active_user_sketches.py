@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:48
+
+from django.db import migrations, models
+
+
+def reset_watermark(apps, schema_editor):
+    # Rolled-up hours have no sketches yet; without a watermark the next
+    # rollup_analytics run rebuilds every rollup from the raw rows
+    apps.get_model('analytics', 'RollupWatermark').objects.filter(name='analytics_rollups').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0005_rollup_latency_sketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActiveUserSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('kind', models.CharField(choices=[('users', 'Active users'), ('api_callers', 'API callers')], max_length=20)),
+                ('registers', models.BinaryField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['granularity', 'bucket_start'], name='analytics_a_granula_0afeb0_idx')],
+                'unique_together': {('granularity', 'bucket_start', 'kind')},
+            },
+        ),
+        migrations.RunPython(reset_watermark, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,107 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import migrations
+
+TABLES = ('analytics_apiusage', 'analytics_useractivity')
+
+# Months of partitions created ahead of the current one (see analytics.partitions)
+MONTHS_AHEAD = 2
+
+
+def _add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _partition(schema_editor, table):
+    """
+    Rebuild a table as one range-partitioned by month of timestamp, keeping
+    its rows, indexes, foreign keys and ID sequence. The primary key becomes
+    (id, timestamp), since a partitioned table's keys must include the
+    partition column; IDs still come from a single sequence.
+    """
+    quote = schema_editor.quote_name
+    legacy = f'{table}_unpartitioned'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table]
+        )
+        if cursor.fetchone():
+            return
+
+        # Definitions are read before the rename so they still name the original table
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN ("
+            "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u'))",
+            [table, table],
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            "SELECT attidentity FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attname = 'id'", [table]
+        )
+        identity = bool(cursor.fetchone()[0])
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        sequence = cursor.fetchone()[0]
+
+        cursor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(legacy)}")
+        cursor.execute(
+            f"CREATE TABLE {quote(table)} (LIKE {quote(legacy)} INCLUDING DEFAULTS INCLUDING IDENTITY) "
+            f"PARTITION BY RANGE (\"timestamp\")"
+        )
+        if not identity and sequence:
+            # A serial column's sequence belongs to the old table and would be dropped with it
+            cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {quote(table)}.id")
+
+        cursor.execute(f"SELECT min(\"timestamp\") FROM {quote(legacy)}")
+        first = cursor.fetchone()[0] or datetime.now(dt_timezone.utc)
+        now = datetime.now(dt_timezone.utc)
+        month = datetime(first.year, first.month, 1, tzinfo=dt_timezone.utc)
+        last = _add_months(datetime(now.year, now.month, 1, tzinfo=dt_timezone.utc), MONTHS_AHEAD)
+        while month <= last:
+            cursor.execute(
+                f"CREATE TABLE {quote(f'{table}_{month:%Y_%m}')} PARTITION OF {quote(table)} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+            )
+            month = _add_months(month, 1)
+        cursor.execute(f"CREATE TABLE {quote(f'{table}_default')} PARTITION OF {quote(table)} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {quote(table)} SELECT * FROM {quote(legacy)}")
+        cursor.execute(f"DROP TABLE {quote(legacy)}")
+
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(f'{table}_pkey')} PRIMARY KEY (id, \"timestamp\")"
+        )
+        for definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}")
+        if identity:
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, 'id'), coalesce(max(id), 0) + 1, false) FROM {quote(table)}",
+                [table],
+            )
+
+
+def partition_tables(apps, schema_editor):
+    """Partition the raw analytics tables by month (PostgreSQL only)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in TABLES:
+        _partition(schema_editor, table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0006_active_user_sketches'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_tables, migrations.RunPython.noop),
+    ]
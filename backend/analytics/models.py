@@ -81,3 +81,78 @@ class GoogleApiUsageMetric(models.Model):
     def __str__(self):
         value = self.metric_value if self.metric_value not in (None, 0) else self.cost
         return f"{self.service_name} - {self.metric_name} on {self.metric_date}: {value} {self.unit}"
+
+
+class APIUsageRollup(models.Model):
+    """API usage aggregated per endpoint and method over an hour or a day."""
+    GRANULARITY_CHOICES = (
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    )
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    endpoint = models.CharField(max_length=255)  # Path with IDs replaced by :id
+    method = models.CharField(max_length=10)
+    request_count = models.BigIntegerField(default=0)
+    error_count = models.BigIntegerField(default=0)  # Responses with status >= 400
+    latency_sum_ms = models.BigIntegerField(default=0)
+    latency_sketch = models.BinaryField(default=bytes)  # Encoded analytics.latency_sketch.LatencySketch
+
+    def __str__(self):
+        return f"{self.method} {self.endpoint} {self.granularity} {self.bucket_start}"
+
+    class Meta:
+        verbose_name_plural = "API Usage Rollups"
+        unique_together = ('granularity', 'bucket_start', 'endpoint', 'method')
+        indexes = [
+            models.Index(fields=['granularity', 'bucket_start']),
+        ]
+
+
+class ActivityRollup(models.Model):
+    """User activity counted per activity type over an hour or a day."""
+    granularity = models.CharField(max_length=4, choices=APIUsageRollup.GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    activity_type = models.CharField(max_length=100)
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.activity_type} {self.granularity} {self.bucket_start}"
+
+    class Meta:
+        verbose_name_plural = "Activity Rollups"
+        unique_together = ('granularity', 'bucket_start', 'activity_type')
+        indexes = [
+            models.Index(fields=['granularity', 'bucket_start']),
+        ]
+
+
+class RollupWatermark(models.Model):
+    """Point in time up to which raw analytics rows have been rolled up."""
+    name = models.CharField(max_length=100, unique=True)
+    position = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.position}"
+
+
+class ActiveUserSketch(models.Model):
+    """HyperLogLog sketch of the distinct users seen over an hour or a day."""
+    KIND_CHOICES = (
+        ('users', 'Active users'),  # Users with any UserActivity
+        ('api_callers', 'API callers'),  # Users with any APIUsage
+    )
+    granularity = models.CharField(max_length=4, choices=APIUsageRollup.GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    registers = models.BinaryField()  # analytics.hll.HyperLogLog registers
+
+    def __str__(self):
+        return f"{self.kind} {self.granularity} {self.bucket_start}"
+
+    class Meta:
+        unique_together = ('granularity', 'bucket_start', 'kind')
+        indexes = [
+            models.Index(fields=['granularity', 'bucket_start']),
+        ]
@@ -0,0 +1,134 @@
+"""
+Monthly range partitions of the raw analytics tables on PostgreSQL.
+
+Migration 0007 turns analytics_apiusage and analytics_useractivity into
+tables partitioned by month of timestamp, named <table>_YYYY_MM, with a
+default partition catching anything outside them. Queries filtering on a
+timestamp range (never on timestamp__date, which hides the column behind a
+cast) only scan the partitions overlapping it, so recent-window queries
+stay on the newest partitions. The archive_analytics command creates the
+coming months' partitions, moving any of their rows out of the default
+partition, and detaches and drops expired ones once they are exported.
+
+Other databases keep plain tables, and expired rows are deleted instead.
+"""
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+from .models import APIUsage, UserActivity
+
+PARTITIONED_MODELS = (APIUsage, UserActivity)
+
+# Months of partitions created ahead of the current one
+MONTHS_AHEAD = 2
+
+PARTITION_SUFFIX = re.compile(r'_(\d{4})_(\d{2})$')
+
+
+def month_start(moment: datetime) -> datetime:
+    moment = moment.astimezone(dt_timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f'{table}_{month:%Y_%m}'
+
+
+def default_partition_name(table: str) -> str:
+    return f'{table}_default'
+
+
+def is_partitioned(model) -> bool:
+    """Whether a model's table is a partitioned PostgreSQL table"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+            [model._meta.db_table],
+        )
+        return cursor.fetchone() is not None
+
+
+def ensure_partitions(model, now: datetime, months_ahead: int = MONTHS_AHEAD) -> list:
+    """
+    Create the partitions of the current month and the next months_ahead
+    months where missing.
+
+    Rows of a missing month may already sit in the default partition, which
+    would make creating its partition fail. The partition is then built as a
+    plain table, the rows are moved into it and it is attached, with the
+    default partition locked against inserts meanwhile.
+
+    Returns:
+        Names of the partitions created
+    """
+    table = model._meta.db_table
+    existing = {name for name, _ in monthly_partitions(model)}
+    created = []
+    month = month_start(now)
+    for _ in range(months_ahead + 1):
+        name = partition_name(table, month)
+        if name not in existing:
+            _create_partition(table, name, month, add_months(month, 1))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def _create_partition(table: str, name: str, start: datetime, end: datetime):
+    quote = connection.ops.quote_name
+    default = quote(default_partition_name(table))
+    bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    in_range = f"\"timestamp\" >= '{start.isoformat()}' AND \"timestamp\" < '{end.isoformat()}'"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [default_partition_name(table)])
+        stranded = False
+        if cursor.fetchone()[0]:
+            # Blocks inserts into the default partition until the month's partition is attached
+            cursor.execute(f"LOCK TABLE {default} IN SHARE ROW EXCLUSIVE MODE")
+            cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_range})")
+            stranded = cursor.fetchone()[0]
+        if not stranded:
+            cursor.execute(f"CREATE TABLE {quote(name)} PARTITION OF {quote(table)} FOR VALUES {bounds}")
+            return
+        cursor.execute(f"CREATE TABLE {quote(name)} (LIKE {quote(table)})")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {default} WHERE {in_range} RETURNING *) "
+            f"INSERT INTO {quote(name)} SELECT * FROM moved"
+        )
+        cursor.execute(f"ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} FOR VALUES {bounds}")
+
+
+def monthly_partitions(model) -> list:
+    """(name, month) of a model's monthly partitions, oldest first"""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(%s)",
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    for name in names:
+        match = PARTITION_SUFFIX.search(name)
+        if match and name == partition_name(table, datetime(int(match[1]), int(match[2]), 1)):
+            partitions.append((name, datetime(int(match[1]), int(match[2]), 1, tzinfo=dt_timezone.utc)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def drop_partition(model, name: str):
+    """Detach a partition from a model's table and drop it"""
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {quote(model._meta.db_table)} DETACH PARTITION {quote(name)}")
+        cursor.execute(f"DROP TABLE {quote(name)}")
@@ -0,0 +1,337 @@
+"""
+Incremental hourly and daily rollups of API usage and user activity.
+
+Raw APIUsage and UserActivity rows are aggregated into per-hour buckets
+(per endpoint and method, or per activity type), plus HyperLogLog sketches
+of the distinct users behind them, and each day's buckets are combined into
+a daily bucket. The rollup_analytics command, run every few minutes,
+aggregates the hours completed since a watermark and moves the watermark
+forward; reaggregate_analytics_rollups recomputes older ranges.
+
+Dashboards read rollups for everything before the watermark and aggregate
+only the raw rows after it, so their cost does not grow with the volume of
+raw rows.
+"""
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Count, Min, Q, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .hll import HyperLogLog
+from .latency_sketch import LatencySketch
+from .models import APIUsage, UserActivity, APIUsageRollup, ActivityRollup, ActiveUserSketch, RollupWatermark
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+# Usage records are written in batches, so an hour is only rolled up once it ended this long ago
+SETTLE_DELAY = timedelta(minutes=2)
+
+WATERMARK_NAME = 'analytics_rollups'
+
+# Raw rows behind each kind of distinct-user sketch
+USER_SOURCES = {
+    'users': UserActivity,
+    'api_callers': APIUsage,
+}
+
+# Path segments that identify an object rather than an endpoint
+ID_SEGMENT = re.compile(r'^(\d+|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|[0-9a-f]{24,})$', re.IGNORECASE)
+
+
+def normalize_endpoint(path: str) -> str:
+    """Replace object IDs in a path with :id, so rollups have one row per endpoint"""
+    return '/'.join(':id' if ID_SEGMENT.match(segment) else segment for segment in path.split('/'))
+
+
+def floor_hour(moment: datetime) -> datetime:
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(moment: datetime) -> datetime:
+    return floor_hour(moment).replace(hour=0)
+
+
+def _ceil(moment: datetime, floor, step: timedelta) -> datetime:
+    floored = floor(moment)
+    return floored if floored == moment else floored + step
+
+
+def new_bucket() -> dict:
+    return {
+        'request_count': 0,
+        'error_count': 0,
+        'latency_sum_ms': 0,
+        'latency_sketch': LatencySketch(),
+    }
+
+
+def merge_bucket(into: dict, other: dict):
+    """Add the counts of one usage bucket to another"""
+    into['request_count'] += other['request_count']
+    into['error_count'] += other['error_count']
+    into['latency_sum_ms'] += other['latency_sum_ms'] or 0
+    into['latency_sketch'].merge(other['latency_sketch'])
+
+
+def _stored(row: dict) -> dict:
+    """Usage bucket of a rollup row read with values()"""
+    row['latency_sketch'] = LatencySketch.from_bytes(row['latency_sketch'])
+    return row
+
+
+def _for_storage(bucket: dict) -> dict:
+    return {**bucket, 'latency_sketch': bucket['latency_sketch'].to_bytes()}
+
+
+def aggregate_api_usage(start: datetime, end: datetime) -> dict:
+    """
+    Aggregate raw API usage rows in [start, end) by hour, endpoint and method.
+
+    One grouped query counts the requests and errors of every distinct
+    response time, which gives the totals and the latency sketch at once.
+
+    Returns:
+        Dict mapping (hour, endpoint, method) to a usage bucket
+    """
+    rows = APIUsage.objects.filter(timestamp__gte=start, timestamp__lt=end).annotate(
+        hour=TruncHour('timestamp', tzinfo=dt_timezone.utc)
+    ).order_by().values('hour', 'endpoint', 'method', 'response_time_ms').annotate(
+        requests=Count('id'),
+        errors=Count('id', filter=Q(status_code__gte=400)),
+    )
+
+    buckets = {}
+    for row in rows:
+        key = (row['hour'], normalize_endpoint(row['endpoint']), row['method'])
+        bucket = buckets.setdefault(key, new_bucket())
+        bucket['request_count'] += row['requests']
+        bucket['error_count'] += row['errors']
+        bucket['latency_sum_ms'] += row['response_time_ms'] * row['requests']
+        bucket['latency_sketch'].add(row['response_time_ms'], row['requests'])
+    return buckets
+
+
+def aggregate_activity(start: datetime, end: datetime) -> dict:
+    """Count raw user activity in [start, end) by hour and activity type"""
+    rows = UserActivity.objects.filter(timestamp__gte=start, timestamp__lt=end).annotate(
+        hour=TruncHour('timestamp', tzinfo=dt_timezone.utc)
+    ).order_by().values('hour', 'activity_type').annotate(count=Count('id'))
+    return {(row['hour'], row['activity_type']): row['count'] for row in rows}
+
+
+def aggregate_users(kind: str, start: datetime, end: datetime) -> dict:
+    """Sketch the distinct users of one kind in [start, end) by hour"""
+    pairs = USER_SOURCES[kind].objects.filter(
+        timestamp__gte=start, timestamp__lt=end, user__isnull=False
+    ).annotate(hour=TruncHour('timestamp', tzinfo=dt_timezone.utc)).order_by().values_list('hour', 'user_id').distinct()
+    sketches = {}
+    for hour, user_id in pairs:
+        sketches.setdefault(hour, HyperLogLog()).add(user_id)
+    return sketches
+
+
+def _write_hours(start: datetime, end: datetime):
+    APIUsageRollup.objects.filter(granularity='hour', bucket_start__gte=start, bucket_start__lt=end).delete()
+    APIUsageRollup.objects.bulk_create(
+        APIUsageRollup(granularity='hour', bucket_start=hour, endpoint=endpoint, method=method, **_for_storage(bucket))
+        for (hour, endpoint, method), bucket in aggregate_api_usage(start, end).items()
+    )
+    ActivityRollup.objects.filter(granularity='hour', bucket_start__gte=start, bucket_start__lt=end).delete()
+    ActivityRollup.objects.bulk_create(
+        ActivityRollup(granularity='hour', bucket_start=hour, activity_type=activity_type, count=count)
+        for (hour, activity_type), count in aggregate_activity(start, end).items()
+    )
+    ActiveUserSketch.objects.filter(granularity='hour', bucket_start__gte=start, bucket_start__lt=end).delete()
+    ActiveUserSketch.objects.bulk_create(
+        ActiveUserSketch(granularity='hour', bucket_start=hour, kind=kind, registers=sketch.to_bytes())
+        for kind in USER_SOURCES
+        for hour, sketch in aggregate_users(kind, start, end).items()
+    )
+
+
+def _rebuild_day(day: datetime):
+    buckets = {}
+    hours = APIUsageRollup.objects.filter(granularity='hour', bucket_start__gte=day, bucket_start__lt=day + DAY)
+    for row in hours.values('endpoint', 'method', 'request_count', 'error_count', 'latency_sum_ms', 'latency_sketch'):
+        merge_bucket(buckets.setdefault((row['endpoint'], row['method']), new_bucket()), _stored(row))
+    APIUsageRollup.objects.filter(granularity='day', bucket_start=day).delete()
+    APIUsageRollup.objects.bulk_create(
+        APIUsageRollup(granularity='day', bucket_start=day, endpoint=endpoint, method=method, **_for_storage(bucket))
+        for (endpoint, method), bucket in buckets.items()
+    )
+
+    activity = ActivityRollup.objects.filter(
+        granularity='hour', bucket_start__gte=day, bucket_start__lt=day + DAY
+    ).order_by().values('activity_type').annotate(total=Sum('count'))
+    ActivityRollup.objects.filter(granularity='day', bucket_start=day).delete()
+    ActivityRollup.objects.bulk_create(
+        ActivityRollup(granularity='day', bucket_start=day, activity_type=row['activity_type'], count=row['total'])
+        for row in activity
+    )
+
+    day_sketches = {}
+    hour_sketches = ActiveUserSketch.objects.filter(granularity='hour', bucket_start__gte=day, bucket_start__lt=day + DAY)
+    for kind, registers in hour_sketches.values_list('kind', 'registers'):
+        day_sketches.setdefault(kind, HyperLogLog()).merge(HyperLogLog.from_bytes(registers))
+    ActiveUserSketch.objects.filter(granularity='day', bucket_start=day).delete()
+    ActiveUserSketch.objects.bulk_create(
+        ActiveUserSketch(granularity='day', bucket_start=day, kind=kind, registers=sketch.to_bytes())
+        for kind, sketch in day_sketches.items()
+    )
+
+
+def rollup_range(start: datetime, end: datetime) -> int:
+    """
+    (Re)compute the hourly rollups of [start, end), widened to whole hours,
+    and the daily rollups of every day it touches. Existing rollups in the
+    range are replaced, so this is safe to repeat.
+
+    Returns:
+        Number of days processed
+    """
+    start, end = floor_hour(start), _ceil(end, floor_hour, HOUR)
+    days = 0
+    chunk_start = start
+    while chunk_start < end:
+        # One transaction per day keeps each day's hourly and daily rollups consistent
+        chunk_end = min(floor_day(chunk_start) + DAY, end)
+        with transaction.atomic():
+            _write_hours(chunk_start, chunk_end)
+            _rebuild_day(floor_day(chunk_start))
+        days += 1
+        chunk_start = chunk_end
+    return days
+
+
+def earliest_raw_timestamp():
+    """Timestamp of the oldest raw usage or activity row, or None"""
+    candidates = [
+        APIUsage.objects.aggregate(first=Min('timestamp'))['first'],
+        UserActivity.objects.aggregate(first=Min('timestamp'))['first'],
+    ]
+    candidates = [candidate for candidate in candidates if candidate is not None]
+    return min(candidates) if candidates else None
+
+
+def get_watermark():
+    """Point in time up to which rollups are complete, or None before the first run"""
+    return RollupWatermark.objects.filter(name=WATERMARK_NAME).values_list('position', flat=True).first()
+
+
+def update_rollups(now: datetime = None):
+    """
+    Roll up every hour completed since the watermark and advance it.
+
+    Returns:
+        (start, end) of the range rolled up; equal when there was nothing to do
+    """
+    end = floor_hour((now or timezone.now()) - SETTLE_DELAY)
+    with transaction.atomic():
+        # Locking the watermark keeps overlapping runs from rolling up the same hours
+        watermark = RollupWatermark.objects.select_for_update().filter(name=WATERMARK_NAME).first()
+        if watermark is None:
+            earliest = earliest_raw_timestamp()
+            watermark = RollupWatermark(name=WATERMARK_NAME, position=floor_hour(earliest) if earliest else end)
+        start = watermark.position
+        if start < end:
+            rollup_range(start, end)
+            watermark.position = end
+        watermark.save()
+    return start, max(start, end)
+
+
+def _split_range(start: datetime, end: datetime):
+    """
+    Split [start, end), widened to whole hours at the start, into the
+    rollup ranges covering it and the part after the watermark.
+
+    Whole days before the watermark are read from daily rollups and the
+    remaining hours before it from hourly rollups; only the rest has to be
+    aggregated from raw data.
+
+    Returns:
+        ([(granularity, range_start, range_end), ...], raw_start)
+    """
+    watermark = get_watermark()
+    start = floor_hour(start)
+    rolled_end = min(end, watermark) if watermark else start
+    ranges = []
+    if start < rolled_end:
+        first_day, last_day = _ceil(start, floor_day, DAY), floor_day(rolled_end)
+        if first_day < last_day:
+            ranges = [('day', first_day, last_day), ('hour', start, first_day), ('hour', last_day, rolled_end)]
+        else:
+            ranges = [('hour', start, rolled_end)]
+    ranges = [(granularity, low, high) for granularity, low, high in ranges if low < high]
+    return ranges, max(start, rolled_end)
+
+
+def usage_rows(start: datetime, end: datetime) -> list:
+    """
+    API usage between start and end, to hour precision, as a list of usage
+    buckets with their bucket_start, endpoint and method.
+    """
+    ranges, raw_start = _split_range(start, end)
+    rows = []
+    for granularity, range_start, range_end in ranges:
+        rows.extend(_stored(row) for row in APIUsageRollup.objects.filter(
+            granularity=granularity, bucket_start__gte=range_start, bucket_start__lt=range_end
+        ).values('bucket_start', 'endpoint', 'method', 'request_count', 'error_count',
+                 'latency_sum_ms', 'latency_sketch'))
+
+    if raw_start < end:
+        rows.extend(
+            {'bucket_start': hour, 'endpoint': endpoint, 'method': method, **bucket}
+            for (hour, endpoint, method), bucket in aggregate_api_usage(raw_start, end).items()
+        )
+    return rows
+
+
+def distinct_users(kind: str, start: datetime, end: datetime) -> int:
+    """
+    Estimate the number of distinct users of one kind ('users' or
+    'api_callers') between start and end, to hour precision, by unioning
+    their hourly and daily sketches.
+    """
+    ranges, raw_start = _split_range(start, end)
+    union = HyperLogLog()
+    for granularity, range_start, range_end in ranges:
+        for registers in ActiveUserSketch.objects.filter(
+            granularity=granularity, kind=kind, bucket_start__gte=range_start, bucket_start__lt=range_end
+        ).values_list('registers', flat=True):
+            union.merge(HyperLogLog.from_bytes(registers))
+
+    if raw_start < end:
+        for sketch in aggregate_users(kind, raw_start, end).values():
+            union.merge(sketch)
+    return union.count()
+
+
+def group_usage(rows: list, key) -> dict:
+    """Merge usage rows by key(row)"""
+    groups = {}
+    for row in rows:
+        merge_bucket(groups.setdefault(key(row), new_bucket()), row)
+    return groups
+
+
+def total_usage(rows: list) -> dict:
+    """Merge all usage rows into one bucket"""
+    total = new_bucket()
+    for row in rows:
+        merge_bucket(total, row)
+    return total
+
+
+def average_latency(bucket: dict) -> float:
+    return bucket['latency_sum_ms'] / bucket['request_count'] if bucket['request_count'] else 0
+
+
+def latency_percentiles(bucket: dict) -> dict:
+    """p50, p95 and p99 latency of a usage bucket, from its merged sketch"""
+    sketch = bucket['latency_sketch']
+    return {name: sketch.percentile(fraction) for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))}
@@ -1,32 +1,65 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.conf import settings
 from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils import timezone
-from backend.analytics.models import UserActivity
-from backend.accounts.models import User
+from analytics.enrichment import enrich_activity
+from analytics.metrics import get_metrics
+from analytics.models import UserActivity
+from analytics.usage_writer import get_activity_writer
 
 @receiver(user_logged_in)
 def user_logged_in_handler(sender, request, user, **kwargs):
     """Track user login activities."""
-    UserActivity.objects.create(
-        user=user,
-        activity_type='login',
-        ip_address=get_client_ip(request),
-        user_agent=request.META.get('HTTP_USER_AGENT', ''),
-        timestamp=timezone.now()
-    )
+    record_activity(request, user, 'login')
+    get_metrics().incr('logins')
+    get_metrics().add_user('active_users', user.pk)
 
 @receiver(user_logged_out)
 def user_logged_out_handler(sender, request, user, **kwargs):
     """Track user logout activities."""
     if user:  # User could be None if session expired
-        UserActivity.objects.create(
-            user=user,
-            activity_type='logout',
-            ip_address=get_client_ip(request),
-            user_agent=request.META.get('HTTP_USER_AGENT', ''),
-            timestamp=timezone.now()
-        )
+        record_activity(request, user, 'logout')
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_created_handler(sender, instance, created, **kwargs):
+    """Keep the real-time user count current."""
+    if created:
+        get_metrics().gauge_add('users', 1)
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted_handler(sender, instance, **kwargs):
+    get_metrics().gauge_add('users', -1)
+
+@receiver(post_save, sender='documents.Document')
+def document_created_handler(sender, instance, created, **kwargs):
+    """Keep the real-time document count current."""
+    if created:
+        get_metrics().gauge_add('documents', 1)
+
+@receiver(post_delete, sender='documents.Document')
+def document_deleted_handler(sender, instance, **kwargs):
+    get_metrics().gauge_add('documents', -1)
+
+def record_activity(request, user, activity_type):
+    """
+    Record a user activity. The record is queued for the background writer,
+    which normalizes the IP address and parses the user agent before saving,
+    so the request never waits for the analytics write.
+    """
+    activity = UserActivity(
+        user_id=user.pk,
+        activity_type=activity_type,
+        # Raw values; enrich_activity normalizes them
+        ip_address=get_client_ip(request) if request is not None else None,
+        user_agent=request.META.get('HTTP_USER_AGENT', '') if request is not None else '',
+        timestamp=timezone.now()
+    )
+    if getattr(settings, 'ANALYTICS_ACTIVITY_ASYNC', True):
+        get_activity_writer().submit(activity)
+    else:
+        enrich_activity([activity])
+        activity.save()
 
 def get_client_ip(request):
     """Get the client IP address from the request."""
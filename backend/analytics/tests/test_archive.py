@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from analytics.columnar import PYARROW_AVAILABLE
+from analytics.models import APIUsage, APIUsageRollup, RollupWatermark
+from analytics.partitions import month_start, add_months, partition_name
+from analytics.rollups import rollup_range
+
+if PYARROW_AVAILABLE:
+    import pyarrow.parquet as pq
+
+
+class PartitionHelperTests(SimpleTestCase):
+
+    def test_month_arithmetic_and_names(self):
+        month = month_start(datetime(2026, 11, 17, 8, tzinfo=dt_timezone.utc))
+        self.assertEqual(month, datetime(2026, 11, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(add_months(month, 2), datetime(2027, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(add_months(month, -11), datetime(2025, 12, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(partition_name('analytics_apiusage', month), 'analytics_apiusage_2026_11')
+
+
+class ArchiveCommandTests(TestCase):
+
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir, ignore_errors=True)
+        now = timezone.now()
+        self.old = APIUsage.objects.create(
+            endpoint='/api/cases/', method='GET', status_code=200, response_time_ms=12,
+            timestamp=add_months(month_start(now), -3) + timedelta(days=2)
+        )
+        self.recent = APIUsage.objects.create(
+            endpoint='/api/cases/', method='GET', status_code=200, response_time_ms=15, timestamp=now
+        )
+        RollupWatermark.objects.create(name='analytics_rollups', position=now - timedelta(hours=1))
+
+    @unittest.skipIf(PYARROW_AVAILABLE, 'pyarrow is installed')
+    def test_requires_pyarrow(self):
+        with self.assertRaises(CommandError):
+            call_command('archive_analytics', archive_dir=self.archive_dir, stdout=StringIO())
+
+    @unittest.skipUnless(PYARROW_AVAILABLE, 'pyarrow is not installed')
+    def test_exports_and_removes_expired_months(self):
+        call_command('archive_analytics', months=2, archive_dir=self.archive_dir, stdout=StringIO())
+
+        self.assertEqual(list(APIUsage.objects.values_list('pk', flat=True)), [self.recent.pk])
+        path = os.path.join(self.archive_dir, 'analytics_apiusage', f'{self.old.timestamp:%Y-%m}.parquet')
+        table = pq.read_table(path)
+        self.assertEqual(table.column('id').to_pylist(), [self.old.pk])
+        self.assertEqual(table.column('response_time_ms').to_pylist(), [12])
+
+    @unittest.skipUnless(PYARROW_AVAILABLE, 'pyarrow is not installed')
+    def test_archives_rows_left_in_the_default_partition_without_overwriting(self):
+        path = os.path.join(self.archive_dir, 'analytics_apiusage', f'{self.old.timestamp:%Y-%m}.parquet')
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(b'archived partition')
+
+        # A partitioned table whose expired month was archived before this row arrived
+        with mock.patch('analytics.management.commands.archive_analytics.is_partitioned', return_value=True), \
+                mock.patch('analytics.management.commands.archive_analytics.ensure_partitions', return_value=[]), \
+                mock.patch('analytics.management.commands.archive_analytics.monthly_partitions', return_value=[]):
+            call_command('archive_analytics', months=2, archive_dir=self.archive_dir, stdout=StringIO())
+
+        self.assertEqual(list(APIUsage.objects.values_list('pk', flat=True)), [self.recent.pk])
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'archived partition')
+        table = pq.read_table(path.replace('.parquet', '.2.parquet'))
+        self.assertEqual(table.column('id').to_pylist(), [self.old.pk])
+
+    @unittest.skipUnless(PYARROW_AVAILABLE, 'pyarrow is not installed')
+    def test_reaggregating_keeps_the_rollups_of_archived_months(self):
+        rollup_range(month_start(self.old.timestamp), timezone.now() - timedelta(hours=1))
+        call_command('archive_analytics', months=2, archive_dir=self.archive_dir, stdout=StringIO())
+
+        call_command(
+            'reaggregate_analytics_rollups', start=f'{month_start(self.old.timestamp):%Y-%m-%d}', stdout=StringIO()
+        )
+
+        day = APIUsageRollup.objects.get(granularity='day', bucket_start__lt=month_start(self.recent.timestamp))
+        self.assertEqual((day.bucket_start.date(), day.request_count), (self.old.timestamp.date(), 1))
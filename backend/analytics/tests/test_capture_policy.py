@@ -0,0 +1,72 @@
+import json
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from analytics.capture_policy import CapturePolicy
+
+BODY = json.dumps({'name': 'Rudo', 'password': 'hunter2', 'address': {'city': 'Harare'}})
+
+
+class CapturePolicyTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.policy = CapturePolicy({
+            'SAMPLE_RATE': 1.0,
+            'MAX_BYTES': 1024,
+            'ENDPOINTS': [
+                {'pattern': r'^/api/auth/', 'sample_rate': 0},
+                {'pattern': r'^/api/clients/', 'keys_only': False},
+                {'pattern': r'^/api/hot/', 'sample_rate': 0.25},
+            ],
+        })
+
+    def post(self, path, body=BODY, content_type='application/json'):
+        return self.factory.post(path, body, content_type=content_type)
+
+    def test_skips_requests_without_reading_their_body(self):
+        self.assertIsNone(self.policy.rule_for_request(self.factory.get('/api/cases/')))
+        self.assertIsNone(self.policy.rule_for_request(self.post('/api/cases/', content_type='text/plain')))
+        self.assertIsNone(self.policy.rule_for_request(self.post('/api/auth/login/')))
+        self.assertIsNone(self.policy.rule_for_request(self.post('/api/cases/', body=json.dumps({'text': 'x' * 2000}))))
+
+    def test_samples_hot_endpoints(self):
+        with mock.patch('analytics.capture_policy.random.random', side_effect=[0.1, 0.9]):
+            self.assertIsNotNone(self.policy.rule_for_request(self.post('/api/hot/')))
+            self.assertIsNone(self.policy.rule_for_request(self.post('/api/hot/')))
+
+    def test_captures_keys_only_by_default(self):
+        rule = self.policy.rule_for_request(self.post('/api/cases/'))
+
+        self.assertEqual(self.policy.extract(BODY.encode(), rule), {'keys': ['address', 'name', 'password']})
+
+    def test_captures_masked_values_where_configured(self):
+        rule = self.policy.rule_for_request(self.post('/api/clients/'))
+
+        data = self.policy.extract(BODY.encode(), rule)
+        self.assertEqual(data['name'], 'Rudo')
+        self.assertEqual(data['password'], '****')
+        self.assertIsNone(self.policy.extract(b'not json', rule))
+
+
+@override_settings(ANALYTICS_USAGE_ASYNC=True)
+class CaptureMiddlewareTests(TestCase):
+
+    @override_settings(ANALYTICS_CAPTURE={'SAMPLE_RATE': 0})
+    def test_unsampled_bodies_are_not_parsed(self):
+        writer = mock.Mock()
+        with mock.patch('analytics.middleware.get_usage_writer', return_value=writer), \
+                mock.patch('analytics.capture_policy.json.loads') as loads:
+            self.client.post('/api/cases/', BODY, content_type='application/json')
+
+        loads.assert_not_called()
+        self.assertIsNone(writer.submit.call_args[0][0].request_data)
+
+    @override_settings(ANALYTICS_CAPTURE={'SAMPLE_RATE': 1.0})
+    def test_sampled_bodies_are_stored_as_keys(self):
+        writer = mock.Mock()
+        with mock.patch('analytics.middleware.get_usage_writer', return_value=writer):
+            self.client.post('/api/cases/', BODY, content_type='application/json')
+
+        self.assertEqual(writer.submit.call_args[0][0].request_data, {'keys': ['address', 'name', 'password']})
@@ -1,8 +1,8 @@
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
-from django.utils.six import StringIO # For Python 2/3 compatibility, or use io.StringIO for Python 3+
-# from io import StringIO # Preferred for Python 3
-from backend.analytics.models import GoogleApiUsageMetric # Adjust import
+from io import StringIO
+from analytics.models import GoogleApiUsageMetric
 import datetime
 
 class FetchGoogleApiMetricsCommandTests(TestCase):
@@ -87,11 +87,39 @@ class FetchGoogleApiMetricsCommandTests(TestCase):
         self.assertEqual(output.count("Successfully created metric:"), 4)
         self.assertEqual(output.count("Successfully updated metric:"), 0)
 
-    # (Conceptual) If the command had date arguments:
-    # def test_command_with_date_arguments(self):
-    #     out = StringIO()
-    #     # Assuming the command is modified to accept --start-date and --end-date
-    #     # call_command('fetch_google_api_metrics', '--start-date=YYYY-MM-DD', '--end-date=YYYY-MM-DD', stdout=out)
-    #     # Then assert based on those dates.
-    #     # For now, this is a placeholder as the current command doesn't take args.
-    #     pass
+    def test_command_backfills_date_range_in_chunks(self):
+        GoogleApiUsageMetric.objects.create(
+            metric_date=datetime.date(2024, 1, 10),
+            service_name='Vertex AI API',
+            metric_name='billing/cost',
+            unit='USD',
+            cost=1
+        )
+        out = StringIO()
+        # Per chunk of 4 metrics: the existing keys, the upsert, and the chunk's savepoint and release
+        with self.assertNumQueries(4 * 5):
+            call_command(
+                'fetch_google_api_metrics', '--start-date=2024-01-01', '--end-date=2024-01-10',
+                '--batch-size=4', stdout=out
+            )
+
+        self.assertEqual(GoogleApiUsageMetric.objects.count(), 20)
+        self.assertEqual(
+            set(GoogleApiUsageMetric.objects.values_list('metric_date', flat=True)),
+            {datetime.date(2024, 1, day) for day in range(1, 11)}
+        )
+        self.assertNotEqual(
+            GoogleApiUsageMetric.objects.get(metric_date=datetime.date(2024, 1, 10), unit='USD').cost, 1
+        )
+        self.assertIn("19 metrics created, 1 updated from 2024-01-01 to 2024-01-10.", out.getvalue())
+
+    def test_command_rejects_reversed_date_range(self):
+        with self.assertRaises(CommandError):
+            call_command(
+                'fetch_google_api_metrics', '--start-date=2024-01-10', '--end-date=2024-01-01', stdout=StringIO()
+            )
+
+    def test_command_rejects_batch_size_below_one(self):
+        with self.assertRaises(CommandError):
+            call_command('fetch_google_api_metrics', '--batch-size=0', stdout=StringIO())
+        self.assertFalse(GoogleApiUsageMetric.objects.exists())
@@ -0,0 +1,69 @@
+from unittest import mock
+
+from django.contrib.auth.signals import user_logged_in
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from accounts.models import User
+from analytics.enrichment import normalize_ip, parse_user_agent
+from analytics.models import UserActivity
+
+CHROME_WINDOWS = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/120.0.0.0 Safari/537.36'
+)
+SAFARI_IPHONE = (
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+    'Version/17.1 Mobile/15E148 Safari/604.1'
+)
+
+
+class EnrichmentTests(SimpleTestCase):
+
+    def test_normalize_ip(self):
+        self.assertEqual(normalize_ip(' 203.0.113.9, 10.0.0.1'), '203.0.113.9')
+        self.assertEqual(normalize_ip('203.0.113.9:5123'), '203.0.113.9')
+        self.assertEqual(normalize_ip('::ffff:198.51.100.7'), '198.51.100.7')
+        self.assertEqual(normalize_ip('[2001:DB8::1]:443'), '2001:db8::1')
+        self.assertIsNone(normalize_ip('unknown'))
+        self.assertIsNone(normalize_ip(None))
+
+    def test_parse_user_agent(self):
+        self.assertEqual(
+            parse_user_agent(CHROME_WINDOWS),
+            {'browser': 'Chrome', 'browser_version': '120.0.0.0', 'os': 'Windows', 'device': 'desktop'}
+        )
+        self.assertEqual(
+            parse_user_agent(SAFARI_IPHONE),
+            {'browser': 'Safari', 'browser_version': '17.1', 'os': 'iOS', 'device': 'mobile'}
+        )
+        self.assertEqual(parse_user_agent('curl/8.4.0')['device'], 'bot')
+
+
+class LoginActivityTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='ada@example.com', password='password', first_name='Ada', last_name='L', role='attorney'
+        )
+        self.request = RequestFactory().post(
+            '/api/auth/login/', HTTP_USER_AGENT=CHROME_WINDOWS, HTTP_X_FORWARDED_FOR='203.0.113.9:5123, 10.0.0.1'
+        )
+
+    @override_settings(ANALYTICS_ACTIVITY_ASYNC=True)
+    def test_login_queues_activity_without_writing(self):
+        writer = mock.Mock()
+        with mock.patch('analytics.signals.get_activity_writer', return_value=writer):
+            user_logged_in.send(sender=User, request=self.request, user=self.user)
+
+        activity = writer.submit.call_args[0][0]
+        self.assertEqual((activity.user_id, activity.activity_type), (self.user.pk, 'login'))
+        self.assertIsNone(activity.pk)
+        self.assertFalse(UserActivity.objects.exists())
+
+    @override_settings(ANALYTICS_ACTIVITY_ASYNC=False)
+    def test_synchronous_recording_is_enriched(self):
+        user_logged_in.send(sender=User, request=self.request, user=self.user)
+
+        activity = UserActivity.objects.get()
+        self.assertEqual(activity.ip_address, '203.0.113.9')
+        self.assertEqual(activity.details['client']['browser'], 'Chrome')
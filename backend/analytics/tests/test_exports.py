@@ -0,0 +1,84 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date, datetime, timezone as dt_timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from analytics.columnar import PYARROW_AVAILABLE, queryset_batches
+from analytics.exports import dataset_queryset
+from analytics.models import APIUsage, UserActivity
+
+if PYARROW_AVAILABLE:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='password', first_name='Ada', last_name='Admin', role='admin',
+            is_staff=True
+        )
+        for day in (1, 2, 3):
+            APIUsage.objects.create(
+                endpoint=f'/api/cases/{day}/', method='GET', status_code=200, response_time_ms=day * 10,
+                timestamp=datetime(2026, 5, day, 23, 30, tzinfo=dt_timezone.utc), request_data={'keys': ['q']}
+            )
+        UserActivity.objects.create(
+            user=self.admin, activity_type='login', timestamp=datetime(2026, 5, 2, tzinfo=dt_timezone.utc)
+        )
+
+    def test_keyset_batches_cover_the_date_range(self):
+        queryset = dataset_queryset('api_usage', date(2026, 5, 2), date(2026, 5, 3))
+        batches = list(queryset_batches(queryset, batch_size=1))
+        self.assertEqual([len(batch) for batch in batches], [1, 1])
+        self.assertEqual(sorted(row[2] for batch in batches for row in batch), ['/api/cases/2/', '/api/cases/3/'])
+
+    @unittest.skipUnless(PYARROW_AVAILABLE, 'pyarrow is not installed')
+    def test_command_writes_parquet_files(self):
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir, ignore_errors=True)
+
+        call_command(
+            'export_analytics', dataset=['api_usage', 'user_activity'], start='2026-05-02',
+            output_dir=output_dir, batch_size=1, stdout=StringIO()
+        )
+
+        usage = pq.read_table(os.path.join(output_dir, 'api_usage_2026-05-02_now.parquet'))
+        self.assertEqual(usage.column('response_time_ms').to_pylist(), [20, 30])
+        self.assertEqual(usage.column('request_data').to_pylist(), ['{"keys": ["q"]}'] * 2)
+        self.assertEqual(usage.schema.field('timestamp').type, pa.timestamp('us', tz='UTC'))
+        activity = pq.read_table(os.path.join(output_dir, 'user_activity_2026-05-02_now.parquet'))
+        self.assertEqual(activity.column('user_id').to_pylist(), [self.admin.pk])
+
+    @unittest.skipUnless(PYARROW_AVAILABLE, 'pyarrow is not installed')
+    def test_endpoint_streams_arrow_ipc(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        response = client.get('/api/analytics/export/api_usage/', {'file_format': 'arrow', 'end_date': '2026-05-02'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/vnd.apache.arrow.stream')
+        table = pa.ipc.open_stream(io.BytesIO(b''.join(response.streaming_content))).read_all()
+        self.assertEqual(table.column('endpoint').to_pylist(), ['/api/cases/1/', '/api/cases/2/'])
+
+    def test_endpoint_requires_admin_and_known_dataset(self):
+        client = APIClient()
+        user = User.objects.create_user(
+            email='user@example.com', password='password', first_name='U', last_name='Ser', role='attorney'
+        )
+        client.force_authenticate(user)
+        self.assertEqual(client.get('/api/analytics/export/api_usage/').status_code, 403)
+
+        client.force_authenticate(self.admin)
+        self.assertEqual(client.get('/api/analytics/export/users/').status_code, 404)
+        self.assertEqual(client.get('/api/analytics/export/invoices/', {'file_format': 'csv'}).status_code, 400)
@@ -0,0 +1,26 @@
+from django.test import SimpleTestCase
+
+from analytics.hll import HyperLogLog, REGISTERS
+
+
+class HyperLogLogTests(SimpleTestCase):
+
+    def test_small_counts_are_exact_enough(self):
+        sketch = HyperLogLog()
+        sketch.update(range(50))
+        sketch.update(range(50))
+        self.assertEqual(sketch.count(), 50)
+        self.assertEqual(HyperLogLog().count(), 0)
+
+    def test_union_estimates_distinct_users_across_sketches(self):
+        days = [HyperLogLog() for _ in range(7)]
+        for day, sketch in enumerate(days):
+            # Overlapping sets of 20,000 users, 35,000 distinct in total
+            sketch.update(range(day * 2500, day * 2500 + 20000))
+
+        week = HyperLogLog()
+        for sketch in days:
+            week.merge(HyperLogLog.from_bytes(sketch.to_bytes()))
+
+        self.assertAlmostEqual(week.count(), 35000, delta=35000 * 0.05)
+        self.assertEqual(len(week.to_bytes()), REGISTERS)
@@ -0,0 +1,40 @@
+import random
+
+from django.test import SimpleTestCase
+
+from analytics.latency_sketch import LatencySketch, bucket_index, bucket_bounds, SUB_BUCKETS
+
+
+class LatencySketchTests(SimpleTestCase):
+
+    def test_buckets_cover_values_with_bounded_relative_error(self):
+        previous = -1
+        for value in list(range(0, 5000)) + [10 ** 6, 10 ** 9]:
+            index = bucket_index(value)
+            low, high = bucket_bounds(index)
+            self.assertTrue(low <= value <= high)
+            self.assertLessEqual(high - low, max(low // SUB_BUCKETS, 0))
+            self.assertGreaterEqual(index, previous)
+            previous = index
+
+    def test_percentiles_of_merged_sketches_match_exact_percentiles(self):
+        rng = random.Random(7)
+        values = [int(rng.lognormvariate(4, 1)) for _ in range(20000)]
+        sketches = [LatencySketch() for _ in range(24)]
+        for number, value in enumerate(values):
+            sketches[number % 24].add(value)
+
+        merged = LatencySketch()
+        for sketch in sketches:
+            merged.merge(LatencySketch.from_bytes(sketch.to_bytes()))
+
+        values.sort()
+        self.assertEqual(merged.total, len(values))
+        for fraction in (0.5, 0.95, 0.99):
+            exact = values[int(fraction * len(values)) - 1]
+            self.assertAlmostEqual(merged.percentile(fraction), exact, delta=max(exact * 0.04, 1))
+
+    def test_empty_sketch(self):
+        sketch = LatencySketch.from_bytes(b'')
+        self.assertIsNone(sketch.percentile(0.5))
+        self.assertEqual(LatencySketch.from_bytes(sketch.to_bytes()).counts, {})
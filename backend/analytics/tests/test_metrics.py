@@ -0,0 +1,120 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, SimpleTestCase, override_settings
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from analytics.metrics import MetricsRegistry, get_metrics
+from analytics.views import realtime_analytics_summary
+from accounts.models import User
+
+
+class MetricsRegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.now = 1_700_000_000.0
+
+    def test_counters_are_summed_over_the_window(self):
+        metrics = MetricsRegistry()
+        metrics.incr('api_requests', now=self.now - 600)
+        metrics.incr('api_requests', 2, now=self.now - 120)
+        metrics.incr('api_requests', 3, now=self.now)
+
+        self.assertEqual(metrics.counter('api_requests', 1, now=self.now), 3)
+        self.assertEqual(metrics.counter('api_requests', 5, now=self.now), 5)
+        self.assertEqual(metrics.counter('api_requests', 15, now=self.now), 6)
+        self.assertEqual(metrics.counter('api_errors', 15, now=self.now), 0)
+
+    def test_workers_are_aggregated_through_the_cache(self):
+        # Two registries stand for two worker processes sharing the cache
+        first, second = MetricsRegistry(), MetricsRegistry()
+        first.incr('api_requests', 4, now=self.now)
+        second.incr('api_requests', 6, now=self.now)
+        first.add_user('active_users', 1, now=self.now)
+        first.add_user('active_users', 2, now=self.now)
+        second.add_user('active_users', 2, now=self.now)
+        second.add_user('active_users', 3, now=self.now - 3600)
+        first.flush(now=self.now)
+        second.flush(now=self.now)
+
+        self.assertEqual(first.counter('api_requests', 1, now=self.now), 10)
+        self.assertEqual(second.distinct_users('active_users', 1, now=self.now), 2)
+        self.assertEqual(second.distinct_users('active_users', 2, now=self.now), 3)
+
+    def test_lost_sketch_update_is_restored_by_the_next_flush(self):
+        metrics = MetricsRegistry()
+        metrics.add_user('active_users', 1, now=self.now)
+        metrics.flush(now=self.now)
+        # Another worker overwrites the cached sketch without the first user
+        other = MetricsRegistry()
+        other.add_user('active_users', 2, now=self.now)
+        cache.delete(f'analytics:metrics:users:active_users:{int(self.now // 3600)}')
+        other.flush(now=self.now)
+        self.assertEqual(other.distinct_users('active_users', 1, now=self.now), 1)
+
+        metrics.add_user('active_users', 3, now=self.now)
+        metrics.flush(now=self.now)
+        self.assertEqual(metrics.distinct_users('active_users', 1, now=self.now), 3)
+
+    def test_gauge_is_seeded_once_then_moved(self):
+        metrics = MetricsRegistry()
+        metrics.gauge_add('users', 1)
+        self.assertEqual(metrics.gauge('users', lambda: 10), 10)
+        metrics.gauge_add('users', 1)
+        metrics.gauge_add('users', -3)
+        self.assertEqual(metrics.gauge('users', lambda: 0), 8)
+
+    def test_updates_are_buffered_until_the_flush_interval(self):
+        metrics = MetricsRegistry(flush_interval_ms=60_000)
+        metrics.incr('api_requests', now=self.now)
+        self.assertIsNone(cache.get(f'analytics:metrics:counter:api_requests:{int(self.now // 60)}'))
+        metrics.flush()
+        self.assertEqual(cache.get(f'analytics:metrics:counter:api_requests:{int(self.now // 60)}'), 1)
+
+
+@override_settings(ANALYTICS_USAGE_ASYNC=False)
+class RealtimeSummaryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        # A fresh registry, so users seen by earlier tests are not flushed again
+        patcher = mock.patch('analytics.metrics._registry', MetricsRegistry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.admin = User.objects.create_user(
+            email='admin@example.com', password='password', first_name='Ada', last_name='Admin', role='admin',
+            is_staff=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def test_summary_is_served_without_database_queries(self):
+        # Fed by the usage middleware
+        self.client.get('/api/analytics/summary/')
+        get_metrics().gauge('users', User.objects.count)
+        get_metrics().gauge('documents', lambda: 0)
+        User.objects.create_user(
+            email='new@example.com', password='password', first_name='N', last_name='Ew', role='client'
+        )
+
+        # Called directly, since the usage middleware itself writes the request
+        request = APIRequestFactory().get('/api/analytics/realtime-summary/')
+        force_authenticate(request, user=self.admin)
+        with self.assertNumQueries(0):
+            response = realtime_analytics_summary(request)
+
+        self.assertEqual(response.status_code, 200)
+        cards = {card['name']: card['value'] for card in response.data}
+        self.assertEqual(cards['Total Users'], '2')
+        self.assertEqual(cards['Active Users (1h)'], '1')
+        self.assertEqual(cards['Requests (5m)'], '1')
+        self.assertEqual(cards['Documents Processed'], '0')
+
+    def test_requires_admin(self):
+        user = User.objects.create_user(
+            email='user@example.com', password='password', first_name='U', last_name='Ser', role='attorney'
+        )
+        self.client.force_authenticate(user=user)
+        response = self.client.get('/api/analytics/realtime-summary/')
+        self.assertEqual(response.status_code, 403)
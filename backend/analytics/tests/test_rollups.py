@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from analytics.models import APIUsage, UserActivity, APIUsageRollup, ActivityRollup, RollupWatermark
+from analytics.latency_sketch import LatencySketch, bucket_index
+from analytics.rollups import (
+    normalize_endpoint, update_rollups, rollup_range, usage_rows, total_usage,
+    group_usage, get_watermark, distinct_users,
+)
+
+DAY_ONE = datetime(2026, 3, 1, tzinfo=dt_timezone.utc)
+
+
+class NormalizeEndpointTests(SimpleTestCase):
+
+    def test_replaces_numeric_and_uuid_segments(self):
+        self.assertEqual(normalize_endpoint('/api/documents/42/file/'), '/api/documents/:id/file/')
+        self.assertEqual(
+            normalize_endpoint('/api/cases/0b5e8f0a-3c1d-4e2f-9a7b-1c2d3e4f5a6b/'), '/api/cases/:id/'
+        )
+        self.assertEqual(normalize_endpoint('/api/analytics/summary/'), '/api/analytics/summary/')
+
+
+class RollupTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='admin@example.com', password='password', first_name='Ada', last_name='Admin', role='admin'
+        )
+
+    def usage(self, at, endpoint='/api/documents/', status=200, latency=20, method='GET'):
+        return APIUsage.objects.create(
+            endpoint=endpoint, method=method, status_code=status, response_time_ms=latency, timestamp=at
+        )
+
+    def test_hourly_and_daily_buckets(self):
+        self.usage(DAY_ONE + timedelta(minutes=5), endpoint='/api/documents/1/', latency=5)
+        self.usage(DAY_ONE + timedelta(minutes=50), endpoint='/api/documents/2/', status=404, latency=300)
+        self.usage(DAY_ONE + timedelta(hours=3), endpoint='/api/documents/3/', latency=20000)
+        UserActivity.objects.create(user=self.user, activity_type='login', timestamp=DAY_ONE + timedelta(hours=1))
+
+        update_rollups(now=DAY_ONE + timedelta(days=1, minutes=10))
+
+        hours = APIUsageRollup.objects.filter(granularity='hour').order_by('bucket_start')
+        self.assertEqual([row.request_count for row in hours], [2, 1])
+        first = hours[0]
+        self.assertEqual(first.endpoint, '/api/documents/:id/')
+        self.assertEqual(first.error_count, 1)
+        self.assertEqual(first.latency_sum_ms, 305)
+        self.assertEqual(LatencySketch.from_bytes(first.latency_sketch).counts, {5: 1, bucket_index(300): 1})
+
+        day = APIUsageRollup.objects.get(granularity='day')
+        self.assertEqual((day.bucket_start, day.request_count, day.error_count), (DAY_ONE, 3, 1))
+        self.assertEqual(LatencySketch.from_bytes(day.latency_sketch).total, 3)
+        self.assertEqual(ActivityRollup.objects.get(granularity='day').count, 1)
+        self.assertEqual(get_watermark(), DAY_ONE + timedelta(days=1))
+
+    def test_incremental_runs_only_roll_up_completed_hours(self):
+        self.usage(DAY_ONE + timedelta(minutes=10))
+        update_rollups(now=DAY_ONE + timedelta(hours=1, minutes=1))
+        # The hour has ended, but not long enough ago for batched writes to have landed
+        self.assertFalse(APIUsageRollup.objects.exists())
+
+        update_rollups(now=DAY_ONE + timedelta(hours=1, minutes=5))
+        self.usage(DAY_ONE + timedelta(hours=1, minutes=10))
+        update_rollups(now=DAY_ONE + timedelta(hours=2, minutes=5))
+
+        hours = APIUsageRollup.objects.filter(granularity='hour')
+        self.assertEqual(hours.count(), 2)
+        self.assertEqual(APIUsageRollup.objects.get(granularity='day').request_count, 2)
+
+    def test_reads_merge_rollups_with_raw_rows_after_the_watermark(self):
+        for day in range(3):
+            self.usage(DAY_ONE + timedelta(days=day, hours=12), latency=100)
+        update_rollups(now=DAY_ONE + timedelta(days=2, hours=1))
+        self.usage(DAY_ONE + timedelta(days=2, hours=13), latency=300)
+
+        rows = usage_rows(DAY_ONE, DAY_ONE + timedelta(days=3))
+        total = total_usage(rows)
+        self.assertEqual(total['request_count'], 4)
+        self.assertEqual(total['latency_sum_ms'], 600)
+
+        by_day = group_usage(rows, lambda row: row['bucket_start'].date())
+        self.assertEqual([bucket['request_count'] for _, bucket in sorted(by_day.items())], [1, 1, 2])
+
+    def test_distinct_users_union_hourly_daily_and_raw(self):
+        other = User.objects.create_user(
+            email='bob@example.com', password='password', first_name='Bob', last_name='B', role='attorney'
+        )
+        for day in range(3):
+            UserActivity.objects.create(
+                user=self.user, activity_type='login', timestamp=DAY_ONE + timedelta(days=day, hours=9)
+            )
+        UserActivity.objects.create(user=other, activity_type='login', timestamp=DAY_ONE + timedelta(days=1, hours=10))
+        APIUsage.objects.create(
+            user=other, endpoint='/api/cases/', method='GET', status_code=200, response_time_ms=30,
+            timestamp=DAY_ONE + timedelta(hours=4)
+        )
+        update_rollups(now=DAY_ONE + timedelta(days=2, hours=1))
+        # After the watermark, so read from the raw rows
+        UserActivity.objects.create(user=other, activity_type='login', timestamp=DAY_ONE + timedelta(days=2, hours=5))
+
+        self.assertEqual(distinct_users('users', DAY_ONE, DAY_ONE + timedelta(days=3)), 2)
+        self.assertEqual(distinct_users('users', DAY_ONE, DAY_ONE + timedelta(days=1)), 1)
+        self.assertEqual(distinct_users('users', DAY_ONE + timedelta(days=2), DAY_ONE + timedelta(days=3)), 2)
+        self.assertEqual(distinct_users('api_callers', DAY_ONE, DAY_ONE + timedelta(days=3)), 1)
+
+    def test_reaggregation_picks_up_late_rows(self):
+        self.usage(DAY_ONE + timedelta(hours=2))
+        update_rollups(now=DAY_ONE + timedelta(days=1))
+        self.usage(DAY_ONE + timedelta(hours=2, minutes=30))
+
+        rollup_range(DAY_ONE, DAY_ONE + timedelta(days=1))
+        self.assertEqual(APIUsageRollup.objects.get(granularity='day').request_count, 2)
+        self.assertEqual(APIUsageRollup.objects.get(granularity='hour').request_count, 2)
+
+    def test_reaggregate_command(self):
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('reaggregate_analytics_rollups', stdout=out)
+
+        self.usage(DAY_ONE + timedelta(hours=2))
+        RollupWatermark.objects.create(name='analytics_rollups', position=DAY_ONE + timedelta(days=1))
+        call_command('reaggregate_analytics_rollups', start='2026-03-01', end='2026-03-01', stdout=out)
+        self.assertEqual(APIUsageRollup.objects.get(granularity='day').request_count, 1)
+
+    def test_admin_api_usage_reads_rollups(self):
+        today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.usage(today - timedelta(days=1, hours=-1), endpoint='/api/cases/7/', latency=40)
+        self.usage(today - timedelta(days=1, hours=-2), endpoint='/api/cases/8/', latency=60)
+        update_rollups()
+        self.user.is_staff = True
+        self.user.save()
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get('/api/analytics/api-usage/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], 2)
+        self.assertEqual(response.data['topEndpoints'][0], {
+            'endpoint': '/api/cases/:id/', 'count': 2, 'avg_response_time': 50, 'p50': 40, 'p95': 60, 'p99': 60
+        })
+        self.assertEqual(response.data['latency'], {'p50': 40, 'p95': 60, 'p99': 60})
+        self.assertEqual(response.data['usageByDay'][0]['date'], (today - timedelta(days=1)).date())
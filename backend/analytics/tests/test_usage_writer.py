@@ -0,0 +1,97 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from analytics.models import APIUsage
+from analytics.usage_writer import UsageBatchWriter
+
+
+class FakeManager:
+    def __init__(self, gate=None):
+        self.batches = []
+        self.gate = gate
+
+    def bulk_create(self, batch):
+        if self.gate:
+            self.gate.wait(5)
+        self.batches.append(list(batch))
+
+
+class FakeModel:
+    def __init__(self, gate=None):
+        self.objects = FakeManager(gate)
+
+
+class UsageBatchWriterTests(SimpleTestCase):
+
+    def test_writes_full_batches_and_flushes_on_close(self):
+        model = FakeModel()
+        writer = UsageBatchWriter(model, batch_size=3, flush_interval_ms=60_000)
+
+        for number in range(7):
+            self.assertTrue(writer.submit(number))
+        writer.close()
+
+        self.assertEqual(sorted(len(batch) for batch in model.objects.batches), [1, 3, 3])
+        self.assertEqual(sorted(sum(model.objects.batches, [])), list(range(7)))
+        self.assertEqual(writer.stats()['written'], 7)
+
+    def test_flushes_partial_batches_after_the_interval(self):
+        model = FakeModel()
+        writer = UsageBatchWriter(model, batch_size=100, flush_interval_ms=20)
+
+        writer.submit('a')
+        writer.submit('b')
+        deadline = time.monotonic() + 2
+        while not model.objects.batches and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(model.objects.batches, [['a', 'b']])
+        writer.close()
+
+    def test_drops_and_counts_records_when_the_queue_is_full(self):
+        gate = threading.Event()
+        model = FakeModel(gate)
+        writer = UsageBatchWriter(model, batch_size=1, flush_interval_ms=1, max_queue_size=2, enqueue_timeout_ms=1)
+
+        with self.assertLogs('analytics.usage_writer', level='WARNING'):
+            results = [writer.submit(number) for number in range(10)]
+        gate.set()
+        writer.close()
+
+        self.assertIn(False, results)
+        stats = writer.stats()
+        self.assertEqual(stats['dropped'], results.count(False))
+        self.assertEqual(stats['written'] + stats['dropped'], 10)
+
+    def test_prepares_batches_in_the_writer_thread(self):
+        model = FakeModel()
+        threads = []
+        writer = UsageBatchWriter(
+            model, batch_size=2, flush_interval_ms=60_000,
+            prepare=lambda batch: threads.append(threading.current_thread().name)
+        )
+
+        writer.submit('a')
+        writer.submit('b')
+        writer.close()
+
+        self.assertEqual(threads, ['api-usage-writer'])
+
+
+class APIUsageMiddlewareTests(TestCase):
+
+    @override_settings(ANALYTICS_USAGE_ASYNC=True)
+    def test_requests_queue_usage_instead_of_inserting(self):
+        writer = mock.Mock()
+        with mock.patch('analytics.middleware.get_usage_writer', return_value=writer):
+            self.client.get('/api/documents/')
+
+        writer.submit.assert_called_once()
+        usage = writer.submit.call_args[0][0]
+        self.assertIsInstance(usage, APIUsage)
+        self.assertEqual(usage.endpoint, '/api/documents/')
+        self.assertIsNone(usage.pk)
+        self.assertFalse(APIUsage.objects.exists())
@@ -10,12 +10,14 @@ urlpatterns = [
     path('billing/', views.analytics_billing, name='analytics-billing'),
     path('summary/', views.analytics_summary, name='analytics-summary'),
     path('admin-summary/', views.admin_analytics_summary, name='admin-analytics-summary'),
+    path('realtime-summary/', views.realtime_analytics_summary, name='analytics-realtime-summary'),
     path('user-signups/', views.user_signups, name='analytics-user-signups'),
     path('admin-user-signups/', views.admin_user_signups, name='admin-analytics-user-signups'),
     path('api-usage/', views.api_usage, name='analytics-api-usage'),
     path('admin-api-usage/', views.admin_api_usage, name='admin-analytics-api-usage'),
     path('case-distribution/', views.case_distribution, name='analytics-case-distribution'),
     path('admin-case-distribution/', views.admin_case_distribution, name='admin-analytics-case-distribution'),
+    path('export/<str:dataset>/', views.export_analytics_dataset, name='analytics-export'),
     
     # Keep mock endpoints as fallbacks with different URLs
     path('mock/stats/', mock_views.mock_analytics_stats, name='mock-analytics-stats'),
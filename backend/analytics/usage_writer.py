@@ -0,0 +1,192 @@
+"""
+Buffered writers for analytics records: API usage and user activity.
+
+Requests hand their APIUsage or UserActivity record to an in-process bounded
+queue instead of inserting it themselves. A background thread prepares each
+batch (e.g. enriches activity records) and writes it out with bulk_create
+whenever a batch fills up or the flush interval passes. When the queue is
+full, a request waits at most a few milliseconds for space and the record is
+then dropped and counted, so a slow database never stalls the API. Pending
+records are flushed when the process exits.
+"""
+import os
+import queue
+import atexit
+import logging
+import threading
+from time import monotonic
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from analytics.enrichment import enrich_activity
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class UsageBatchWriter:
+    """
+    Background batch writer for instances of a model.
+
+    Args:
+        model: Model whose unsaved instances are submitted
+        batch_size: Records written per bulk_create
+        flush_interval_ms: Longest time a record waits in the queue before being written
+        max_queue_size: Records buffered before new ones are dropped
+        enqueue_timeout_ms: How long submit() waits for space in a full queue
+        prepare: Called with each batch in the writer thread before it is written
+        name: Name of the records in thread names and log messages
+    """
+
+    def __init__(self, model, batch_size=200, flush_interval_ms=1000, max_queue_size=10000, enqueue_timeout_ms=5,
+                 prepare=None, name='api-usage'):
+        self.model = model
+        self.prepare = prepare
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_queue_size = max_queue_size
+        self.enqueue_timeout = enqueue_timeout_ms / 1000
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+
+    def _ensure_started(self):
+        # Started lazily, and again in a forked worker process, which does not inherit threads
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_queue_size)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=f'{self.name}-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, record) -> bool:
+        """Queue an unsaved record for writing. Returns False if it was dropped."""
+        self._ensure_started()
+        try:
+            self._queue.put(record, timeout=self.enqueue_timeout)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                dropped = self.dropped
+            # Log the first drop and then every thousandth, not every request
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning(f"{self.name} queue is full; {dropped} records dropped so far")
+            return False
+
+    def _run(self):
+        batch_queue = self._queue
+        stopping = False
+        while not stopping:
+            record = batch_queue.get()
+            if record is _STOP:
+                break
+            batch = [record]
+            deadline = monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    record = batch_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+            self._write(batch)
+
+        # Write whatever was queued before the stop request
+        remaining_records = []
+        while True:
+            try:
+                record = batch_queue.get_nowait()
+            except queue.Empty:
+                break
+            if record is not _STOP:
+                remaining_records.append(record)
+        for start in range(0, len(remaining_records), self.batch_size):
+            self._write(remaining_records[start:start + self.batch_size])
+
+    def _write(self, batch):
+        try:
+            close_old_connections()
+            if self.prepare:
+                self.prepare(batch)
+            self.model.objects.bulk_create(batch)
+            with self._lock:
+                self.written += len(batch)
+        except Exception as e:
+            with self._lock:
+                self.failed += len(batch)
+            logger.error(f"Error writing {len(batch)} {self.name} records: {e}")
+        finally:
+            # The thread mostly sleeps, so it should not hold a database connection open
+            connection.close()
+
+    def close(self, timeout=5.0):
+        """Write all queued records and stop the background thread"""
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning(f"{self.name} queue is still full at shutdown; queued records are lost")
+            return
+        self._thread.join(timeout)
+        self._thread = None
+        self._pid = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'queued': self._queue.qsize() if self._queue is not None else 0,
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+            }
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def _get_writer(name, model_name, prepare=None) -> UsageBatchWriter:
+    with _writers_lock:
+        if name not in _writers:
+            from django.apps import apps
+
+            writer = UsageBatchWriter(
+                apps.get_model('analytics', model_name),
+                batch_size=getattr(settings, 'ANALYTICS_USAGE_BATCH_SIZE', 200),
+                flush_interval_ms=getattr(settings, 'ANALYTICS_USAGE_FLUSH_INTERVAL_MS', 1000),
+                max_queue_size=getattr(settings, 'ANALYTICS_USAGE_QUEUE_SIZE', 10000),
+                enqueue_timeout_ms=getattr(settings, 'ANALYTICS_USAGE_ENQUEUE_TIMEOUT_MS', 5),
+                prepare=prepare,
+                name=name,
+            )
+            atexit.register(writer.close)
+            _writers[name] = writer
+        return _writers[name]
+
+
+def get_usage_writer() -> UsageBatchWriter:
+    """Return the process-wide writer for APIUsage records, configured from settings"""
+    return _get_writer('api-usage', 'APIUsage')
+
+
+def get_activity_writer() -> UsageBatchWriter:
+    """Return the process-wide writer for UserActivity records, which enriches them before writing"""
+    return _get_writer('user-activity', 'UserActivity', enrich_activity)
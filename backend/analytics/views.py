@@ -2,13 +2,20 @@ from django.utils import timezone
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
-from datetime import timedelta, datetime
+from rest_framework import status
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from datetime import timedelta, date, datetime, time, timezone as dt_timezone
 from django.db.models import Count, Avg, Sum, F, Q
 from rest_framework.exceptions import PermissionDenied
 from django.db.models.functions import TruncDate, TruncWeek, TruncMonth
 import random
 
 from .models import UserActivity, APIUsage, AnalyticsSummary, GoogleApiUsageMetric
+from .columnar import PYARROW_AVAILABLE, FORMATS, queryset_batches, stream_columnar
+from .exports import DATASETS, dataset_queryset, export_filename
+from .metrics import get_metrics
+from .rollups import usage_rows, distinct_users, group_usage, total_usage, average_latency, latency_percentiles
 from accounts.models import User
 from cases.models import Case
 from billing.models import TimeEntry, Invoice
@@ -41,20 +48,18 @@ def get_admin_analytics_summary(request):
     # Get total users
     total_users = User.objects.count()
     
-    # Get active users in last 24 hours
+    # Get active users in the last 24 hours, 7 days and 30 days from unioned HyperLogLog sketches
     now = timezone.now()
     yesterday = now - timedelta(hours=24)
-    active_users_24h = UserActivity.objects.filter(
-        timestamp__gte=yesterday
-    ).values('user').distinct().count()
+    active_users_24h = distinct_users('users', yesterday, now)
+    active_users_7d = distinct_users('users', now - timedelta(days=7), now)
+    active_users_30d = distinct_users('users', now - timedelta(days=30), now)
     
     # Get documents processed
     total_documents = Document.objects.count()
     
     # Get average API response time
-    avg_response_time = APIUsage.objects.filter(
-        timestamp__gte=yesterday
-    ).aggregate(avg_time=Avg('response_time_ms'))['avg_time'] or 0
+    avg_response_time = average_latency(total_usage(usage_rows(yesterday, now)))
     
     return Response([
         {
@@ -65,6 +70,14 @@ def get_admin_analytics_summary(request):
             'name': 'Active Users (24h)',
             'value': str(active_users_24h)
         },
+        {
+            'name': 'Active Users (7d)',
+            'value': str(active_users_7d)
+        },
+        {
+            'name': 'Active Users (30d)',
+            'value': str(active_users_30d)
+        },
         {
             'name': 'Documents Processed',
             'value': str(total_documents)
@@ -76,6 +89,54 @@ def get_admin_analytics_summary(request):
     ])
 
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def realtime_analytics_summary(request):
+    """
+    Return live admin summary cards from the in-memory metrics registry and
+    the shared cache; the database is only read to seed a missing gauge
+    """
+    metrics = get_metrics()
+    requests_5m = metrics.counter('api_requests', 5)
+    errors_5m = metrics.counter('api_errors', 5)
+    latency_5m = metrics.counter('api_latency_ms', 5)
+    
+    return Response([
+        {
+            'name': 'Total Users',
+            'value': str(metrics.gauge('users', User.objects.count))
+        },
+        {
+            'name': 'Active Users (1h)',
+            'value': str(metrics.distinct_users('active_users', 1))
+        },
+        {
+            'name': 'Active Users (24h)',
+            'value': str(metrics.distinct_users('active_users', 24))
+        },
+        {
+            'name': 'Documents Processed',
+            'value': str(metrics.gauge('documents', Document.objects.count))
+        },
+        {
+            'name': 'Requests (5m)',
+            'value': str(requests_5m)
+        },
+        {
+            'name': 'Error Rate (5m)',
+            'value': f"{errors_5m / requests_5m:.1%}" if requests_5m else "0.0%"
+        },
+        {
+            'name': 'Avg. API Response Time',
+            'value': f"{latency_5m // requests_5m if requests_5m else 0}ms"
+        },
+        {
+            'name': 'Logins (1h)',
+            'value': str(metrics.counter('logins', 60))
+        }
+    ])
+
+
 def get_user_analytics_summary(request):
     """Helper function to get user-specific analytics summary"""
     user = request.user
@@ -275,34 +336,44 @@ def admin_api_usage(request):
         start_dt = timezone.now().date() - timedelta(days=7)
         end_dt = timezone.now().date()
     
+    # Day boundaries are UTC; complete hours and days are read from the rollup tables
+    range_start = datetime.combine(start_dt, time.min, tzinfo=dt_timezone.utc)
+    range_end = datetime.combine(end_dt, time.min, tzinfo=dt_timezone.utc) + timedelta(days=1)
+    rows = usage_rows(range_start, range_end)
+    
     # Get top endpoints by usage
-    top_endpoints = APIUsage.objects.filter(
-        timestamp__date__gte=start_dt,
-        timestamp__date__lte=end_dt
-    ).values('endpoint').annotate(
-        count=Count('id'),
-        avg_response_time=Avg('response_time_ms')
-    ).order_by('-count')[:10]
+    by_endpoint = group_usage(rows, lambda row: row['endpoint'])
+    top_endpoints = sorted((
+        {
+            'endpoint': endpoint,
+            'count': bucket['request_count'],
+            'avg_response_time': average_latency(bucket),
+            **latency_percentiles(bucket)
+        }
+        for endpoint, bucket in by_endpoint.items()
+    ), key=lambda entry: -entry['count'])[:10]
     
     # Get usage by day
-    usage_by_day = APIUsage.objects.filter(
-        timestamp__date__gte=start_dt,
-        timestamp__date__lte=end_dt
-    ).annotate(
-        date=TruncDate('timestamp')
-    ).values('date').annotate(
-        count=Count('id'),
-        avg_response_time=Avg('response_time_ms')
-    ).order_by('date')
+    by_day = group_usage(rows, lambda row: row['bucket_start'].astimezone(dt_timezone.utc).date())
+    usage_by_day = [
+        {
+            'date': date,
+            'count': bucket['request_count'],
+            'avg_response_time': average_latency(bucket),
+            **latency_percentiles(bucket)
+        }
+        for date, bucket in sorted(by_day.items())
+    ]
+    
+    # Percentiles come from merged latency sketches, never from sorting raw rows
+    total = total_usage(rows)
     
     # Format data for response
     return Response({
         'topEndpoints': top_endpoints,
         'usageByDay': usage_by_day,
-        'total': APIUsage.objects.filter(
-            timestamp__date__gte=start_dt,
-            timestamp__date__lte=end_dt
-        ).count()
+        'total': total['request_count'],
+        'latency': latency_percentiles(total)
     })
 
 def regular_api_usage(request):
@@ -323,10 +394,11 @@ def regular_api_usage(request):
     user = request.user
     
     # Get the user's API usage statistics (or generate mock data if not available)
+    # A timestamp range (rather than timestamp__date) lets PostgreSQL skip partitions outside it
     user_api_usage = APIUsage.objects.filter(
         user=user,
-        timestamp__date__gte=start_dt,
-        timestamp__date__lte=end_dt
+        timestamp__gte=datetime.combine(start_dt, time.min, tzinfo=dt_timezone.utc),
+        timestamp__lt=datetime.combine(end_dt, time.min, tzinfo=dt_timezone.utc) + timedelta(days=1)
     ).values('endpoint').annotate(
         count=Count('id')
     ).order_by('-count')[:6]
@@ -633,6 +705,34 @@ def analytics_billing(request):
         }
     })
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_analytics_dataset(request, dataset):
+    """Stream an analytics dataset as a compressed Parquet or Arrow IPC file"""
+    if dataset not in DATASETS:
+        return Response({'error': f'Unknown dataset {dataset}'}, status=status.HTTP_404_NOT_FOUND)
+    # Not "format", which DRF reserves for choosing a renderer
+    file_format = request.query_params.get('file_format', 'parquet')
+    if file_format not in FORMATS:
+        return Response({'error': f"file_format must be one of {', '.join(FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+    if not PYARROW_AVAILABLE:
+        return Response({'error': 'Columnar export is not available'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    try:
+        start = date.fromisoformat(request.query_params['start_date']) if request.query_params.get('start_date') else None
+        end = date.fromisoformat(request.query_params['end_date']) if request.query_params.get('end_date') else None
+    except ValueError:
+        return Response({'error': 'Dates must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Rows are read in keyset-paginated batches and sent as each batch is encoded
+    batches = queryset_batches(dataset_queryset(dataset, start, end))
+    response = StreamingHttpResponse(
+        stream_columnar(DATASETS[dataset][0], batches, file_format), content_type=FORMATS[file_format][1]
+    )
+    response['Content-Disposition'] = content_disposition_header(
+        True, export_filename(dataset, start, end, file_format)
+    )
+    return response
+
 from rest_framework import viewsets, permissions
 from .serializers import GoogleApiUsageMetricSerializer
 from django_filters.rest_framework import DjangoFilterBackend
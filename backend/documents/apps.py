@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+class DocumentsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'documents'
+
+    def ready(self):
+        # Import signal handlers
+        from . import signals
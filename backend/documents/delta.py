@@ -0,0 +1,141 @@
+"""
+Binary deltas between versions of a file.
+
+A delta describes a target file as a sequence of COPY instructions, taking
+a range of bytes from a base file, and INSERT instructions carrying new
+bytes. The base is indexed by fixed-size blocks; the target is scanned for
+those blocks and every match is extended as far as the files agree, so an
+edit costs roughly its own size plus one block. The encoded instructions
+are zlib-compressed.
+"""
+import struct
+import zlib
+
+# Size of the base blocks that are looked up in the target
+BLOCK_SIZE = 64
+
+MAGIC = b'DLT1'
+_HEADER = struct.Struct('>4sQ')
+_COPY = struct.Struct('>cQI')
+_INSERT = struct.Struct('>cI')
+
+# Longest run encoded in a single instruction
+_MAX_RUN = 2 ** 32 - 1
+
+
+class DeltaError(ValueError):
+    """Raised when a delta is malformed or does not apply to the given base."""
+
+
+class DeltaTooLarge(Exception):
+    """Raised when a delta would not be meaningfully smaller than the target itself."""
+
+
+def _match_length(base: memoryview, base_start: int, target: memoryview, target_start: int) -> int:
+    # Compare in large slices first, then narrow down to the first differing byte
+    length = 0
+    limit = min(len(base) - base_start, len(target) - target_start)
+    step = 4096
+    while step:
+        while length + step <= limit and \
+                base[base_start + length:base_start + length + step] == target[target_start + length:target_start + length + step]:
+            length += step
+        step //= 8
+    while length < limit and base[base_start + length] == target[target_start + length]:
+        length += 1
+    return length
+
+
+def make_delta(base: bytes, target: bytes, max_literal_bytes: int = None) -> bytes:
+    """
+    Encode target as a delta against base.
+
+    Args:
+        base: The file the delta is applied to
+        target: The file the delta reproduces
+        max_literal_bytes: Give up with DeltaTooLarge once more than this many
+            bytes would have to be inserted, which also bounds the time spent
+            on unrelated files
+
+    Returns:
+        The compressed delta
+    """
+    base_view, target_view = memoryview(base), memoryview(target)
+    blocks = {}
+    for offset in range(0, len(base) - BLOCK_SIZE + 1, BLOCK_SIZE):
+        blocks.setdefault(base[offset:offset + BLOCK_SIZE], offset)
+
+    out = [_HEADER.pack(MAGIC, len(target))]
+    literal_start = 0
+    literal_bytes = 0
+    position = 0
+    last_block_start = len(target) - BLOCK_SIZE
+
+    def flush_literal(end):
+        for start in range(literal_start, end, _MAX_RUN):
+            chunk = target[start:min(end, start + _MAX_RUN)]
+            out.append(_INSERT.pack(b'I', len(chunk)))
+            out.append(chunk)
+
+    while position <= last_block_start:
+        offset = blocks.get(target[position:position + BLOCK_SIZE])
+        if offset is None:
+            position += 1
+            if max_literal_bytes is not None and position - literal_start + literal_bytes > max_literal_bytes:
+                raise DeltaTooLarge()
+            continue
+
+        # Grow the match backwards into the pending literal, then forwards
+        start = position
+        while start > literal_start and offset > 0 and base[offset - 1] == target[start - 1]:
+            start -= 1
+            offset -= 1
+        length = _match_length(base_view, offset, target_view, start)
+
+        literal_bytes += start - literal_start
+        flush_literal(start)
+        for run_start in range(0, length, _MAX_RUN):
+            out.append(_COPY.pack(b'C', offset + run_start, min(_MAX_RUN, length - run_start)))
+        position = literal_start = start + length
+
+    literal_bytes += len(target) - literal_start
+    if max_literal_bytes is not None and literal_bytes > max_literal_bytes:
+        raise DeltaTooLarge()
+    flush_literal(len(target))
+    return zlib.compress(b''.join(out), 6)
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """Rebuild the target of a delta from its base"""
+    try:
+        data = zlib.decompress(delta)
+    except zlib.error as e:
+        raise DeltaError(f"Corrupt delta: {e}")
+    if len(data) < _HEADER.size:
+        raise DeltaError("Truncated delta")
+    magic, target_size = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise DeltaError("Not a delta")
+
+    parts = []
+    position = _HEADER.size
+    while position < len(data):
+        op = data[position:position + 1]
+        if op == b'C':
+            _, offset, length = _COPY.unpack_from(data, position)
+            position += _COPY.size
+            if offset + length > len(base):
+                raise DeltaError("Delta copies beyond the end of its base")
+            parts.append(base[offset:offset + length])
+        elif op == b'I':
+            _, length = _INSERT.unpack_from(data, position)
+            position += _INSERT.size
+            parts.append(data[position:position + length])
+            position += length
+        else:
+            raise DeltaError(f"Unknown delta instruction {op!r}")
+
+    target = b''.join(parts)
+    if len(target) != target_size:
+        raise DeltaError("Delta produced a file of the wrong size")
+    return target
@@ -0,0 +1,136 @@
+"""
+Conditional and ranged file responses for document downloads.
+
+When DOCUMENT_ACCEL_REDIRECT_PREFIX is set, the response only carries an
+X-Accel-Redirect header and nginx serves the file itself, including Range
+requests, from an internal location mapped onto MEDIA_ROOT. Otherwise the
+file is returned through FileResponse; under a WSGI server with sendfile
+support (e.g. gunicorn) the requested byte range is still sent by the
+kernel without passing through Python.
+"""
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import content_disposition_header
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header: str, size: int):
+    """
+    Parse a single-range Range header against a file size.
+
+    Returns:
+        (start, end) inclusive byte positions, None when the header should be
+        ignored (absent, malformed or multi-range) and the whole file sent,
+        or 'unsatisfiable' when no byte of the range exists
+    """
+    match = RANGE_PATTERN.match((header or '').strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return 'unsatisfiable'
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return 'unsatisfiable'
+    return start, end
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Check an If-None-Match header against an ETag"""
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+
+class RangeFile:
+    """
+    File wrapper exposing only a byte range of an open file.
+
+    Reads stop at the end of the range, while fileno() still gives servers
+    with sendfile support the underlying descriptor, positioned at the start
+    of the range.
+    """
+
+    def __init__(self, file, start: int, length: int):
+        self.file = file
+        self.remaining = length
+        self.file.seek(start)
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def serve_file(request, file_field, size: int, etag: str, content_type: str, filename: str, as_attachment=False):
+    """
+    Respond to a download request with support for If-None-Match and Range.
+
+    Args:
+        request: The incoming request
+        file_field: FieldFile of the stored file
+        size: File size in bytes
+        etag: Quoted strong ETag of the content
+        content_type: MIME type of the file
+        filename: Name offered to the client
+        as_attachment: Whether to ask the client to save rather than display the file
+    """
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    accel_prefix = getattr(settings, 'DOCUMENT_ACCEL_REDIRECT_PREFIX', '')
+    if accel_prefix:
+        # nginx answers Range and conditional requests for the internal location itself
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(accel_prefix.rstrip('/') + '/' + file_field.name)
+    else:
+        byte_range = None
+        # A Range is only honoured when If-Range (if sent) still matches the current content
+        if request.headers.get('If-Range', etag) == etag:
+            byte_range = parse_range(request.headers.get('Range'), size)
+
+        if byte_range == 'unsatisfiable':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        file = file_field.open('rb')
+        if byte_range is None:
+            response = FileResponse(file, content_type=content_type)
+            response['Content-Length'] = str(size)
+        else:
+            start, end = byte_range
+            response = FileResponse(RangeFile(file, start, end - start + 1), content_type=content_type, status=206)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    response['Content-Disposition'] = content_disposition_header(as_attachment, os.path.basename(filename))
+    return response
@@ -0,0 +1,79 @@
+"""
+Facet counts for document listings.
+
+Every facet is counted from a single query over the permission-filtered
+documents, grouped by document type, case and client. The counts of each
+facet are rolled up in Python with the selections on the other facets
+applied but not its own, so picking a document type still shows how many
+documents each of the other types has.
+"""
+from django.db.models import Count
+
+# Facet name -> field grouped and filtered on
+FACET_FIELDS = {
+    'doc_type': 'doc_type',
+    'case': 'case_id',
+    'client': 'case__client_id',
+}
+
+# List query parameter -> facet
+FACET_PARAMS = {
+    'docType': 'doc_type',
+    'caseId': 'case',
+    'clientId': 'client',
+}
+
+
+def selected_facets(query_params) -> dict:
+    """Return the facet values selected in a request's query parameters"""
+    return {facet: query_params[param] for param, facet in FACET_PARAMS.items() if query_params.get(param)}
+
+
+def filter_facets(queryset, selected: dict):
+    """Restrict a queryset of documents to the selected facet values"""
+    return queryset.filter(**{FACET_FIELDS[facet]: value for facet, value in selected.items()})
+
+
+def facet_counts(queryset, selected: dict = None) -> dict:
+    """
+    Count the documents of a queryset per facet value in one grouped query.
+
+    Args:
+        queryset: Documents to count, without the facet selections applied
+        selected: Selected facet values, as returned by selected_facets
+
+    Returns:
+        Dict with the `total` number of documents matching every selection and,
+        per facet, a list of its values with their counts, largest first
+    """
+    selected = {facet: str(value) for facet, value in (selected or {}).items()}
+    rows = queryset.order_by().values(
+        'doc_type', 'case_id', 'case__title', 'case__client_id', 'case__client__first_name', 'case__client__last_name'
+    ).annotate(count=Count('pk'))
+
+    counts = {facet: {} for facet in FACET_FIELDS}
+    labels = {'case': {}, 'client': {}}
+    total = 0
+    for row in rows:
+        matches = {
+            facet: facet not in selected or str(row[field]) == selected[facet]
+            for facet, field in FACET_FIELDS.items()
+        }
+        if all(matches.values()):
+            total += row['count']
+        for facet, field in FACET_FIELDS.items():
+            if all(match for other, match in matches.items() if other != facet):
+                counts[facet][row[field]] = counts[facet].get(row[field], 0) + row['count']
+        labels['case'][row['case_id']] = row['case__title']
+        if row['case__client_id'] is not None:
+            labels['client'][row['case__client_id']] = f"{row['case__client__first_name']} {row['case__client__last_name']}"
+
+    def ordered(facet):
+        return sorted(counts[facet].items(), key=lambda item: item[1], reverse=True)
+
+    return {
+        'total': total,
+        'doc_type': [{'value': value, 'count': count} for value, count in ordered('doc_type')],
+        'case': [{'id': value, 'title': labels['case'].get(value), 'count': count} for value, count in ordered('case')],
+        'client': [{'id': value, 'name': labels['client'].get(value), 'count': count} for value, count in ordered('client')],
+    }
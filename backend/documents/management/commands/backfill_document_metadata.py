@@ -0,0 +1,58 @@
+"""
+Management command to record the size, content hash, MIME type and page
+count of documents uploaded before these were stored at upload time.
+Each file is streamed from storage once to hash it, and PDFs are opened from
+their path to count pages.
+"""
+import os
+from django.core.management.base import BaseCommand
+from documents.models import Document
+from documents.processing import file_metadata, count_pdf_pages
+from documents.storage import local_path
+
+FIELDS = ['file_size_bytes', 'content_hash', 'mime_type', 'page_count']
+
+class Command(BaseCommand):
+    help = 'Backfill persisted file metadata for documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Recompute metadata for every document, not only those missing it'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Number of documents saved per query'
+        )
+
+    def handle(self, *args, **options):
+        documents = Document.objects.defer('extracted_text', 'minhash').order_by('pk')
+        if not options['all']:
+            documents = documents.filter(file_size_bytes__isnull=True)
+
+        batch = []
+        updated = missing = 0
+        for document in documents.iterator(chunk_size=options['batch_size']):
+            try:
+                with document.file.open('rb'):
+                    for field, value in file_metadata(document.file).items():
+                        setattr(document, field, value)
+                if os.path.splitext(document.file.name)[1].lower() == '.pdf' and document.page_count is None:
+                    with local_path(document.file) as path:
+                        document.page_count = count_pdf_pages(path)
+            except (FileNotFoundError, OSError) as e:
+                missing += 1
+                self.stdout.write(self.style.WARNING(f'Skipping document {document.pk}: {e}'))
+                continue
+
+            batch.append(document)
+            if len(batch) >= options['batch_size']:
+                Document.objects.bulk_update(batch, FIELDS)
+                updated += len(batch)
+                batch = []
+
+        if batch:
+            Document.objects.bulk_update(batch, FIELDS)
+            updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled metadata for {updated} documents ({missing} files missing)'))
@@ -0,0 +1,108 @@
+"""
+Management command to move documents uploaded before content-addressed
+storage into the blob store. Each document's file is copied to the blob for
+its content unless that blob already exists, the document is pointed at the
+blob, and old files no document references any more are deleted.
+"""
+import os
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from documents.models import Document
+from documents.processing import file_metadata
+from documents.storage import blob_name, release_blob
+
+class Command(BaseCommand):
+    help = 'Deduplicate stored document files into the content-addressed blob store'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report what would be moved and freed without changing anything'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Number of documents saved per query'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        documents = Document.objects.only(
+            'pk', 'file', 'content_hash', 'file_size_bytes', 'mime_type', 'original_filename'
+        ).order_by('pk')
+
+        stored_blobs = set()
+        batch, old_names = [], []
+        moved = duplicates = missing = removed = 0
+        duplicate_bytes = freed_bytes = 0
+
+        for document in documents.iterator(chunk_size=options['batch_size']):
+            storage = document.file.storage
+            old_name = document.file.name
+            try:
+                if not document.content_hash:
+                    with document.file.open('rb'):
+                        for field, value in file_metadata(document.file).items():
+                            setattr(document, field, value)
+                name = blob_name(document.content_hash, old_name)
+                if name == old_name:
+                    stored_blobs.add(name)
+                    continue
+
+                if name in stored_blobs or storage.exists(name):
+                    duplicates += 1
+                    duplicate_bytes += document.file_size_bytes or 0
+                elif not dry_run:
+                    with storage.open(old_name, 'rb') as f:
+                        saved_name = storage.save(name, File(f))
+                    if saved_name != name:
+                        # Another process wrote the blob meanwhile; keep it and drop the copy
+                        storage.delete(saved_name)
+            except (FileNotFoundError, OSError) as e:
+                missing += 1
+                self.stdout.write(self.style.WARNING(f'Skipping document {document.pk}: {e}'))
+                continue
+
+            stored_blobs.add(name)
+            moved += 1
+            if dry_run:
+                continue
+            document.original_filename = document.original_filename or os.path.basename(old_name)
+            document.file.name = name
+            batch.append(document)
+            old_names.append(old_name)
+            if len(batch) >= options['batch_size']:
+                removed_count, removed_bytes = self._save_batch(batch, old_names, storage)
+                removed += removed_count
+                freed_bytes += removed_bytes
+                batch, old_names = [], []
+
+        if batch:
+            removed_count, removed_bytes = self._save_batch(batch, old_names, batch[0].file.storage)
+            removed += removed_count
+            freed_bytes += removed_bytes
+
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f'Would move {moved} documents into the blob store; {duplicates} are duplicates '
+                f'({duplicate_bytes} bytes) ({missing} files missing)'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Moved {moved} documents into the blob store and removed {removed} old files, '
+                f'freeing {freed_bytes} bytes ({missing} files missing)'
+            ))
+
+    def _save_batch(self, batch, old_names, storage):
+        Document.objects.bulk_update(
+            batch, ['file', 'content_hash', 'file_size_bytes', 'mime_type', 'original_filename']
+        )
+        removed = freed = 0
+        for name in set(old_names):
+            try:
+                size = storage.size(name)
+            except OSError:
+                continue
+            if release_blob(storage, name):
+                removed += 1
+                freed += size
+        return removed, freed
@@ -0,0 +1,32 @@
+"""
+Management command to extract text from documents, index them for
+near-duplicate detection and render their previews. New uploads are
+processed automatically in the background; this backfills documents
+uploaded before processing existed or skipped because the queue was full.
+"""
+from django.core.management.base import BaseCommand
+from documents.models import Document
+from documents.processing import run_pipeline
+
+class Command(BaseCommand):
+    help = 'Extract text, build similarity signatures and render previews for documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Re-process every document, not only those never processed'
+        )
+
+    def handle(self, *args, **options):
+        documents = Document.objects.all()
+        if not options['all']:
+            documents = documents.filter(preview_generated_at__isnull=True)
+
+        processed = 0
+        for document in documents.iterator():
+            run_pipeline(document)
+            processed += 1
+            if not document.minhash:
+                self.stdout.write(self.style.WARNING(f'No text could be extracted from document {document.pk}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} documents'))
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:21
+
+from django.db import migrations, models
+import documents.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0002_document_similarity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='preview_generated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='preview_snippet',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='thumbnail',
+            field=models.FileField(blank=True, editable=False, upload_to=documents.models.get_thumbnail_upload_path),
+        ),
+    ]
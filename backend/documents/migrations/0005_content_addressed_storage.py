@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:27
+
+import os
+from django.db import migrations, models
+import documents.models
+import documents.storage
+
+
+def record_original_filenames(apps, schema_editor):
+    """Existing files are still stored under their uploaded names"""
+    Document = apps.get_model('documents', 'Document')
+    batch = []
+    for document in Document.objects.only('pk', 'file').iterator():
+        document.original_filename = os.path.basename(document.file.name)
+        batch.append(document)
+        if len(batch) >= 500:
+            Document.objects.bulk_update(batch, ['original_filename'])
+            batch = []
+    if batch:
+        Document.objects.bulk_update(batch, ['original_filename'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0004_document_file_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='original_filename',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='file',
+            field=documents.storage.ContentAddressedFileField(max_length=255, upload_to=documents.models.get_document_upload_path),
+        ),
+        migrations.RunPython(record_original_filenames, migrations.RunPython.noop),
+    ]
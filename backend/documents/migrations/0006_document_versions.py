@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import documents.models
+import documents.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('documents', '0005_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='version_number',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.CreateModel(
+            name='DocumentVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version_number', models.PositiveIntegerField()),
+                ('original_filename', models.CharField(blank=True, max_length=255)),
+                ('file_size_bytes', models.BigIntegerField(blank=True, null=True)),
+                ('content_hash', models.CharField(blank=True, max_length=64)),
+                ('mime_type', models.CharField(blank=True, max_length=100)),
+                ('file', documents.storage.ContentAddressedFileField(blank=True, max_length=255, upload_to=documents.models.get_document_upload_path)),
+                ('delta', models.BinaryField(blank=True, null=True)),
+                ('text', models.BinaryField(blank=True, null=True)),
+                ('superseded_at', models.DateTimeField(auto_now_add=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='documents.document')),
+                ('superseded_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-version_number'],
+                'unique_together': {('document', 'version_number')},
+            },
+        ),
+    ]
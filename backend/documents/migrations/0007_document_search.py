@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:33
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+SEARCH_INDEX = django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='document_search_vector_idx')
+
+
+def index_existing_documents(apps, schema_editor):
+    """Fill the search vectors of existing documents and build the GIN index (PostgreSQL only)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    config = getattr(settings, 'DOCUMENT_SEARCH_CONFIG', 'english')
+    schema_editor.execute(
+        "UPDATE documents_document SET search_vector = "
+        "setweight(to_tsvector(%s::regconfig, coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector(%s::regconfig, coalesce(description, '')), 'B') || "
+        "setweight(to_tsvector(%s::regconfig, left(coalesce(extracted_text, ''), 200000)), 'C')",
+        params=[config, config, config],
+    )
+    Document = apps.get_model('documents', 'Document')
+    schema_editor.add_index(Document, SEARCH_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Document = apps.get_model('documents', 'Document')
+    schema_editor.remove_index(Document, SEARCH_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_document_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # GIN indexes only exist on PostgreSQL, so the index is created there and only recorded in state elsewhere
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='document', index=SEARCH_INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(index_existing_documents, drop_search_index),
+            ],
+        ),
+    ]
@@ -1,20 +1,34 @@
 import os
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from cases.models import Case # Assuming Case model exists in 'cases' app
+from .storage import blob_name, ContentAddressedFileField, ContentAddressedModel
 
 def get_document_upload_path(instance, filename):
-    """ Determines the upload path for the document. Organizes files based on case ID if available. """
+    """
+    Determines the upload path for the document. Files with a known content hash
+    go to the content-addressed blob store; otherwise they are organized by case ID.
+    """
+    if instance.content_hash:
+        return blob_name(instance.content_hash, filename)
     if instance.case:
         return f"documents/cases/{instance.case.id}/{filename}"
     return f"documents/uncategorized/{filename}"
 
-class Document(models.Model):
+def get_thumbnail_upload_path(instance, filename):
+    """ Stores a document's preview thumbnail in a previews folder next to its file. """
+    return os.path.join(os.path.dirname(instance.file.name), 'previews', filename)
+
+class Document(ContentAddressedModel):
     """Represents a document uploaded to the system."""
     case = models.ForeignKey(Case, on_delete=models.CASCADE, related_name='documents', null=True, blank=True)
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
-    file = models.FileField(upload_to=get_document_upload_path)
+    file = ContentAddressedFileField(upload_to=get_document_upload_path, max_length=255)
+    # Name the file was uploaded with, as stored file names are content hashes
+    original_filename = models.CharField(max_length=255, blank=True, editable=False)
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='uploaded_documents')
     uploaded_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -30,34 +44,94 @@ class Document(models.Model):
     )
     doc_type = models.CharField(max_length=50, choices=DOCUMENT_TYPES, blank=True)
 
+    # File metadata recorded at upload, so listing documents never has to touch storage
+    file_size_bytes = models.BigIntegerField(null=True, blank=True, editable=False)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    mime_type = models.CharField(max_length=100, blank=True, editable=False)
+    page_count = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    # Incremented each time the file is replaced; earlier versions are kept as DocumentVersion rows
+    version_number = models.PositiveIntegerField(default=1, editable=False)
+
+    # Text extracted from the file, and its MinHash signature for near-duplicate detection
+    extracted_text = models.TextField(blank=True)
+    minhash = models.BinaryField(null=True, blank=True, editable=False)
+
+    # Precomputed preview shown in document lists
+    thumbnail = models.FileField(upload_to=get_thumbnail_upload_path, blank=True, editable=False)
+    preview_snippet = models.TextField(blank=True, editable=False)
+    preview_generated_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    # Full-text search vector of the name, description and extracted text (PostgreSQL only)
+    search_vector = SearchVectorField(null=True, editable=False)
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self.file and not self.file._committed:
+            self.original_filename = os.path.basename(self.file.name)
+        super().save(*args, **kwargs)
+
     def get_file_size(self):
-        """Returns the file size in a human-readable format."""
-        try:
-            size = self.file.size
-            if size < 1024:
-                return f"{size} B"
-            elif size < 1024**2:
-                return f"{size/1024:.1f} KB"
-            elif size < 1024**3:
-                return f"{size/1024**2:.1f} MB"
-            else:
-                return f"{size/1024**3:.1f} GB"
-        except FileNotFoundError:
-            return "File not found"
-        except Exception:
+        """Returns the recorded file size in a human-readable format."""
+        size = self.file_size_bytes
+        if size is None:
             return "N/A"
+        if size < 1024:
+            return f"{size} B"
+        elif size < 1024**2:
+            return f"{size/1024:.1f} KB"
+        elif size < 1024**3:
+            return f"{size/1024**2:.1f} MB"
+        else:
+            return f"{size/1024**3:.1f} GB"
 
     class Meta:
         ordering = ['-uploaded_at']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='document_search_vector_idx'),
+        ]
 
-# Consider adding a DocumentVersion model for version history
-# class DocumentVersion(models.Model):
-#     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='versions')
-#     version_number = models.PositiveIntegerField()
-#     file = models.FileField(upload_to='document_versions/')
-#     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
-#     uploaded_at = models.DateTimeField(auto_now_add=True)
-#     comment = models.TextField(blank=True)
+class DocumentLSHBucket(models.Model):
+    """
+    One LSH bucket of a document's MinHash signature (one row per band).
+    Documents sharing a bucket are candidate near-duplicates.
+    """
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='lsh_buckets')
+    bucket = models.BigIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"{self.document_id}: {self.bucket}"
+
+class DocumentVersion(ContentAddressedModel):
+    """
+    A previous version of a document's file, kept when the file is replaced.
+
+    Versions are stored as reverse deltas: each one is a binary delta against
+    the next newer version (the document's current file for the latest one),
+    except snapshots, which reference the full file. A snapshot is kept every
+    few versions to bound the chain of deltas applied to rebuild a version.
+    """
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='versions')
+    version_number = models.PositiveIntegerField()
+    original_filename = models.CharField(max_length=255, blank=True)
+    file_size_bytes = models.BigIntegerField(null=True, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True)
+    mime_type = models.CharField(max_length=100, blank=True)
+    file = ContentAddressedFileField(upload_to=get_document_upload_path, max_length=255, blank=True)
+    delta = models.BinaryField(null=True, blank=True)
+    # zlib-compressed text extracted from this version, for text diffs
+    text = models.BinaryField(null=True, blank=True)
+    superseded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    superseded_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.document} v{self.version_number}"
+
+    @property
+    def is_snapshot(self):
+        return bool(self.file)
+
+    class Meta:
+        ordering = ['-version_number']
+        unique_together = ('document', 'version_number')
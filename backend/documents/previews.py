@@ -0,0 +1,89 @@
+"""
+Rendering of document previews: a thumbnail of the first page and a text snippet.
+"""
+import io
+import os
+import re
+import logging
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from .models import Document
+from .storage import local_path
+
+logger = logging.getLogger(__name__)
+
+# Import these libraries only if available
+try:
+    import fitz  # PyMuPDF
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
+
+try:
+    from PIL import Image
+    PILLOW_AVAILABLE = True
+except ImportError:
+    PILLOW_AVAILABLE = False
+
+THUMBNAIL_WIDTH = 320
+SNIPPET_LENGTH = 400
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def render_thumbnail(file_field):
+    """
+    Render the first page of a PDF, or an image, as a PNG thumbnail.
+    Returns None for other formats or when the required library is missing.
+    """
+    extension = os.path.splitext(file_field.name)[1].lower()
+
+    if extension == '.pdf' and PYMUPDF_AVAILABLE:
+        with local_path(file_field) as path, fitz.open(path, filetype='pdf') as pdf:
+            if not len(pdf):
+                return None
+            page = pdf.load_page(0)
+            zoom = THUMBNAIL_WIDTH / max(page.rect.width, 1)
+            return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False).tobytes('png')
+
+    if extension in IMAGE_EXTENSIONS and PILLOW_AVAILABLE:
+        with file_field.open('rb') as f:
+            image = Image.open(f)
+            # Decode at a reduced size where the format supports it (JPEG)
+            image.draft('RGB', (THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 4))
+            image = image.convert('RGB')
+        image.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 4))
+        output = io.BytesIO()
+        image.save(output, format='PNG', optimize=True)
+        return output.getvalue()
+
+    return None
+
+
+def make_snippet(text: str, length: int = SNIPPET_LENGTH) -> str:
+    """Return the start of a text with whitespace collapsed, cut at a word boundary"""
+    text = re.sub(r'\s+', ' ', text[:length * 2]).strip()
+    if len(text) <= length:
+        return text
+    return text[:length].rsplit(' ', 1)[0] + '…'
+
+
+def generate_preview(document: Document):
+    """Render and store the thumbnail and snippet of a document"""
+    try:
+        thumbnail = render_thumbnail(document.file)
+    except Exception as e:
+        logger.error(f"Error rendering thumbnail for document {document.pk}: {e}")
+        thumbnail = None
+
+    if document.thumbnail:
+        document.thumbnail.delete(save=False)
+    if thumbnail:
+        name = os.path.splitext(os.path.basename(document.file.name))[0]
+        document.thumbnail.save(f"{name}.png", ContentFile(thumbnail), save=False)
+
+    document.preview_snippet = make_snippet(document.extracted_text)
+    document.preview_generated_at = timezone.now()
+    document.save(update_fields=['thumbnail', 'preview_snippet', 'preview_generated_at'])
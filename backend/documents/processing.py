@@ -0,0 +1,317 @@
+"""
+Post-upload processing of documents: text extraction, the similarity index,
+previews and version compression, run on a bounded background worker pool.
+"""
+import os
+import re
+import html
+import codecs
+import hashlib
+import logging
+import mimetypes
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Document, DocumentLSHBucket, DocumentVersion
+from .similarity import (
+    DEFAULT_THRESHOLD, minhash_signature, signature_to_bytes, signature_from_bytes,
+    band_buckets, estimate_similarity,
+)
+from .previews import generate_preview
+from .search import update_search_vector
+from .storage import local_path
+from .versions import compress_version
+
+logger = logging.getLogger(__name__)
+
+# Import these libraries only if available
+try:
+    import fitz  # PyMuPDF
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
+
+try:
+    from pypdf import PdfReader
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+
+TEXT_EXTENSIONS = ('.txt', '.md', '.csv', '.json', '.html', '.htm', '.xml', '.rtf')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tif', '.tiff', '.webp')
+
+# Leading bytes identifying common upload formats
+MAGIC_SIGNATURES = (
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF8', 'image/gif'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/msword'),
+)
+
+# Bytes read from the start of a file to detect its type
+HEAD_SIZE = 8192
+
+# Bytes of a text file decoded at a time
+TEXT_READ_SIZE = 1024 * 1024
+
+
+def detect_mime_type(head: bytes, filename: str) -> str:
+    """Detect a file's MIME type from its leading bytes, falling back to its name"""
+    for signature, mime_type in MAGIC_SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    guessed_type = mimetypes.guess_type(filename)[0]
+    if head.startswith(b'PK\x03\x04'):
+        # Office Open XML documents are ZIP containers, so trust the extension for those
+        return guessed_type or 'application/zip'
+    return guessed_type or 'application/octet-stream'
+
+
+def file_metadata(file) -> dict:
+    """
+    Compute the size, SHA-256 and MIME type of an uploaded or stored file
+    in a single streaming pass.
+
+    Returns:
+        Dict with file_size_bytes, content_hash and mime_type, ready to be
+        saved on a Document
+    """
+    digest = hashlib.sha256()
+    size = 0
+    head = b''
+    for chunk in file.chunks():
+        if len(head) < HEAD_SIZE:
+            head += chunk[:HEAD_SIZE - len(head)]
+        digest.update(chunk)
+        size += len(chunk)
+    return {
+        'file_size_bytes': size,
+        'content_hash': digest.hexdigest(),
+        'mime_type': detect_mime_type(head, file.name),
+    }
+
+
+def extract_content(file_field):
+    """
+    Extract the text of an uploaded file, choosing the method from its extension.
+
+    The file is never read into memory whole: PDFs and Word documents are
+    opened from their path, and text files are decoded a block at a time.
+
+    Returns:
+        (text, page_count) tuple. The text is empty for formats that cannot be
+        read, and the page count is None where it is unknown.
+    """
+    extension = os.path.splitext(file_field.name)[1].lower()
+    if extension == '.pdf':
+        with local_path(file_field) as path:
+            return _extract_pdf(path)
+    if extension == '.docx':
+        with local_path(file_field) as path:
+            return _extract_docx_text(path), None
+    if extension in TEXT_EXTENSIONS:
+        return _read_text(file_field), None
+    if extension in IMAGE_EXTENSIONS:
+        return '', 1
+    return '', None
+
+
+def _read_text(file_field) -> str:
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    parts = []
+    with file_field.open('rb') as f:
+        while True:
+            block = f.read(TEXT_READ_SIZE)
+            if not block:
+                break
+            parts.append(decoder.decode(block))
+    parts.append(decoder.decode(b'', final=True))
+    return ''.join(parts)
+
+
+def count_pdf_pages(path: str):
+    """Return the number of pages of a PDF file, or None if no PDF library can read it"""
+    if PYMUPDF_AVAILABLE:
+        try:
+            with fitz.open(path, filetype='pdf') as pdf:
+                return len(pdf)
+        except Exception as e:
+            logger.error(f"Error reading PDF with PyMuPDF: {e}")
+    if PYPDF_AVAILABLE:
+        try:
+            with open(path, 'rb') as f:
+                return len(PdfReader(f).pages)
+        except Exception as e:
+            logger.error(f"Error reading PDF with pypdf: {e}")
+    return None
+
+
+def _extract_pdf(path: str):
+    if PYMUPDF_AVAILABLE:
+        try:
+            with fitz.open(path, filetype='pdf') as pdf:
+                return ''.join(page.get_text() for page in pdf), len(pdf)
+        except Exception as e:
+            logger.error(f"Error extracting PDF text with PyMuPDF: {e}")
+    if PYPDF_AVAILABLE:
+        try:
+            # Given a path pypdf would load the whole file; an open file is read as needed
+            with open(path, 'rb') as f:
+                pages = PdfReader(f).pages
+                return '\n'.join(page.extract_text() or '' for page in pages), len(pages)
+        except Exception as e:
+            logger.error(f"Error extracting PDF text with pypdf: {e}")
+    logger.warning("No PDF library available to extract text. Install PyMuPDF or pypdf.")
+    return '', None
+
+
+def _extract_docx_text(path: str) -> str:
+    try:
+        with zipfile.ZipFile(path) as archive:
+            xml = archive.read('word/document.xml').decode('utf-8')
+    except (zipfile.BadZipFile, KeyError) as e:
+        logger.error(f"Error reading Word document: {e}")
+        return ''
+    paragraphs = []
+    for paragraph in re.findall(r'<w:p[ >].*?</w:p>', xml, flags=re.DOTALL):
+        runs = re.findall(r'<w:t(?: [^>]*)?>(.*?)</w:t>', paragraph, flags=re.DOTALL)
+        paragraphs.append(html.unescape(''.join(runs)))
+    return '\n'.join(paragraphs)
+
+
+_executor = None
+_queue_slots = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _queue_slots
+    with _executor_lock:
+        if _executor is None:
+            workers = getattr(settings, 'DOCUMENT_PROCESSING_WORKERS', 2)
+            queue_size = getattr(settings, 'DOCUMENT_PROCESSING_QUEUE_SIZE', 100)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='document-processing')
+            # Counts running plus queued jobs, since the executor's own queue is unbounded
+            _queue_slots = threading.BoundedSemaphore(workers + queue_size)
+        return _executor
+
+
+def schedule_processing(document: Document):
+    """Process a document in the background once the current transaction commits"""
+    document_id = document.pk
+    transaction.on_commit(lambda: _submit(
+        _process, document_id,
+        skipped=f"document {document_id} is left for the process_documents command",
+    ))
+
+
+def schedule_version_compression(version: DocumentVersion):
+    """Compress a version snapshot into a delta in the background once the current transaction commits"""
+    version_id = version.pk
+    transaction.on_commit(lambda: _submit(
+        _compress, version_id,
+        skipped=f"document version {version_id} is kept as a snapshot",
+    ))
+
+
+def _submit(task, object_id, skipped: str):
+    executor = _get_executor()
+    if not _queue_slots.acquire(blocking=False):
+        logger.warning(f"Document processing queue is full; {skipped}")
+        return
+    executor.submit(_run, task, object_id)
+
+
+def _run(task, object_id):
+    try:
+        task(object_id)
+    except Exception as e:
+        logger.error(f"Error running {task.__name__} for {object_id}: {e}", exc_info=True)
+    finally:
+        _queue_slots.release()
+        # Worker threads get their own database connection, which must not leak
+        connection.close()
+
+
+def _process(document_id):
+    document = Document.objects.filter(pk=document_id).first()
+    if document is not None:
+        run_pipeline(document)
+
+
+def _compress(version_id):
+    version = DocumentVersion.objects.defer('text').filter(pk=version_id).first()
+    if version is not None:
+        compress_version(version)
+
+
+def run_pipeline(document: Document):
+    """Run every processing step for a document"""
+    process_document(document)
+    generate_preview(document)
+
+
+def process_document(document: Document):
+    """Extract a document's text and page count and refresh its search vector and similarity index entries"""
+    try:
+        document.extracted_text, document.page_count = extract_content(document.file)
+    except Exception as e:
+        logger.error(f"Error extracting text from document {document.pk}: {e}")
+        document.extracted_text, document.page_count = '', None
+    document.save(update_fields=['extracted_text', 'page_count'])
+    update_search_vector(document)
+    update_similarity_index(document)
+
+
+def update_similarity_index(document: Document):
+    """Store the MinHash signature and LSH buckets of a document's extracted text"""
+    signature = minhash_signature(document.extracted_text)
+    with transaction.atomic():
+        document.minhash = signature_to_bytes(signature) if signature is not None else None
+        document.save(update_fields=['minhash'])
+        DocumentLSHBucket.objects.filter(document=document).delete()
+        if signature is not None:
+            DocumentLSHBucket.objects.bulk_create(
+                DocumentLSHBucket(document=document, bucket=bucket) for bucket in band_buckets(signature)
+            )
+
+
+def find_similar_documents(document: Document, queryset=None, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """
+    Find near-duplicates of a document through the LSH index.
+
+    Only documents sharing at least one bucket are compared, and their
+    similarity is estimated from the stored signatures.
+
+    Args:
+        document: Document to find near-duplicates of
+        queryset: Documents to search (defaults to all documents)
+        threshold: Minimum estimated Jaccard similarity
+
+    Returns:
+        List of (document, similarity) pairs, most similar first
+    """
+    if not document.minhash:
+        return []
+    signature = signature_from_bytes(document.minhash)
+
+    candidates = (queryset if queryset is not None else Document.objects.all()).filter(
+        lsh_buckets__bucket__in=band_buckets(signature)
+    ).exclude(pk=document.pk).distinct().defer('extracted_text')
+
+    similar = []
+    for candidate in candidates:
+        if not candidate.minhash:
+            continue
+        similarity = estimate_similarity(signature, signature_from_bytes(candidate.minhash))
+        if similarity >= threshold:
+            similar.append((candidate, similarity))
+    similar.sort(key=lambda pair: pair[1], reverse=True)
+    return similar
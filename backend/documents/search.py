@@ -0,0 +1,80 @@
+"""
+Full-text search over documents.
+
+On PostgreSQL every document has a tsvector of its name (weight A),
+description (B) and extracted text (C) in Document.search_vector, backed by
+a GIN index. It is refreshed when a document is saved through the API and
+when its text extraction finishes. Other databases fall back to substring
+matching on the name and description.
+"""
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import CharField, F, FloatField, Q, Value
+from django.db.models.functions import Left
+
+from .models import Document
+
+# Characters of extracted text that are indexed, keeping tsvectors well under PostgreSQL's 1 MB limit
+SEARCH_TEXT_LIMIT = 200_000
+
+
+def full_text_search_available() -> bool:
+    return connection.vendor == 'postgresql'
+
+
+def search_config() -> str:
+    """Text search configuration (language) used for stemming and stop words"""
+    return getattr(settings, 'DOCUMENT_SEARCH_CONFIG', 'english')
+
+
+def document_search_vector():
+    """Expression computing a document's weighted search vector"""
+    config = search_config()
+    return (
+        SearchVector('name', weight='A', config=config)
+        + SearchVector('description', weight='B', config=config)
+        + SearchVector(Left('extracted_text', SEARCH_TEXT_LIMIT), weight='C', config=config)
+    )
+
+
+def update_search_vector(document: Document):
+    """Recompute the search vector of a document in the database"""
+    if full_text_search_available():
+        Document.objects.filter(pk=document.pk).update(search_vector=document_search_vector())
+
+
+def _search_query(text: str):
+    # websearch syntax: quoted phrases, "or" and -exclusions, never a syntax error
+    return SearchQuery(text, search_type='websearch', config=search_config())
+
+
+def filter_search(queryset, text: str):
+    """Restrict a queryset of documents to those matching a search"""
+    if not full_text_search_available():
+        return queryset.filter(Q(name__icontains=text) | Q(description__icontains=text))
+    return queryset.filter(search_vector=_search_query(text))
+
+
+def ranked_search(queryset, text: str):
+    """
+    Restrict a queryset of documents to those matching a search, best
+    matches first, annotated with `search_rank` and `search_highlight`
+    (a snippet of the extracted text with matches wrapped in <mark>).
+    """
+    if not full_text_search_available():
+        return filter_search(queryset, text).annotate(
+            search_rank=Value(0.0, output_field=FloatField()),
+            search_highlight=Value('', output_field=CharField()),
+        ).order_by('-uploaded_at')
+
+    query = _search_query(text)
+    return queryset.filter(search_vector=query).annotate(
+        search_rank=SearchRank(F('search_vector'), query),
+        # Only computed for the rows returned, after sorting and slicing
+        search_highlight=SearchHeadline(
+            Left('extracted_text', SEARCH_TEXT_LIMIT), query, config=search_config(),
+            start_sel='<mark>', stop_sel='</mark>', max_fragments=2, min_words=10, max_words=30,
+        ),
+    ).order_by('-search_rank', '-uploaded_at')
+
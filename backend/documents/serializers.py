@@ -1,3 +1,4 @@
+from django.urls import reverse
 from rest_framework import serializers
 from .models import Document
 
@@ -6,11 +7,14 @@ class DocumentSerializer(serializers.ModelSerializer):
     file_size = serializers.SerializerMethodField()
     uploaded_by_name = serializers.SerializerMethodField()
     case_title = serializers.SerializerMethodField()
+    preview_url = serializers.SerializerMethodField()
     
     class Meta:
         model = Document
-        fields = '__all__'
-        read_only_fields = ('id', 'created_at', 'updated_at', 'uploaded_by_name', 'case_title', 'file_size')
+        # Extracted text and signatures can be large and are only used server-side
+        exclude = ('extracted_text', 'minhash', 'thumbnail', 'search_vector')
+        read_only_fields = ('id', 'created_at', 'updated_at', 'uploaded_by_name', 'case_title', 'file_size',
+                            'preview_url', 'preview_snippet', 'preview_generated_at')
     
     def get_file_size(self, obj):
         """Return human-readable file size"""
@@ -28,6 +32,14 @@ class DocumentSerializer(serializers.ModelSerializer):
             return obj.case.title
         return None
 
+    def get_preview_url(self, obj):
+        """Return the versioned URL of the preview thumbnail, if one has been rendered"""
+        if not obj.thumbnail:
+            return None
+        url = f"{reverse('document-preview', args=[obj.pk])}?v={int(obj.preview_generated_at.timestamp())}"
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
     def create(self, validated_data):
         """Create a new document with the current user as uploader"""
         request = self.context.get('request')
@@ -0,0 +1,33 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Document, DocumentVersion
+from .storage import release_blob_on_commit
+
+@receiver(pre_save, sender=Document)
+def remember_previous_file(sender, instance, **kwargs):
+    """Record the file a document referenced before this save, to release it if replaced."""
+    instance._previous_file_name = None
+    update_fields = kwargs.get('update_fields')
+    if instance.pk and not kwargs.get('raw') and (update_fields is None or 'file' in update_fields):
+        instance._previous_file_name = Document.objects.filter(pk=instance.pk).values_list('file', flat=True).first()
+
+@receiver(post_save, sender=Document)
+def release_replaced_file(sender, instance, **kwargs):
+    """Release the previous file of a document whose file was replaced."""
+    previous = getattr(instance, '_previous_file_name', None)
+    if previous and previous != instance.file.name:
+        release_blob_on_commit(instance.file.storage, previous)
+
+@receiver(post_delete, sender=Document)
+def release_deleted_files(sender, instance, **kwargs):
+    """Delete a removed document's thumbnail, and its file once no other document references it."""
+    if instance.thumbnail:
+        instance.thumbnail.delete(save=False)
+    if instance.file:
+        release_blob_on_commit(instance.file.storage, instance.file.name)
+
+@receiver(post_delete, sender=DocumentVersion)
+def release_version_snapshot(sender, instance, **kwargs):
+    """Release the file of a deleted version snapshot."""
+    if instance.file:
+        release_blob_on_commit(instance.file.storage, instance.file.name)
@@ -0,0 +1,104 @@
+"""
+Near-duplicate detection for documents using MinHash signatures and
+locality-sensitive hashing (LSH).
+
+A document's text is reduced to a set of word shingles, and the set to a
+fixed-size MinHash signature whose positions agree between two documents
+with probability equal to their Jaccard similarity. The signature is cut
+into bands; documents sharing any whole band land in the same LSH bucket,
+so candidates are found with an index lookup instead of comparing every
+pair of documents.
+"""
+import re
+import hashlib
+from array import array
+
+# Number of words in each shingle
+SHINGLE_SIZE = 5
+
+# Signature layout: BANDS * ROWS_PER_BAND hash values. Documents become
+# candidates at a Jaccard similarity of roughly (1 / BANDS) ** (1 / ROWS_PER_BAND),
+# about 0.7 here.
+BANDS = 16
+ROWS_PER_BAND = 8
+NUM_HASHES = BANDS * ROWS_PER_BAND
+
+# Estimated similarity at which documents are reported as near-duplicates
+DEFAULT_THRESHOLD = 0.8
+
+_HASH_RANGE = 2 ** 64
+_BIN_WIDTH = _HASH_RANGE // NUM_HASHES
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big')
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Return the hashes of the distinct word shingles of a text"""
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < size:
+        return {_hash64(' '.join(words).encode('utf-8'))} if words else set()
+    return {
+        _hash64(' '.join(words[i:i + size]).encode('utf-8'))
+        for i in range(len(words) - size + 1)
+    }
+
+
+def minhash_signature(text: str):
+    """
+    Compute the MinHash signature of a text, or None if it has no words.
+
+    Uses one-permutation hashing: each shingle is hashed once and falls into
+    one of NUM_HASHES bins by the range of its hash, keeping the minimum per
+    bin. Empty bins borrow from the next non-empty bin, offset by the
+    distance, so every position stays comparable. This costs one hash per
+    shingle instead of one per shingle and permutation.
+    """
+    hashes = shingles(text)
+    if not hashes:
+        return None
+
+    bins = [None] * NUM_HASHES
+    for value in hashes:
+        position, offset = divmod(value, _BIN_WIDTH)
+        if bins[position] is None or offset < bins[position]:
+            bins[position] = offset
+
+    signature = array('Q', [0]) * NUM_HASHES
+    for position in range(NUM_HASHES):
+        distance = 0
+        while bins[(position + distance) % NUM_HASHES] is None:
+            distance += 1
+        signature[position] = bins[(position + distance) % NUM_HASHES] + distance * _BIN_WIDTH
+    return signature
+
+
+def signature_to_bytes(signature) -> bytes:
+    return signature.tobytes()
+
+
+def signature_from_bytes(data: bytes):
+    signature = array('Q')
+    signature.frombytes(bytes(data))
+    return signature
+
+
+def band_buckets(signature) -> list:
+    """
+    Return the LSH bucket keys of a signature, one per band.
+
+    Keys include the band number, so a single indexed column can hold the
+    buckets of every band. They are signed to fit a BigIntegerField.
+    """
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        key = _hash64(band.to_bytes(2, 'big') + rows.tobytes())
+        buckets.append(key - _HASH_RANGE if key >= _HASH_RANGE // 2 else key)
+    return buckets
+
+
+def estimate_similarity(first, second) -> float:
+    """Estimate the Jaccard similarity of two documents from their signatures"""
+    return sum(1 for a, b in zip(first, second) if a == b) / NUM_HASHES
@@ -0,0 +1,120 @@
+"""
+Content-addressed storage of document files.
+
+Each distinct file content is stored once, as a blob named after its SHA-256
+(documents/blobs/ab/cd/<sha256>.<ext>). Documents with the same content,
+e.g. the same file uploaded to several cases, reference the same blob, and
+the number of Document rows and version snapshots pointing at a blob is its
+reference count: the blob is deleted once the last of them is deleted or
+given another file.
+
+Reusing a blob and releasing it both take a lock on the blob's name (a
+PostgreSQL advisory lock held until the transaction ends), so a blob is
+never deleted between an upload finding it and its row being committed.
+"""
+import os
+import hashlib
+import logging
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connection, models, transaction
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = 'documents/blobs'
+
+
+def blob_name(content_hash: str, filename: str) -> str:
+    """Return the storage name of the blob holding a content, keeping the file's extension"""
+    extension = os.path.splitext(filename)[1].lower()
+    return f'{BLOB_DIR}/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{extension}'
+
+
+def lock_blob(name: str):
+    """
+    Lock a stored file's name until the current transaction ends (PostgreSQL
+    only), serializing its reuse and its release
+    """
+    if connection.vendor != 'postgresql' or not connection.in_atomic_block:
+        return
+    key = int.from_bytes(hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [key])
+
+
+class ContentAddressedFileField(models.FileField):
+    """
+    FileField that references the existing blob instead of writing the file
+    again when a document's content is already stored. The model's
+    content_hash must be set before saving for the file to be deduplicated,
+    and the model must save in a transaction (see ContentAddressedModel).
+    """
+
+    def pre_save(self, model_instance, add):
+        file = getattr(model_instance, self.attname)
+        if file and not file._committed and getattr(model_instance, 'content_hash', ''):
+            name = self.generate_filename(model_instance, file.name)
+            # Held until the row referencing the blob is committed
+            lock_blob(name)
+            if file.storage.exists(name):
+                file.name = name
+                file._committed = True
+                return file
+        return super().pre_save(model_instance, add)
+
+
+class ContentAddressedModel(models.Model):
+    """Model with ContentAddressedFileFields, saved in a transaction so their blob locks cover the write"""
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+def release_blob(storage, name: str) -> bool:
+    """
+    Delete a stored file if no document references it any more.
+    Returns whether the file was deleted.
+    """
+    from .models import Document, DocumentVersion
+
+    if not name:
+        return False
+    with transaction.atomic():
+        # Waits for any upload reusing the blob to commit its reference
+        lock_blob(name)
+        if Document.objects.filter(file=name).exists() or DocumentVersion.objects.filter(file=name).exists():
+            return False
+        try:
+            storage.delete(name)
+        except OSError as e:
+            logger.error(f"Error deleting unreferenced file {name}: {e}")
+            return False
+    return True
+
+
+def release_blob_on_commit(storage, name: str):
+    """Release a file once the current transaction commits, when its references are final"""
+    transaction.on_commit(lambda: release_blob(storage, name))
+
+
+@contextmanager
+def local_path(file_field):
+    """Path of a stored file, copied chunk by chunk to a temporary file when its storage has no local paths"""
+    try:
+        path = file_field.path
+    except NotImplementedError:
+        path = None
+    if path is not None:
+        yield path
+        return
+    with tempfile.NamedTemporaryFile(suffix=os.path.splitext(file_field.name)[1]) as copy:
+        with file_field.open('rb') as f:
+            for chunk in f.chunks():
+                copy.write(chunk)
+        copy.flush()
+        yield copy.name
@@ -0,0 +1,80 @@
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from documents.downloads import parse_range
+from documents.models import Document
+
+CONTENT = bytes(range(256)) * 40
+
+
+class ParseRangeTests(SimpleTestCase):
+
+    def test_parses_single_ranges(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=900-', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=990-2000', 1000), (990, 999))
+
+    def test_ignores_or_rejects_other_ranges(self):
+        self.assertIsNone(parse_range(None, 1000))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 1000))
+        self.assertIsNone(parse_range('items=0-1', 1000))
+        self.assertEqual(parse_range('bytes=1000-', 1000), 'unsatisfiable')
+        self.assertEqual(parse_range('bytes=-0', 1000), 'unsatisfiable')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class DownloadTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='attorney@example.com', password='secret', first_name='Ada', last_name='Moyo', role='attorney'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.document = Document.objects.create(
+            name='Record', file=SimpleUploadedFile('record.pdf', CONTENT), uploaded_by=self.user,
+            file_size_bytes=len(CONTENT), content_hash='abc123', mime_type='application/pdf'
+        )
+        self.url = f'/api/documents/{self.document.pk}/file/'
+
+    def test_serves_the_whole_file(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='application/pdf')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['ETag'], '"abc123"')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    def test_serves_byte_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1000-1999')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[1000:2000])
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1999/{len(CONTENT)}')
+        self.assertEqual(response['Content-Length'], '1000')
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(CONTENT)}-')
+        self.assertEqual(response.status_code, 416)
+
+        # A stale If-Range falls back to the full file
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_none_match_returns_not_modified(self):
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"abc123"')
+
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(DOCUMENT_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_offloads_to_nginx_when_configured(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.document.file.name}')
+        self.assertEqual(response.content, b'')
@@ -0,0 +1,68 @@
+import io
+import tempfile
+import zipfile
+from unittest import mock, skipUnless
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models.fields.files import FieldFile
+from django.test import TestCase, override_settings
+
+from accounts.models import User
+from documents import previews, processing
+from documents.models import Document
+from documents.processing import extract_content, PYPDF_AVAILABLE
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ExtractContentTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='clerk@example.com', password='secret', first_name='Tendai', last_name='Dube', role='paralegal'
+        )
+
+    def document(self, filename, data):
+        return Document.objects.create(
+            name=filename, uploaded_by=self.user, file=SimpleUploadedFile(filename, data), file_size_bytes=len(data)
+        )
+
+    def test_text_is_decoded_in_blocks(self):
+        text = 'Mr Dube’s affidavit — paragraph ' * 50
+        document = self.document('affidavit.txt', text.encode('utf-8'))
+
+        # Blocks of 7 bytes split the multi-byte characters
+        with mock.patch.object(processing, 'TEXT_READ_SIZE', 7):
+            self.assertEqual(extract_content(document.file), (text, None))
+
+    def test_word_files_are_read_from_storage(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('word/document.xml', '<w:p><w:r><w:t>Heads of argument</w:t></w:r></w:p>')
+        self.assertEqual(extract_content(self.document('heads.docx', buffer.getvalue()).file),
+                         ('Heads of argument', None))
+
+    @skipUnless(PYPDF_AVAILABLE, 'pypdf is not installed')
+    def test_pdf_files_are_read_from_storage(self):
+        from pypdf import PdfWriter
+        writer = PdfWriter()
+        writer.add_blank_page(width=200, height=200)
+        writer.add_blank_page(width=200, height=200)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        pdf = self.document('bundle.pdf', buffer.getvalue())
+        self.assertEqual(extract_content(pdf.file)[1], 2)
+
+        # Storages without local paths are copied to a temporary file
+        with mock.patch.object(FieldFile, 'path', new_callable=mock.PropertyMock, side_effect=NotImplementedError):
+            self.assertEqual(extract_content(pdf.file)[1], 2)
+
+    def test_pdf_thumbnails_are_rendered_from_storage(self):
+        pdf = self.document('bundle.pdf', b'%PDF-1.4\n' + b'0' * 1000)
+        fitz = mock.MagicMock()
+        fitz.open.return_value.__enter__.return_value.__len__.return_value = 0
+
+        with mock.patch.object(previews, 'PYMUPDF_AVAILABLE', True), \
+                mock.patch.object(previews, 'fitz', fitz, create=True):
+            self.assertIsNone(previews.render_thumbnail(pdf.file))
+
+        fitz.open.assert_called_once_with(pdf.file.path, filetype='pdf')
@@ -0,0 +1,95 @@
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from cases.models import Case
+from clients.models import Client
+from documents.models import Document
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class DocumentFacetTests(TestCase):
+
+    def setUp(self):
+        self.attorney = User.objects.create_user(
+            email='attorney@example.com', password='secret', first_name='Ada', last_name='Moyo', role='attorney'
+        )
+        colleague = User.objects.create_user(
+            email='colleague@example.com', password='secret', first_name='Farai', last_name='Ncube', role='attorney'
+        )
+        outsider = User.objects.create_user(
+            email='outsider@example.com', password='secret', first_name='Tapiwa', last_name='Gumbo', role='attorney'
+        )
+        self.client_a = Client.objects.create(first_name='Rudo', last_name='Chikore')
+        client_b = Client.objects.create(first_name='Nyasha', last_name='Mutasa', email='nyasha@example.com')
+        self.case_a = Case.objects.create(title='Chikore v Mutasa', client=self.client_a)
+        self.case_b = Case.objects.create(title='Mutasa estate', client=client_b)
+        hidden_case = Case.objects.create(title='Unrelated', client=client_b)
+        # Several assigned attorneys must not duplicate documents
+        self.case_a.assigned_attorneys.add(self.attorney, colleague)
+        self.case_b.assigned_attorneys.add(self.attorney, colleague)
+
+        def document(name, doc_type, case, uploaded_by=colleague):
+            Document.objects.create(
+                name=name, doc_type=doc_type, case=case, uploaded_by=uploaded_by,
+                file=SimpleUploadedFile(f'{name}.txt', b'text'), file_size_bytes=4
+            )
+
+        document('Lease', 'contract', self.case_a)
+        document('Affidavit', 'court', self.case_a)
+        document('Heads of argument', 'court', self.case_a)
+        document('Will', 'legal', self.case_b)
+        document('Own note', 'other', None, uploaded_by=self.attorney)
+        document('Hidden', 'court', hidden_case, uploaded_by=outsider)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.attorney)
+
+    def facet(self, body, name, key='id'):
+        return {facet[key]: facet['count'] for facet in body['facets'][name]}
+
+    def test_returns_the_page_and_every_facet(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/documents/facets/')
+
+        # One grouped query for all facets and one for the page
+        self.assertEqual(len([query for query in queries if 'documents_document' in query['sql']]), 2)
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['count'], 5)
+        self.assertEqual(len(body['results']), 5)
+        self.assertEqual(self.facet(body, 'doc_type', 'value'), {'contract': 1, 'court': 2, 'legal': 1, 'other': 1})
+        self.assertEqual(self.facet(body, 'case'), {self.case_a.pk: 3, self.case_b.pk: 1, None: 1})
+        self.assertEqual(self.facet(body, 'client'), {self.client_a.pk: 3, self.case_b.client_id: 1, None: 1})
+        self.assertEqual(body['facets']['client'][0]['name'], 'Rudo Chikore')
+
+    def test_facet_counts_ignore_their_own_selection(self):
+        response = self.client.get('/api/documents/facets/', {'docType': 'court', 'limit': 1})
+
+        body = response.json()
+        self.assertEqual(body['count'], 2)
+        self.assertEqual(len(body['results']), 1)
+        # Other types stay selectable with their counts
+        self.assertEqual(self.facet(body, 'doc_type', 'value'), {'contract': 1, 'court': 2, 'legal': 1, 'other': 1})
+        self.assertEqual(self.facet(body, 'case'), {self.case_a.pk: 2})
+
+    def test_list_has_no_duplicates_for_shared_cases(self):
+        response = self.client.get('/api/documents/', {'caseId': self.case_a.pk})
+
+        self.assertEqual(sorted(document['name'] for document in response.json()),
+                         ['Affidavit', 'Heads of argument', 'Lease'])
+
+    def test_list_and_retrieve_skip_large_columns(self):
+        document = Document.objects.get(name='Lease')
+        for path in ('/api/documents/', f'/api/documents/{document.pk}/'):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(path).status_code, 200)
+            selects = ' '.join(query['sql'] for query in queries if 'documents_document' in query['sql'])
+            for column in ('extracted_text', 'minhash', 'search_vector'):
+                self.assertNotIn(column, selects)
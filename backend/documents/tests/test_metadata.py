@@ -0,0 +1,82 @@
+import hashlib
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from documents.models import Document
+from documents.processing import PYPDF_AVAILABLE, count_pdf_pages
+
+PDF_BYTES = b'%PDF-1.4\n' + b'0' * 5000
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class FileMetadataTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='clerk@example.com', password='secret', first_name='Tendai', last_name='Dube', role='paralegal'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_upload_records_metadata(self):
+        response = self.client.post('/api/documents/', {
+            'name': 'Founding affidavit',
+            'file': SimpleUploadedFile('affidavit.pdf', PDF_BYTES),
+        }, format='multipart')
+
+        self.assertEqual(response.status_code, 201)
+        document = Document.objects.get()
+        self.assertEqual(document.file_size_bytes, len(PDF_BYTES))
+        self.assertEqual(document.content_hash, hashlib.sha256(PDF_BYTES).hexdigest())
+        self.assertEqual(document.mime_type, 'application/pdf')
+        self.assertEqual(response.json()['file_size'], '4.9 KB')
+
+    def test_listing_never_touches_storage(self):
+        for number in range(3):
+            Document.objects.create(
+                name=f'Doc {number}', file=SimpleUploadedFile(f'{number}.txt', b'text'),
+                uploaded_by=self.user, file_size_bytes=4
+            )
+
+        with mock.patch.object(FileSystemStorage, 'size', side_effect=AssertionError('storage hit')), \
+                mock.patch.object(FileSystemStorage, 'exists', side_effect=AssertionError('storage hit')):
+            response = self.client.get('/api/documents/')
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_backfill_command_records_missing_metadata(self):
+        document = Document.objects.create(name='Old', file=SimpleUploadedFile('old.txt', b'legacy upload'))
+        out = StringIO()
+
+        call_command('backfill_document_metadata', stdout=out)
+
+        document.refresh_from_db()
+        self.assertEqual(document.file_size_bytes, len(b'legacy upload'))
+        self.assertEqual(document.mime_type, 'text/plain')
+        self.assertIn('Backfilled metadata for 1 documents', out.getvalue())
+
+    @skipUnless(PYPDF_AVAILABLE, 'pypdf is not installed')
+    def test_backfill_counts_pdf_pages_from_the_file_path(self):
+        from pypdf import PdfWriter
+        writer = PdfWriter()
+        for _ in range(3):
+            writer.add_blank_page(width=200, height=200)
+        buffer = BytesIO()
+        writer.write(buffer)
+        document = Document.objects.create(name='Bundle', file=SimpleUploadedFile('bundle.pdf', buffer.getvalue()))
+
+        with mock.patch('documents.management.commands.backfill_document_metadata.count_pdf_pages',
+                        wraps=count_pdf_pages) as count:
+            call_command('backfill_document_metadata', stdout=StringIO())
+
+        count.assert_called_once_with(document.file.path)
+        document.refresh_from_db()
+        self.assertEqual(document.page_count, 3)
@@ -0,0 +1,69 @@
+import io
+import tempfile
+
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from documents.models import Document
+from documents.previews import make_snippet
+from documents.processing import run_pipeline
+
+
+def png_bytes(size=(1200, 800)):
+    output = io.BytesIO()
+    Image.new('RGB', size, 'white').save(output, format='PNG')
+    return output.getvalue()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PreviewTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='attorney@example.com', password='secret', first_name='Ada', last_name='Moyo', role='attorney'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, name, content):
+        document = Document.objects.create(
+            name=name, file=SimpleUploadedFile(name, content), uploaded_by=self.user
+        )
+        run_pipeline(document)
+        document.refresh_from_db()
+        return document
+
+    def test_snippet_collapses_whitespace_and_cuts_at_a_word(self):
+        self.assertEqual(make_snippet('  IN THE\n\nHIGH   COURT  '), 'IN THE HIGH COURT')
+        self.assertEqual(make_snippet('alpha beta gamma', length=12), 'alpha beta…')
+
+    def test_images_get_a_scaled_thumbnail_next_to_the_file(self):
+        document = self.create('scan.png', png_bytes())
+
+        self.assertTrue(document.thumbnail.name.startswith('documents/uncategorized/previews/'))
+        with document.thumbnail.open('rb') as f:
+            self.assertEqual(Image.open(f).size, (320, 213))
+
+    def test_text_documents_get_a_snippet_but_no_thumbnail(self):
+        document = self.create('notes.txt', b'Heads of argument for the appellant.')
+
+        self.assertFalse(document.thumbnail)
+        self.assertEqual(document.preview_snippet, 'Heads of argument for the appellant.')
+        self.assertIsNone(self.client.get(f'/api/documents/{document.pk}/').json()['preview_url'])
+        self.assertEqual(self.client.get(f'/api/documents/{document.pk}/preview/').status_code, 404)
+
+    def test_previews_are_served_with_long_lived_cache_headers(self):
+        document = self.create('scan.png', png_bytes())
+        preview_url = self.client.get(f'/api/documents/{document.pk}/').json()['preview_url']
+        self.assertIn('?v=', preview_url)
+
+        response = self.client.get(preview_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        cached = self.client.get(preview_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
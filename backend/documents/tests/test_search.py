@@ -0,0 +1,76 @@
+import tempfile
+from unittest import mock, skipUnless
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from cases.models import Case
+from clients.models import Client
+from documents.models import Document
+from documents.search import update_search_vector
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+@mock.patch('documents.views.schedule_processing')
+class DocumentSearchTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='attorney@example.com', password='secret', first_name='Ada', last_name='Moyo', role='attorney'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        client = Client.objects.create(first_name='Rudo', last_name='Chikore')
+        self.case = Case.objects.create(title='Chikore v Mutasa', client=client)
+
+    def upload(self, name, description='', doc_type='contract', case=None):
+        data = {'name': name, 'description': description, 'doc_type': doc_type, 'file': SimpleUploadedFile(f'{name}.txt', name.encode())}
+        if case:
+            data['case'] = case.pk
+        response = self.client.post('/api/documents/', data, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return Document.objects.get(pk=response.json()['id'])
+
+    def test_search_returns_matches_with_facets(self, schedule_processing):
+        self.upload('Lease agreement', doc_type='contract', case=self.case)
+        self.upload('Lease renewal', description='Renewal notice for the lease', doc_type='correspondence')
+        self.upload('Founding affidavit', doc_type='court', case=self.case)
+
+        response = self.client.get('/api/documents/search/', {'q': 'lease'})
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['count'], 2)
+        self.assertEqual({result['name'] for result in body['results']}, {'Lease agreement', 'Lease renewal'})
+        self.assertEqual(
+            {facet['value']: facet['count'] for facet in body['facets']['doc_type']}, {'contract': 1, 'correspondence': 1}
+        )
+        self.assertEqual({case['id']: case['count'] for case in body['facets']['case']}, {self.case.pk: 1, None: 1})
+
+    def test_search_respects_list_filters_and_paging(self, schedule_processing):
+        for number in range(3):
+            self.upload(f'Lease {number}', case=self.case)
+        self.upload('Lease elsewhere')
+
+        response = self.client.get('/api/documents/search/', {'q': 'lease', 'caseId': self.case.pk, 'limit': 2})
+
+        body = response.json()
+        self.assertEqual(body['count'], 3)
+        self.assertEqual(len(body['results']), 2)
+
+    def test_search_requires_text(self, schedule_processing):
+        self.assertEqual(self.client.get('/api/documents/search/').status_code, 400)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Full-text search needs PostgreSQL')
+    def test_extracted_text_is_searched_and_highlighted(self, schedule_processing):
+        document = self.upload('Exhibit A')
+        Document.objects.filter(pk=document.pk).update(extracted_text='The tenant shall pay rent on the first day.')
+        update_search_vector(document)
+
+        body = self.client.get('/api/documents/search/', {'q': 'tenants paying rent'}).json()
+
+        self.assertEqual([result['id'] for result in body['results']], [document.pk])
+        self.assertIn('<mark>', body['results'][0]['highlight'])
@@ -0,0 +1,68 @@
+import random
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from documents.models import Document, DocumentLSHBucket
+from documents.processing import process_document, find_similar_documents
+from documents.similarity import (
+    BANDS, minhash_signature, estimate_similarity, band_buckets,
+)
+
+
+def make_text(seed, words=800):
+    rng = random.Random(seed)
+    return ' '.join(f'term{rng.randrange(3000)}' for _ in range(words))
+
+
+def edit(text, changes, seed=0):
+    rng = random.Random(seed)
+    words = text.split()
+    for _ in range(changes):
+        words[rng.randrange(len(words))] = 'amended'
+    return ' '.join(words)
+
+
+class SignatureTests(SimpleTestCase):
+
+    def test_similarity_estimates_track_edits(self):
+        original = make_text(1)
+        signature = minhash_signature(original)
+
+        self.assertEqual(estimate_similarity(signature, minhash_signature(original)), 1.0)
+        self.assertGreater(estimate_similarity(signature, minhash_signature(edit(original, 5))), 0.8)
+        self.assertLess(estimate_similarity(signature, minhash_signature(make_text(2))), 0.1)
+        self.assertIsNone(minhash_signature('  '))
+
+    def test_near_duplicates_share_buckets(self):
+        original = band_buckets(minhash_signature(make_text(1)))
+        draft = band_buckets(minhash_signature(edit(make_text(1), 5)))
+        unrelated = band_buckets(minhash_signature(make_text(2)))
+
+        self.assertEqual(len(original), BANDS)
+        self.assertTrue(set(original) & set(draft))
+        self.assertFalse(set(original) & set(unrelated))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class FindSimilarDocumentsTests(TestCase):
+
+    def create(self, name, text):
+        document = Document.objects.create(
+            name=name, file=SimpleUploadedFile(f'{name}.txt', text.encode('utf-8'))
+        )
+        process_document(document)
+        return document
+
+    def test_finds_drafts_through_the_lsh_index(self):
+        agreement = make_text(1)
+        original = self.create('lease', agreement)
+        draft = self.create('lease-v2', edit(agreement, 5))
+        self.create('will', make_text(2))
+
+        similar = find_similar_documents(original)
+
+        self.assertEqual([document for document, _ in similar], [draft])
+        self.assertEqual(DocumentLSHBucket.objects.filter(document=original).count(), BANDS)
+        self.assertIn('term', Document.objects.get(pk=original.pk).extracted_text)
@@ -0,0 +1,93 @@
+import hashlib
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from documents.models import Document
+from documents.storage import blob_name
+
+CONTENT = b'%PDF-1.4\n' + b'judgment ' * 500
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ContentAddressedStorageTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='clerk@example.com', password='secret', first_name='Tendai', last_name='Dube', role='paralegal'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.blob = blob_name(hashlib.sha256(CONTENT).hexdigest(), 'x.pdf')
+
+    def upload(self, filename, content=CONTENT):
+        response = self.client.post('/api/documents/', {
+            'name': filename, 'file': SimpleUploadedFile(filename, content),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return Document.objects.get(pk=response.json()['id'])
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.upload('judgment.pdf')
+        second = self.upload('copy of judgment.pdf')
+
+        self.assertEqual(first.file.name, self.blob)
+        self.assertEqual(second.file.name, self.blob)
+        self.assertEqual(second.original_filename, 'copy of judgment.pdf')
+        self.assertEqual(os.listdir(os.path.dirname(default_storage.path(self.blob))), [os.path.basename(self.blob)])
+
+    def test_blob_is_deleted_with_its_last_reference(self):
+        first = self.upload('judgment.pdf')
+        second = self.upload('judgment.pdf')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(self.blob))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(self.blob))
+
+    def test_replacing_a_file_releases_the_old_blob(self):
+        document = self.upload('judgment.pdf')
+
+        # The old file is released once its version is compressed, here inline rather than on the worker pool
+        with mock.patch('documents.views.schedule_processing'), \
+                mock.patch('documents.processing._submit', lambda task, object_id, skipped: task(object_id)), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/documents/{document.pk}/', {
+                'file': SimpleUploadedFile('amended.pdf', CONTENT + b'amended'),
+            }, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(default_storage.exists(self.blob))
+        document.refresh_from_db()
+        self.assertTrue(default_storage.exists(document.file.name))
+
+    def test_dedupe_command_moves_legacy_files_into_blobs(self):
+        legacy = [
+            Document.objects.create(name=f'Legacy {number}', file=SimpleUploadedFile('judgment.pdf', CONTENT))
+            for number in range(3)
+        ]
+        old_names = {document.file.name for document in legacy}
+        self.assertEqual(len(old_names), 3)
+        out = StringIO()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('dedupe_document_storage', stdout=out)
+
+        for document in legacy:
+            document.refresh_from_db()
+            self.assertEqual(document.file.name, self.blob)
+            self.assertEqual(document.original_filename, 'judgment.pdf')
+        self.assertFalse(any(default_storage.exists(name) for name in old_names))
+        self.assertEqual(default_storage.open(self.blob).read(), CONTENT)
+        self.assertIn('Moved 3 documents into the blob store and removed 3 old files', out.getvalue())
@@ -0,0 +1,146 @@
+import os
+import random
+import tempfile
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from documents.delta import make_delta, apply_delta, DeltaTooLarge
+from documents.models import Document
+from documents.versions import compress_version
+
+
+def revise(content: bytes, seed: int) -> bytes:
+    """Return content with a few small insertions, deletions and replacements"""
+    rng = random.Random(seed)
+    revised = bytearray(content)
+    for _ in range(5):
+        position = rng.randrange(len(revised))
+        revised[position:position + rng.randrange(0, 40)] = rng.randbytes(rng.randrange(0, 60))
+    return bytes(revised)
+
+
+class DeltaTests(SimpleTestCase):
+
+    def test_round_trips_edits_compactly(self):
+        base = random.Random(1).randbytes(200_000)
+        target = revise(base, 2)
+
+        delta = make_delta(base, target)
+
+        self.assertEqual(apply_delta(base, delta), target)
+        self.assertLess(len(delta), 2000)
+
+    def test_round_trips_edge_cases(self):
+        for base, target in [(b'', b'new'), (b'old', b''), (b'same' * 100, b'same' * 100), (b'abc' * 50, b'xyz' * 50)]:
+            self.assertEqual(apply_delta(base, make_delta(base, target)), target)
+
+    def test_gives_up_on_unrelated_files(self):
+        rng = random.Random(3)
+        with self.assertRaises(DeltaTooLarge):
+            make_delta(rng.randbytes(50_000), rng.randbytes(50_000), max_literal_bytes=25_000)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+@mock.patch('documents.views.schedule_processing')
+# Compress versions inline, once the replacement commits, rather than on the worker pool
+@mock.patch('documents.processing._submit', lambda task, object_id, skipped: task(object_id))
+class DocumentVersionTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='attorney@example.com', password='secret', first_name='Ada', last_name='Moyo', role='attorney'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.original = random.Random(4).randbytes(100_000)
+        response = self.client.post('/api/documents/', {
+            'name': 'Lease', 'file': SimpleUploadedFile('lease.pdf', self.original),
+        }, format='multipart')
+        self.document = Document.objects.get(pk=response.json()['id'])
+
+    def replace_file(self, content, filename='lease.pdf'):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/documents/{self.document.pk}/', {
+                'file': SimpleUploadedFile(filename, content),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.document.refresh_from_db()
+
+    def test_replacing_a_file_keeps_the_previous_version_as_a_delta(self, schedule_processing):
+        old_blob = self.document.file.name
+        self.replace_file(revise(self.original, 5), 'lease-amended.pdf')
+
+        versions = self.client.get(f'/api/documents/{self.document.pk}/versions/').json()
+        self.assertEqual(versions['current_version'], 2)
+        [version] = versions['versions']
+        self.assertEqual(version['storage'], 'delta')
+        self.assertEqual(version['original_filename'], 'lease.pdf')
+        self.assertLess(version['stored_bytes'], 2000)
+        # Only the current file stays in storage
+        self.assertFalse(default_storage.exists(old_blob))
+
+        response = self.client.get(f'/api/documents/{self.document.pk}/versions/1/file/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.original)
+
+    def test_snapshots_bound_the_delta_chain(self, schedule_processing):
+        contents = [self.original]
+        with mock.patch('documents.versions.SNAPSHOT_INTERVAL', 2):
+            for seed in range(4):
+                contents.append(revise(contents[-1], seed))
+                self.replace_file(contents[-1])
+
+        storage = {version.version_number: version.is_snapshot for version in self.document.versions.all()}
+        self.assertEqual(storage, {1: False, 2: True, 3: False, 4: True})
+        for number in range(1, 5):
+            response = self.client.get(f'/api/documents/{self.document.pk}/versions/{number}/file/')
+            self.assertEqual(response.content, contents[number - 1])
+
+    def test_request_only_records_a_snapshot(self, schedule_processing):
+        old_blob = self.document.file.name
+        with mock.patch('documents.views.schedule_version_compression') as schedule_version_compression:
+            self.replace_file(revise(self.original, 5))
+
+        version = self.document.versions.get()
+        self.assertTrue(version.is_snapshot)
+        self.assertEqual(version.file.name, old_blob)
+        schedule_version_compression.assert_called_once_with(version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(compress_version(version))
+        version.refresh_from_db()
+        self.assertFalse(version.is_snapshot)
+        self.assertFalse(default_storage.exists(old_blob))
+        self.assertEqual(self.client.get(f'/api/documents/{self.document.pk}/versions/1/file/').content, self.original)
+
+    def test_large_files_are_kept_as_snapshots(self, schedule_processing):
+        with mock.patch('documents.versions.MAX_DELTA_FILE_SIZE', 50_000):
+            self.replace_file(revise(self.original, 5))
+
+        self.assertTrue(self.document.versions.get().is_snapshot)
+
+    def test_unrelated_replacement_is_kept_as_a_snapshot(self, schedule_processing):
+        self.replace_file(random.Random(6).randbytes(100_000))
+
+        version = self.document.versions.get()
+        self.assertTrue(version.is_snapshot)
+        self.assertTrue(default_storage.exists(version.file.name))
+
+    def test_text_diff_between_versions(self, schedule_processing):
+        Document.objects.filter(pk=self.document.pk).update(extracted_text='Rent is due monthly.\nTerm: 12 months.')
+        self.document.refresh_from_db()
+        self.replace_file(revise(self.original, 7))
+        Document.objects.filter(pk=self.document.pk).update(extracted_text='Rent is due monthly.\nTerm: 24 months.')
+
+        response = self.client.get(f'/api/documents/{self.document.pk}/diff/')
+
+        self.assertEqual(response.status_code, 200)
+        diff = response.json()['diff']
+        self.assertIn('-Term: 12 months.', diff)
+        self.assertIn('+Term: 24 months.', diff)
+        self.assertEqual(self.client.get(f'/api/documents/{self.document.pk}/diff/?from=9').status_code, 404)
@@ -0,0 +1,163 @@
+"""
+Version history of documents.
+
+When a document's file is replaced, its current file is kept as a
+DocumentVersion snapshot, which only references the existing blob. The
+snapshot is then compressed on the processing pool into a reverse binary
+delta against the next newer version, except every SNAPSHOT_INTERVAL-th
+version, files over MAX_DELTA_FILE_SIZE and versions whose delta would not
+save much, so history grows with the size of the edits without diffing
+files in the request. The extracted text of each version is kept,
+compressed, for text diffs.
+"""
+import difflib
+import hashlib
+import zlib
+
+from django.db import transaction
+
+from .delta import make_delta, apply_delta, DeltaTooLarge, DeltaError
+from .models import Document, DocumentVersion
+from .storage import release_blob_on_commit
+
+# Every SNAPSHOT_INTERVAL-th version is kept whole, bounding the deltas applied to rebuild a version
+SNAPSHOT_INTERVAL = 10
+
+# A version is kept whole when its delta would be larger than this fraction of its file
+MAX_DELTA_RATIO = 0.5
+
+# Larger versions are kept whole rather than diffed
+MAX_DELTA_FILE_SIZE = 64 * 1024 * 1024
+
+
+class VersionError(Exception):
+    """Raised when a stored version cannot be rebuilt."""
+
+
+def _read_stored(file_field) -> bytes:
+    with file_field.open('rb') as f:
+        return f.read()
+
+
+def record_version(document: Document, user=None) -> DocumentVersion:
+    """
+    Keep a document's current file as a version snapshot before it is replaced.
+
+    Must run in the same transaction as the save replacing the file, so the
+    snapshot's file is referenced before the replaced file is released.
+
+    Args:
+        document: Document whose file is about to be replaced
+        user: User replacing the file
+
+    Returns:
+        The new DocumentVersion. The document's version_number is advanced
+        but not saved.
+    """
+    number = document.version_number
+    version = DocumentVersion(
+        document=document,
+        version_number=number,
+        original_filename=document.original_filename,
+        file_size_bytes=document.file_size_bytes,
+        content_hash=document.content_hash,
+        mime_type=document.mime_type,
+        text=zlib.compress(document.extracted_text.encode('utf-8')),
+        superseded_by=user,
+        # Stored files are content-addressed, so this only adds a reference to the existing blob
+        file=document.file.name,
+    )
+    version.save()
+    document.version_number = number + 1
+    return version
+
+
+def compress_version(version: DocumentVersion) -> bool:
+    """
+    Replace a version snapshot with a reverse delta against the next newer
+    version, releasing its file. Snapshots kept whole by the rules above
+    are left alone.
+
+    Returns:
+        Whether the version was compressed
+    """
+    if not version.is_snapshot or version.version_number % SNAPSHOT_INTERVAL == 0:
+        return False
+    if not version.file_size_bytes or version.file_size_bytes > MAX_DELTA_FILE_SIZE:
+        return False
+
+    name = version.file.name
+    old_content = _read_stored(version.file)
+    limit = int(len(old_content) * MAX_DELTA_RATIO)
+    try:
+        delta = make_delta(_next_content(version), old_content, max_literal_bytes=limit)
+    except DeltaTooLarge:
+        return False
+    if len(delta) > limit:
+        return False
+
+    with transaction.atomic():
+        # Another worker may have compressed the version meanwhile
+        compressed = DocumentVersion.objects.filter(pk=version.pk, file=name).update(delta=delta, file='')
+        if compressed:
+            release_blob_on_commit(version.file.storage, name)
+    return bool(compressed)
+
+
+def _next_content(version: DocumentVersion) -> bytes:
+    """Content of the version following a version: the next stored one, or the current file"""
+    number = version.version_number + 1
+    document = Document.objects.only('file', 'content_hash', 'version_number').get(pk=version.document_id)
+    if document.version_number != number:
+        return version_content(document.versions.get(version_number=number))
+    content = _read_stored(document.file)
+    if hashlib.sha256(content).hexdigest() != document.content_hash:
+        # Replaced while being read; the next version now holds the content
+        return version_content(document.versions.get(version_number=number))
+    return content
+
+
+def version_content(version: DocumentVersion) -> bytes:
+    """Rebuild the file of a version from the nearest newer snapshot or the current file"""
+    chain = []
+    content = None
+    newer = DocumentVersion.objects.filter(
+        document_id=version.document_id, version_number__gte=version.version_number
+    ).defer('text').order_by('version_number')
+    for candidate in newer:
+        if candidate.is_snapshot:
+            content = _read_stored(candidate.file)
+            break
+        chain.append(candidate)
+    if content is None:
+        content = _read_stored(version.document.file)
+
+    try:
+        for candidate in reversed(chain):
+            content = apply_delta(content, candidate.delta)
+    except DeltaError as e:
+        raise VersionError(f"Version {version.version_number} of document {version.document_id} is corrupt: {e}")
+
+    if version.content_hash and hashlib.sha256(content).hexdigest() != version.content_hash:
+        raise VersionError(f"Version {version.version_number} of document {version.document_id} failed verification")
+    return content
+
+
+def version_text(document: Document, version_number: int) -> str:
+    """
+    Return the extracted text of a version, the current one included.
+    Raises DocumentVersion.DoesNotExist for unknown versions.
+    """
+    if version_number == document.version_number:
+        return document.extracted_text
+    version = document.versions.only('text').get(version_number=version_number)
+    return zlib.decompress(version.text).decode('utf-8') if version.text else ''
+
+
+def text_diff(document: Document, from_version: int, to_version: int, context: int = 3) -> str:
+    """Unified diff between the extracted text of two versions of a document"""
+    old_lines = version_text(document, from_version).splitlines()
+    new_lines = version_text(document, to_version).splitlines()
+    return '\n'.join(difflib.unified_diff(
+        old_lines, new_lines, fromfile=f'v{from_version}', tofile=f'v{to_version}', n=context, lineterm=''
+    ))
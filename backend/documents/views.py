@@ -1,11 +1,42 @@
+import json
 from django.shortcuts import render
-from rest_framework import viewsets, permissions, status
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.urls import reverse
+from rest_framework import viewsets, permissions, status, renderers
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from django.db.models import Q
-from .models import Document
+from django.db import transaction
+from django.db.models import Q, Exists, OuterRef
+from django.utils.http import content_disposition_header
+from cases.models import Case
+from .models import Document, DocumentVersion
 from .serializers import DocumentSerializer
+from .processing import schedule_processing, schedule_version_compression, find_similar_documents, file_metadata
+from .similarity import DEFAULT_THRESHOLD
+from .downloads import serve_file
+from .versions import record_version, version_content, text_diff, VersionError
+from .search import filter_search, ranked_search, update_search_vector
+from .facets import selected_facets, filter_facets, facet_counts
+
+
+class PassthroughRenderer(renderers.BaseRenderer):
+    """
+    Accepts any media type so file endpoints are not rejected with 406 when a
+    client asks for e.g. application/pdf. File responses bypass rendering;
+    error payloads are rendered as JSON.
+    """
+    media_type = '*/*'
+    format = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode('utf-8') if data is not None else b''
+
+def parse_paging(query_params, default_limit=20, max_limit=100):
+    """Read `limit` and `offset` from query parameters; raises ValueError if they are not integers"""
+    limit = min(max(int(query_params.get('limit', default_limit)), 0), max_limit)
+    offset = max(int(query_params.get('offset', 0)), 0)
+    return limit, offset
 
 class DocumentViewSet(viewsets.ModelViewSet):
     """
@@ -16,51 +47,118 @@ class DocumentViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
     
-    def get_queryset(self):
+    def get_base_queryset(self):
         """
-        Optionally restricts the returned documents to a given user,
-        by filtering against a `case` or `client` query parameter in the URL.
-        Also filters by user's organization or direct access.
+        Documents visible to the user, narrowed by the `search` text but not
+        by the case, client or document type filters.
         """
-        queryset = Document.objects.all() 
-        
-        # Restrict to documents uploaded by the user or visible to their organization
-        # Unless the user is an admin, who can see all documents
+        queryset = Document.objects.all()
+
+        # Restrict to documents uploaded by the user or on cases they are assigned to,
+        # unless the user is an admin, who can see all documents. Exists keeps one row
+        # per document, so no DISTINCT is needed over the result
         if not self.request.user.is_staff:
-            queryset = queryset.filter(
-                Q(uploaded_by=self.request.user) | 
-                Q(case__assigned_attorneys=self.request.user)
-            ).distinct()
-        
-        # Filter by case ID
-        case_id = self.request.query_params.get('caseId')
-        if case_id:
-            queryset = queryset.filter(case_id=case_id)
-            
-        # Filter by client ID
-        client_id = self.request.query_params.get('clientId')
-        if client_id:
-            queryset = queryset.filter(case__client_id=client_id)
-            
-        # Filter by document type
-        doc_type = self.request.query_params.get('docType')
-        if doc_type:
-            queryset = queryset.filter(doc_type=doc_type)
-            
-        # Search by name or description
+            assigned = Case.assigned_attorneys.through.objects.filter(
+                case_id=OuterRef('case_id'), user_id=self.request.user.pk
+            )
+            queryset = queryset.filter(Q(uploaded_by=self.request.user) | Exists(assigned))
+
+        # Full-text search over name, description and content
         search = self.request.query_params.get('search')
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | 
-                Q(description__icontains=search)
-            )
+            queryset = filter_search(queryset, search)
 
         return queryset
-    
+
+    def get_queryset(self):
+        """
+        Documents visible to the user, optionally filtered by the `caseId`,
+        `clientId` and `docType` query parameters and by `search` text.
+        """
+        queryset = filter_facets(self.get_base_queryset(), selected_facets(self.request.query_params))
+        if self.action in ('list', 'retrieve'):
+            # Serialized documents never include the full text, signature or search vector
+            queryset = queryset.defer('extracted_text', 'minhash', 'search_vector')
+        return queryset
+
     def perform_create(self, serializer):
         """Save the document with the current user as uploader"""
-        serializer.save(uploaded_by=self.request.user)
+        metadata = file_metadata(serializer.validated_data['file'])
+        document = serializer.save(uploaded_by=self.request.user, **metadata)
+        update_search_vector(document)
+        schedule_processing(document)
+
+    def perform_update(self, serializer):
+        """Save the document, keeping the previous version and re-processing it when its file is replaced"""
+        if 'file' in serializer.validated_data:
+            metadata = file_metadata(serializer.validated_data['file'])
+            with transaction.atomic():
+                if metadata['content_hash'] != serializer.instance.content_hash:
+                    schedule_version_compression(record_version(serializer.instance, self.request.user))
+                document = serializer.save(**metadata)
+            update_search_vector(document)
+            schedule_processing(document)
+        else:
+            update_search_vector(serializer.save())
         
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Ranked full-text search with highlighted snippets and facet counts.
+        Takes the search text as `q`, the usual list filters, and `limit`/`offset`.
+        """
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit, offset = parse_paging(request.query_params)
+        except ValueError:
+            return Response({'error': 'limit and offset must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        selected = selected_facets(request.query_params)
+        matches = ranked_search(self.get_base_queryset(), text)
+        facets = facet_counts(matches, selected)
+        page = filter_facets(matches, selected).select_related('uploaded_by', 'case').defer(
+            'extracted_text', 'minhash', 'search_vector'
+        )[offset:offset + limit]
+        return Response({
+            'count': facets.pop('total'),
+            'results': [
+                {
+                    **self.get_serializer(document).data,
+                    'rank': round(document.search_rank, 4),
+                    'highlight': document.search_highlight,
+                }
+                for document in page
+            ],
+            'facets': facets,
+        })
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        A page of the filtered document list together with the counts of every
+        case, client and document type facet. Each facet's counts apply the
+        other facets' filters but not its own. Takes the usual list filters
+        and `limit`/`offset`.
+        """
+        try:
+            limit, offset = parse_paging(request.query_params)
+        except ValueError:
+            return Response({'error': 'limit and offset must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        selected = selected_facets(request.query_params)
+        base = self.get_base_queryset()
+        facets = facet_counts(base, selected)
+        page = filter_facets(base, selected).select_related('uploaded_by', 'case').defer(
+            'extracted_text', 'minhash', 'search_vector'
+        )[offset:offset + limit]
+        return Response({
+            'count': facets.pop('total'),
+            'results': self.get_serializer(page, many=True).data,
+            'facets': facets,
+        })
+
     @action(detail=True, methods=['get'])
     def download(self, request, pk=None):
         """
@@ -69,5 +167,135 @@ class DocumentViewSet(viewsets.ModelViewSet):
         document = self.get_object()
         return Response({
             'file_url': request.build_absolute_uri(document.file.url),
+            'download_url': request.build_absolute_uri(reverse('document-file', args=[document.pk])),
             'name': document.name
         })
+
+    @action(detail=True, methods=['get'], url_path='file',
+            renderer_classes=[renderers.JSONRenderer, PassthroughRenderer])
+    def file_content(self, request, pk=None):
+        """
+        Serve the document's file, honouring Range and If-None-Match so PDF
+        viewers can fetch individual byte ranges of large files. Add
+        ?download=1 to have the browser save the file.
+        """
+        document = self.get_object()
+        size = document.file_size_bytes if document.file_size_bytes is not None else document.file.size
+        if document.content_hash:
+            etag = f'"{document.content_hash}"'
+        else:
+            etag = f'"{document.pk}-{size}-{int(document.updated_at.timestamp())}"'
+        return serve_file(
+            request,
+            document.file,
+            size=size,
+            etag=etag,
+            content_type=document.mime_type or 'application/octet-stream',
+            filename=document.original_filename or document.file.name,
+            as_attachment=request.query_params.get('download') in ('1', 'true'),
+        )
+
+    @action(detail=True, methods=['get'])
+    def versions(self, request, pk=None):
+        """List the previous versions of the document's file, newest first"""
+        document = self.get_object()
+        versions = document.versions.defer('text').select_related('superseded_by')
+        return Response({
+            'current_version': document.version_number,
+            'versions': [
+                {
+                    'version_number': version.version_number,
+                    'original_filename': version.original_filename,
+                    'file_size_bytes': version.file_size_bytes,
+                    'content_hash': version.content_hash,
+                    'mime_type': version.mime_type,
+                    'storage': 'snapshot' if version.is_snapshot else 'delta',
+                    'stored_bytes': len(version.delta) if version.delta else 0,
+                    'superseded_at': version.superseded_at,
+                    'superseded_by_name': (
+                        f"{version.superseded_by.first_name} {version.superseded_by.last_name}"
+                        if version.superseded_by else None
+                    ),
+                }
+                for version in versions
+            ],
+        })
+
+    @action(detail=True, methods=['get'], url_path=r'versions/(?P<version_number>[0-9]+)/file',
+            renderer_classes=[renderers.JSONRenderer, PassthroughRenderer])
+    def version_file(self, request, pk=None, version_number=None):
+        """Download the file of a previous version, rebuilt from its deltas"""
+        document = self.get_object()
+        try:
+            version = document.versions.defer('text').get(version_number=int(version_number))
+        except DocumentVersion.DoesNotExist:
+            return Response({'error': 'Version not found'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            content = version_content(version)
+        except VersionError as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        response = HttpResponse(content, content_type=version.mime_type or 'application/octet-stream')
+        if version.content_hash:
+            response['ETag'] = f'"{version.content_hash}"'
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+        response['Content-Disposition'] = content_disposition_header(
+            request.query_params.get('download') in ('1', 'true'),
+            version.original_filename or f'{document.name}-v{version.version_number}'
+        )
+        return response
+
+    @action(detail=True, methods=['get'])
+    def diff(self, request, pk=None):
+        """
+        Text diff between two versions of the document, computed from their
+        extracted text. `from` and `to` default to the previous and current versions.
+        """
+        document = self.get_object()
+        try:
+            to_version = int(request.query_params.get('to', document.version_number))
+            from_version = int(request.query_params.get('from', to_version - 1))
+        except ValueError:
+            return Response({'error': 'from and to must be version numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            diff = text_diff(document, from_version, to_version)
+        except DocumentVersion.DoesNotExist:
+            return Response({'error': 'Version not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'from': from_version, 'to': to_version, 'diff': diff})
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """
+        List the near-duplicates of a document among those visible to the user.
+        Accepts an optional `threshold` (estimated Jaccard similarity, 0-1).
+        """
+        document = self.get_object()
+        try:
+            threshold = float(request.query_params.get('threshold', DEFAULT_THRESHOLD))
+        except ValueError:
+            return Response({'error': 'threshold must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        similar = find_similar_documents(document, self.get_queryset(), threshold)
+        return Response([
+            {**self.get_serializer(candidate).data, 'similarity': round(similarity, 3)}
+            for candidate, similarity in similar
+        ])
+
+    @action(detail=True, methods=['get'], renderer_classes=[renderers.JSONRenderer, PassthroughRenderer])
+    def preview(self, request, pk=None):
+        """
+        Serve the document's preview thumbnail. The URL given by the serializer
+        changes whenever the preview is regenerated, so it can be cached for good.
+        """
+        document = self.get_object()
+        if not document.thumbnail:
+            return Response({'error': 'No preview available'}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = f'"{document.pk}-{int(document.preview_generated_at.timestamp())}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(document.thumbnail.open('rb'), content_type='image/png')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+        return response
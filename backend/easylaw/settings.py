@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
@@ -9,6 +10,9 @@ load_dotenv()
 # Build paths inside the project
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Running under `manage.py test`
+TESTING = sys.argv[1:2] == ['test']
+
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', 'django-insecure-default-development-key')
 
@@ -92,6 +96,22 @@ DATABASES = {
     }
 }
 
+# Shared cache (Redis when REDIS_URL is set, e.g. redis://redis:6379/0). The
+# real-time analytics metrics are aggregated across workers through it.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Auth user model
 AUTH_USER_MODEL = 'accounts.User'
 
@@ -160,6 +180,51 @@ EXTERNAL_API_URL = os.environ.get('EXTERNAL_API_URL', 'http://localhost:8001')
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', '')
 
+# Document processing (text extraction, similarity index and previews) runs on a
+# bounded background worker pool; uploads beyond the queue size are left for the
+# process_documents command
+DOCUMENT_PROCESSING_WORKERS = int(os.environ.get('DOCUMENT_PROCESSING_WORKERS', '2'))
+DOCUMENT_PROCESSING_QUEUE_SIZE = int(os.environ.get('DOCUMENT_PROCESSING_QUEUE_SIZE', '100'))
+
+# Internal nginx location mapped onto MEDIA_ROOT (e.g. '/protected-media/'). When set,
+# document downloads are handed to nginx with X-Accel-Redirect instead of being
+# served by Django
+DOCUMENT_ACCEL_REDIRECT_PREFIX = os.environ.get('DOCUMENT_ACCEL_REDIRECT_PREFIX', '')
+
+# PostgreSQL text search configuration used to index and query documents
+DOCUMENT_SEARCH_CONFIG = os.environ.get('DOCUMENT_SEARCH_CONFIG', 'english')
+
+# API usage and user activity records are queued and written in batches by
+# background threads. Records are dropped (and counted) when a queue is full.
+# Tests write them synchronously, inside each test's transaction.
+ANALYTICS_USAGE_ASYNC = os.environ.get('ANALYTICS_USAGE_ASYNC', str(not TESTING)) == 'True'
+ANALYTICS_ACTIVITY_ASYNC = os.environ.get('ANALYTICS_ACTIVITY_ASYNC', str(not TESTING)) == 'True'
+ANALYTICS_USAGE_BATCH_SIZE = int(os.environ.get('ANALYTICS_USAGE_BATCH_SIZE', '200'))
+ANALYTICS_USAGE_FLUSH_INTERVAL_MS = int(os.environ.get('ANALYTICS_USAGE_FLUSH_INTERVAL_MS', '1000'))
+ANALYTICS_USAGE_QUEUE_SIZE = int(os.environ.get('ANALYTICS_USAGE_QUEUE_SIZE', '10000'))
+ANALYTICS_USAGE_ENQUEUE_TIMEOUT_MS = int(os.environ.get('ANALYTICS_USAGE_ENQUEUE_TIMEOUT_MS', '5'))
+
+# Real-time metrics buffered by each process are flushed to the cache at least this often
+ANALYTICS_METRICS_FLUSH_INTERVAL_MS = int(os.environ.get('ANALYTICS_METRICS_FLUSH_INTERVAL_MS', '5000'))
+
+# Which request bodies are stored with API usage records (see analytics/capture_policy.py)
+ANALYTICS_CAPTURE = {
+    'SAMPLE_RATE': float(os.environ.get('ANALYTICS_CAPTURE_SAMPLE_RATE', '0.1')),
+    'MAX_BYTES': int(os.environ.get('ANALYTICS_CAPTURE_MAX_BYTES', '8192')),
+    'KEYS_ONLY': True,
+    'CONTENT_TYPES': ['application/json'],
+    'ENDPOINTS': [
+        # Credentials are never captured
+        {'pattern': r'^/api/(auth|accounts)/', 'sample_rate': 0},
+    ],
+}
+
+# Raw APIUsage and UserActivity rows older than this many months (and already
+# rolled up) are exported to ANALYTICS_ARCHIVE_DIR and removed by the
+# archive_analytics command. On PostgreSQL the tables are partitioned by month.
+ANALYTICS_RETENTION_MONTHS = int(os.environ.get('ANALYTICS_RETENTION_MONTHS', '13'))
+ANALYTICS_ARCHIVE_DIR = os.environ.get('ANALYTICS_ARCHIVE_DIR', os.path.join(BASE_DIR, 'analytics_archive'))
+
 # Security settings
 SECURE_SSL_REDIRECT = os.environ.get('DJANGO_SECURE_SSL_REDIRECT', 'False') == 'True'
 SESSION_COOKIE_SECURE = os.environ.get('DJANGO_SESSION_COOKIE_SECURE', 'False') == 'True'
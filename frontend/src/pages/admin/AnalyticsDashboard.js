@@ -148,6 +148,8 @@ const AnalyticsDashboard = () => {
     const icons = {
       'Total Users': UsersIcon,
       'Active Users (24h)': UsersIcon,
+      'Active Users (7d)': UsersIcon,
+      'Active Users (30d)': UsersIcon,
       'Documents Processed': DocumentDuplicateIcon,
       'Avg. API Response Time': ClockIcon
     };
@@ -155,6 +157,8 @@ const AnalyticsDashboard = () => {
     const colors = {
       'Total Users': 'bg-blue-500',
       'Active Users (24h)': 'bg-green-500',
+      'Active Users (7d)': 'bg-green-500',
+      'Active Users (30d)': 'bg-green-500',
       'Documents Processed': 'bg-indigo-500',
       'Avg. API Response Time': 'bg-yellow-500'
     };